@@ -0,0 +1,139 @@
+import asyncio
+
+from sqlalchemy import Numeric, cast, func, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import select, delete
+
+from app.database import AsyncSessionLocal
+from app.logger import LOGGER
+from app.models import (
+    Student,
+    Teacher,
+    Subject,
+    Grade,
+    StudentSubjectStats,
+    StudentStats,
+    GroupSubjectStats,
+    GradeTotals,
+)
+
+TOTALS_ID = 1
+
+STATS_TABLES = (StudentSubjectStats, StudentStats, GroupSubjectStats, GradeTotals)
+
+# Grade foreign key referencing each table whose deletion cascades to grades
+GRADE_FOREIGN_KEYS = {
+    Student: Grade.student_id,
+    Subject: Grade.subject_id,
+    Teacher: Grade.teacher_id,
+}
+
+
+def average(stats):
+    return (cast(stats.grade_sum, Numeric) / stats.grade_count).label("avg_grade")
+
+
+def affects_stats(table, values: dict | None = None) -> bool:
+    """Whether deleting rows of 'table' (no values) or updating them with
+    'values' changes the grade aggregates."""
+    if values is None:
+        return table is Grade or table in GRADE_FOREIGN_KEYS
+    if table is Grade:
+        return bool(values.keys() & {"student_id", "subject_id", "grade"})
+    if table is Student:
+        return "group_id" in values
+    return False
+
+
+def grade_criteria(table, *criteria):
+    """Translate a filter on 'table' into a filter on the grades it owns."""
+    if table is Grade:
+        return criteria
+    return (GRADE_FOREIGN_KEYS[table].in_(select(table.id).where(*criteria)),)
+
+
+async def lock_rows(session: AsyncSession, table, *criteria) -> None:
+    """Lock the rows of 'table' matching 'criteria' and the grades they own
+    (SELECT ... FOR UPDATE, in id order), so that concurrent updates and
+    removes cannot change the values subtracted from the aggregates before
+    the update or the removal."""
+    if table is not Grade:
+        await session.execute(
+            select(table.id).where(*criteria).order_by(table.id).with_for_update()
+        )
+    await session.execute(
+        select(Grade.id)
+        .where(*grade_criteria(table, *criteria))
+        .order_by(Grade.id)
+        .with_for_update()
+    )
+
+
+def _upsert(table, keys: list[str], source, sign: int):
+    key_columns = [source.c[key] for key in keys] or [literal(TOTALS_ID)]
+    rows = select(
+        *key_columns,
+        sign * func.coalesce(func.sum(source.c.grade), 0),
+        sign * func.count(source.c.grade),
+    )
+    if keys:
+        rows = rows.group_by(*key_columns)
+    keys = keys or ["id"]
+    stmt = insert(table).from_select([*keys, "grade_sum", "grade_count"], rows)
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            "grade_sum": table.grade_sum + stmt.excluded.grade_sum,
+            "grade_count": table.grade_count + stmt.excluded.grade_count,
+        },
+    )
+
+
+async def apply_grades(session: AsyncSession, *criteria, sign: int = 1) -> None:
+    """Add (sign=1) or subtract (sign=-1) the grades matching 'criteria' to
+    every aggregate table in a single statement."""
+    source = (
+        select(Grade.student_id, Grade.subject_id, Student.group_id, Grade.grade)
+        .join(Student, Student.id == Grade.student_id)
+        .where(*criteria)
+        .cte("grade_delta")
+    )
+    student_subject = _upsert(
+        StudentSubjectStats, ["student_id", "subject_id"], source, sign
+    ).cte("student_subject_delta")
+    student = _upsert(StudentStats, ["student_id"], source, sign).cte("student_delta")
+    group_subject = _upsert(
+        GroupSubjectStats, ["group_id", "subject_id"], source, sign
+    ).cte("group_subject_delta")
+    await session.execute(
+        _upsert(GradeTotals, [], source, sign).add_cte(
+            student_subject, student, group_subject
+        )
+    )
+
+
+async def add_grades(session: AsyncSession, *criteria) -> None:
+    await apply_grades(session, *criteria, sign=1)
+
+
+async def subtract_grades(session: AsyncSession, *criteria) -> None:
+    await apply_grades(session, *criteria, sign=-1)
+
+
+async def rebuild(session: AsyncSession) -> None:
+    """Recompute every aggregate table from 'grades'."""
+    async with session.begin():
+        for table in STATS_TABLES:
+            await session.execute(delete(table))
+        await add_grades(session)
+    LOGGER.info("Grade aggregates rebuilt successfully.")
+
+
+async def main():
+    async with AsyncSessionLocal() as session:
+        await rebuild(session)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
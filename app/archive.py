@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import time
+
+from datetime import datetime
+
+from sqlalchemy import Integer, any_, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import select, insert, delete
+
+from app import aggregates
+from app.cache import REPORT_CACHE
+from app.database import AsyncSessionLocal
+from app.logger import LOGGER
+from app.models import Grade, GradeArchive
+
+# Grades moved per transaction, which bounds how long row locks are held
+ARCHIVE_BATCH_SIZE = 5000
+# Pause between batches, leaving room for the regular workload
+ARCHIVE_PAUSE_SECONDS = 0.1
+# A batch waiting longer than this for a row lock gives up and is retried
+ARCHIVE_LOCK_TIMEOUT_MS = 1000
+ARCHIVE_MAX_RETRIES = 5
+
+LOCK_NOT_AVAILABLE = "55P03"
+
+ARCHIVE_COLUMNS = [
+    "id",
+    "student_id",
+    "subject_id",
+    "teacher_id",
+    "grade",
+    "date_received",
+]
+
+
+async def _archive_batch(
+    session: AsyncSession, before: datetime, after_id: int, batch_size: int
+) -> list[int]:
+    # Lock the batch first, so the rows subtracted from the aggregates are
+    # exactly the rows moved
+    result = await session.execute(
+        select(Grade.id)
+        .where(Grade.date_received < before, Grade.id > after_id)
+        .order_by(Grade.id)
+        .limit(batch_size)
+        .with_for_update()
+    )
+    ids = result.scalars().all()
+    if not ids:
+        return ids
+
+    batch = (
+        Grade.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))),
+        Grade.date_received < before,
+    )
+    await aggregates.subtract_grades(session, *batch)
+    moved = (
+        delete(Grade)
+        .where(*batch)
+        .returning(*(Grade.__table__.c[name] for name in ARCHIVE_COLUMNS))
+        .cte("moved")
+    )
+    await session.execute(
+        insert(GradeArchive).from_select(ARCHIVE_COLUMNS, select(moved))
+    )
+    return ids
+
+
+async def archive_grades(
+    session: AsyncSession,
+    before: datetime,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    pause: float = ARCHIVE_PAUSE_SECONDS,
+    lock_timeout_ms: int = ARCHIVE_LOCK_TIMEOUT_MS,
+    max_batches: int | None = None,
+) -> int:
+    """Move the grades received before 'before' from 'grades' to
+    'grades_archive' and subtract them from the aggregates.
+
+    Grades are moved in batches of 'batch_size' with 'DELETE ... RETURNING'
+    feeding an 'INSERT', one short transaction per batch and 'pause' seconds
+    between batches. A batch blocked by row locks for 'lock_timeout_ms' is
+    rolled back and retried later. Every committed batch is final, so an
+    interrupted run is resumed by running it again. Returns the number of
+    moved grades.
+    """
+    moved = batches = retries = 0
+    last_id = 0
+    start = time.perf_counter()
+    while max_batches is None or batches < max_batches:
+        try:
+            async with session.begin():
+                await session.execute(
+                    text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+                )
+                ids = await _archive_batch(session, before, last_id, batch_size)
+        except DBAPIError as e:
+            if getattr(e.orig, "sqlstate", None) != LOCK_NOT_AVAILABLE:
+                raise
+            retries += 1
+            if retries > ARCHIVE_MAX_RETRIES:
+                raise
+            LOGGER.warning(
+                f"Archive batch after id {last_id} is blocked by locks, "
+                f"retry {retries}/{ARCHIVE_MAX_RETRIES}."
+            )
+            await asyncio.sleep(pause * 2**retries)
+            continue
+        if not ids:
+            break
+
+        retries = 0
+        batches += 1
+        moved += len(ids)
+        last_id = ids[-1]
+        REPORT_CACHE.invalidate(Grade, GradeArchive)
+        elapsed = time.perf_counter() - start
+        LOGGER.info(
+            f"Archived {moved} grades in {batches} batches "
+            f"({moved / elapsed:.0f} grades/s), last id {last_id}..."
+        )
+        await asyncio.sleep(pause)
+
+    LOGGER.info(f"{moved} grades received before {before} archived.")
+    return moved
+
+
+async def main(args):
+    async with AsyncSessionLocal() as session:
+        await archive_grades(
+            session,
+            args.before,
+            args.batch_size,
+            args.pause,
+            args.lock_timeout_ms,
+            args.max_batches,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move old grades to the 'grades_archive' table"
+    )
+    parser.add_argument(
+        "--before",
+        type=datetime.fromisoformat,
+        required=True,
+        help="Archive grades received before this date",
+    )
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=ARCHIVE_PAUSE_SECONDS,
+        help="Seconds to wait between batches",
+    )
+    parser.add_argument("--lock-timeout-ms", type=int, default=ARCHIVE_LOCK_TIMEOUT_MS)
+    parser.add_argument(
+        "--max-batches",
+        type=int,
+        help="Stop after this many batches (run again to resume)",
+    )
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,168 @@
+import json
+
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import insert, update, delete, select
+
+from app import aggregates, services
+from app.cache import REPORT_CACHE
+from app.logger import LOGGER
+from app.models import NAME_TO_TABLE, Grade
+
+ACTIONS = ("create", "update", "remove")
+
+# Operations applied between two commits
+BATCH_COMMIT_EVERY = 1000
+
+
+def parse_operation(line: str):
+    """Parse one JSONL operation into (action, table, id, fields).
+
+    Operations use the same names as the CLI arguments, e.g.
+    {"action": "update", "model": "Grade", "id": 5, "grade": 90}.
+    """
+    operation = json.loads(line)
+    action = operation.pop("action", None)
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown action: {action!r}")
+    model = operation.pop("model", None)
+    if model not in NAME_TO_TABLE:
+        raise ValueError(f"Unknown model: {model!r}")
+    table = NAME_TO_TABLE[model]
+    id = operation.pop("id", None)
+    if action != "create" and not isinstance(id, int):
+        raise ValueError(f"'{action}' requires an integer 'id'")
+
+    columns = table.__table__.columns
+    unknown = set(operation) - set(columns.keys())
+    if unknown:
+        raise ValueError(f"Unknown fields for '{model}': {unknown}")
+    for key, value in operation.items():
+        if isinstance(columns[key].type, DateTime) and isinstance(value, str):
+            operation[key] = datetime.fromisoformat(value)
+    if action == "create" and not operation:
+        raise ValueError("'create' requires at least one field")
+    # The rows are written with Core statements, which skip the @validates
+    # validators of the model
+    for name, (validator, _) in table.__mapper__.validators.items():
+        if name in operation:
+            operation[name] = validator(None, name, operation[name])
+    return action, table, id, operation
+
+
+async def _apply_group(session: AsyncSession, action: str, table, operations):
+    ids = [id for _, id, _ in operations]
+    if action == "create":
+        rows = [fields for _, _, fields in operations]
+        if table is Grade:
+            result = await session.execute(insert(Grade).returning(Grade.id), rows)
+            await aggregates.add_grades(session, Grade.id.in_(result.scalars().all()))
+        else:
+            await session.execute(insert(table), rows)
+    elif action == "update":
+        # A multi-row UPDATE has no reliable rowcount, so missing ids fail
+        # here and the bisection of _flush_group isolates them
+        result = await session.execute(
+            select(table.id)
+            .where(table.id.in_(ids))
+            .order_by(table.id)
+            .with_for_update()
+        )
+        missing = set(ids) - set(result.scalars().all())
+        if missing:
+            raise LookupError(f"'{table.__name__}', 'ID' {min(missing)} not found.")
+        rows = [{"id": id, **fields} for _, id, fields in operations]
+        criteria = None
+        if aggregates.affects_stats(table, rows[0]):
+            await aggregates.lock_rows(session, table, table.id.in_(ids))
+            criteria = aggregates.grade_criteria(table, table.id.in_(ids))
+            await aggregates.subtract_grades(session, *criteria)
+        await session.execute(update(table), rows)
+        if criteria is not None:
+            await aggregates.add_grades(session, *criteria)
+    else:
+        if aggregates.affects_stats(table):
+            await aggregates.lock_rows(session, table, table.id.in_(ids))
+            await aggregates.subtract_grades(
+                session, *aggregates.grade_criteria(table, table.id.in_(ids))
+            )
+        await session.execute(delete(table).where(table.id.in_(ids)))
+
+
+async def _flush_group(session: AsyncSession, action: str, table, operations):
+    """Apply a group as one statement. On failure the group is bisected
+    until the failing lines are isolated. Returns the failures."""
+    try:
+        async with session.begin_nested():
+            await _apply_group(session, action, table, operations)
+        return []
+    except Exception as e:
+        if len(operations) == 1:
+            return [(operations[0][0], e)]
+
+    middle = len(operations) // 2
+    failures = await _flush_group(session, action, table, operations[:middle])
+    failures += await _flush_group(session, action, table, operations[middle:])
+    return failures
+
+
+async def apply_batch(
+    session: AsyncSession,
+    lines: Iterable[str],
+    commit_every: int = BATCH_COMMIT_EVERY,
+):
+    """Apply a stream of JSONL CRUD operations.
+
+    Consecutive operations of the same kind are sent as one multi-row
+    insert/update/delete. Failing lines are logged and skipped without
+    aborting the rest of the file. Returns (applied, failed) counts.
+    """
+    applied = failed = pending = 0
+    group_key, group = None, []
+    changed = set()
+
+    async def commit():
+        await session.commit()
+        REPORT_CACHE.invalidate(*changed)
+        changed.clear()
+
+    async def flush():
+        nonlocal applied, failed, pending, group
+        if not group:
+            return
+        action, table = group_key[:2]
+        failures = await _flush_group(session, action, table, group)
+        for line_number, error in failures:
+            LOGGER.warning(f"Line {line_number}: '{action}' failed: {error}")
+        applied += len(group) - len(failures)
+        failed += len(failures)
+        pending += len(group)
+        changed.update(services.changed_tables(table, removed=action == "remove"))
+        group = []
+        if pending >= commit_every:
+            await commit()
+            pending = 0
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            action, table, id, fields = parse_operation(line)
+        except Exception as e:
+            LOGGER.warning(f"Line {line_number}: invalid operation: {e}")
+            failed += 1
+            continue
+
+        key = (action, table, frozenset(fields) if action != "remove" else None)
+        if key != group_key or len(group) >= commit_every:
+            await flush()
+            group_key = key
+        group.append((line_number, id, fields))
+
+    await flush()
+    await commit()
+    LOGGER.info(f"Batch finished: {applied} operations applied, {failed} failed.")
+    return applied, failed
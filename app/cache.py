@@ -0,0 +1,110 @@
+import functools
+import inspect
+import time
+
+from collections import OrderedDict
+
+from app.logger import LOGGER
+
+REPORT_CACHE_SIZE = 256
+REPORT_CACHE_TTL = 60.0
+
+
+class ReportCache:
+    """In-process LRU cache of report results with a TTL.
+
+    Every entry remembers the tables its report reads, and 'invalidate' drops
+    the entries that depend on the changed tables. Per-table versions make
+    sure a result computed while one of its tables changed is not stored.
+    """
+
+    def __init__(self, maxsize: int = REPORT_CACHE_SIZE, ttl: float = REPORT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def versions(self, tables) -> tuple:
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def get(self, key):
+        """Return (True, value) on a fresh hit and (False, None) otherwise."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[2]
+
+    def set(self, key, value, tables, versions: tuple | None = None) -> None:
+        if versions is not None and versions != self.versions(tables):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, frozenset(tables), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *tables) -> None:
+        changed = set(tables)
+        for table in changed:
+            self._versions[table] = self._versions.get(table, 0) + 1
+        stale = [key for key, entry in self._entries.items() if entry[1] & changed]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+REPORT_CACHE = ReportCache()
+
+
+def cached(*tables, cache: ReportCache = REPORT_CACHE):
+    """Cache the result of a report reading 'tables', keyed by its name and
+    arguments. Calls that leave an id argument ('*_id') as None pick a random
+    entity, so they always bypass the cache."""
+
+    def decorator(report):
+        signature = inspect.signature(report)
+
+        @functools.wraps(report)
+        async def wrapper(session, *args, **kwargs):
+            bound = signature.bind(session, *args, **kwargs)
+            bound.apply_defaults()
+            params = tuple(
+                (name, value)
+                for name, value in bound.arguments.items()
+                if name != "session"
+            )
+            if any(value is None and name.endswith("_id") for name, value in params):
+                return await report(session, *args, **kwargs)
+
+            key = (report.__name__, params)
+            found, value = cache.get(key)
+            if found:
+                LOGGER.debug(f"Report '{report.__name__}' served from cache")
+                return value
+            versions = cache.versions(tables)
+            value = await report(session, *args, **kwargs)
+            cache.set(key, value, tables, versions)
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+import os
+
+from datetime import datetime
+
+import numpy as np
+
+from sqlalchemy import BigInteger, cast, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import select
+
+from app.database import AsyncSessionLocal
+from app.logger import LOGGER
+from app.models import (
+    Student,
+    Group,
+    Teacher,
+    Subject,
+    Grade,
+    teacher_subject_association,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+# Rows fetched from the server-side cursor per round trip by 'export'
+EXPORT_BATCH_SIZE = 100_000
+
+GRADE_COLUMNS = {
+    "student_id": np.int32,
+    "group_id": np.int32,
+    "subject_id": np.int32,
+    "teacher_id": np.int32,
+    "grade": np.int16,
+    "date_received": "datetime64[us]",
+}
+
+# Small tables exported whole, by name
+DIMENSIONS = {
+    "students": select(Student.id, Student.name, Student.group_id),
+    "groups": select(Group.id, Group.name),
+    "subjects": select(Subject.id, Subject.name),
+    "teachers": select(Teacher.id, Teacher.name),
+    "teacher_subjects": select(
+        teacher_subject_association.c.teacher_id,
+        teacher_subject_association.c.subject_id,
+    ),
+}
+
+META_FILE = "meta.json"
+PARQUET_FILE = "grades.parquet"
+
+
+def _columns(rows, names) -> dict[str, np.ndarray]:
+    values = zip(*rows) if rows else [()] * len(names)
+    return {name: np.array(column) for name, column in zip(names, values)}
+
+
+def _grade_columns(rows) -> dict[str, np.ndarray]:
+    values = zip(*rows) if rows else [()] * len(GRADE_COLUMNS)
+    return {
+        name: np.array(column, dtype=dtype)
+        for (name, dtype), column in zip(GRADE_COLUMNS.items(), values)
+    }
+
+
+async def export(session: AsyncSession, path: str, output_format: str = "npy") -> int:
+    """Export 'grades' joined with the group of each student to 'path'.
+
+    The 'npy' format writes one memory-mappable '.npy' file per column and the
+    'parquet' format a single 'grades.parquet' file (requires pyarrow). The
+    small tables (names, teacher subjects) are written as '.npy' files in both
+    cases. Grades are streamed in chunks from one consistent snapshot. Returns
+    the number of exported grades.
+    """
+    if output_format == "parquet" and pq is None:
+        raise RuntimeError("Parquet export requires pyarrow to be installed")
+    os.makedirs(path, exist_ok=True)
+
+    # Dates are sent as microseconds since the epoch, which is much cheaper to
+    # convert than datetime objects
+    query = select(
+        Grade.student_id,
+        Student.group_id,
+        Grade.subject_id,
+        Grade.teacher_id,
+        Grade.grade,
+        cast(func.extract("epoch", Grade.date_received) * 1_000_000, BigInteger),
+    ).join(Student, Student.id == Grade.student_id)
+
+    async with session.begin():
+        # Every read goes through the connection holding the snapshot, as a
+        # RoutingSession would send plain SELECTs to a replica
+        connection = await session.connection(
+            execution_options={"isolation_level": "REPEATABLE READ"}
+        )
+        for name, dimension in DIMENSIONS.items():
+            result = await connection.execute(dimension)
+            columns = _columns(result.all(), list(result.keys()))
+            for column, values in columns.items():
+                np.save(os.path.join(path, f"{name}.{column}.npy"), values)
+
+        total = (
+            await connection.execute(select(func.count()).select_from(Grade))
+        ).scalar()
+        if output_format == "parquet":
+            writer = None
+        else:
+            arrays = {
+                name: np.lib.format.open_memmap(
+                    os.path.join(path, f"grades.{name}.npy"),
+                    mode="w+",
+                    dtype=dtype,
+                    shape=(total,),
+                )
+                for name, dtype in GRADE_COLUMNS.items()
+            }
+
+        count = 0
+        result = await connection.stream(
+            query.execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            columns = _grade_columns(rows)
+            if output_format == "parquet":
+                table = pa.table(columns)
+                if writer is None:
+                    writer = pq.ParquetWriter(
+                        os.path.join(path, PARQUET_FILE), table.schema
+                    )
+                writer.write_table(table)
+            else:
+                for name, values in columns.items():
+                    arrays[name][count : count + len(rows)] = values
+            count += len(rows)
+            if count % (EXPORT_BATCH_SIZE * 10) < len(rows):
+                LOGGER.info(f"Exported {count}/{total} grades...")
+
+    if output_format == "parquet":
+        if writer is None:
+            pq.write_table(
+                pa.table(_grade_columns([])), os.path.join(path, PARQUET_FILE)
+            )
+        else:
+            writer.close()
+    else:
+        for values in arrays.values():
+            values.flush()
+
+    with open(os.path.join(path, META_FILE), "w") as file:
+        json.dump(
+            {
+                "format": output_format,
+                "grades": count,
+                "exported_at": datetime.now().isoformat(),
+            },
+            file,
+        )
+    LOGGER.info(f"Exported {count} grades to '{path}'")
+    return count
+
+
+def load(path: str) -> dict[str, dict[str, np.ndarray]]:
+    """Load an export as {table: {column: array}}. '.npy' grade columns are
+    memory-mapped, so only the pages a computation touches are read."""
+    with open(os.path.join(path, META_FILE)) as file:
+        meta = json.load(file)
+
+    data = {}
+    for name, query in DIMENSIONS.items():
+        data[name] = {
+            column: np.load(os.path.join(path, f"{name}.{column}.npy"))
+            for column in query.selected_columns.keys()
+        }
+
+    if meta["format"] == "parquet":
+        if pq is None:
+            raise RuntimeError("Reading a Parquet export requires pyarrow")
+        table = pq.read_table(os.path.join(path, PARQUET_FILE))
+        data["grades"] = {
+            name: table.column(name).to_numpy().astype(dtype, copy=False)
+            for name, dtype in GRADE_COLUMNS.items()
+        }
+    else:
+        data["grades"] = {
+            name: np.load(os.path.join(path, f"grades.{name}.npy"), mmap_mode="r")
+            for name in GRADE_COLUMNS
+        }
+    return data
+
+
+async def main(path: str, output_format: str):
+    async with AsyncSessionLocal() as session:
+        await export(session, path, output_format)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export grades to columnar files")
+    parser.add_argument("-o", "--output", default="grades_export", help="Directory")
+    parser.add_argument(
+        "--format",
+        choices=["npy", "parquet"],
+        default="npy",
+        help="Grades file format ('parquet' requires pyarrow)",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(args.output, args.format))
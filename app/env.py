@@ -0,0 +1,21 @@
+import os
+
+ENV_FILE = os.getenv("ENV_FILE", ".env")
+
+
+def load_env_file(path: str = ENV_FILE) -> None:
+    """Read KEY=VALUE lines of 'path' into os.environ without overriding
+    variables that are already set."""
+    if not os.path.isfile(path):
+        return
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            os.environ.setdefault(key.strip(), value.strip().strip("'\""))
+
+
+# Loaded on import, before the modules reading settings from the environment
+load_env_file()
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import select
+
+import app.my_select as queries
+
+from app.database import AsyncSessionLocal
+from app.health import estimate_rows
+from app.logger import LOGGER
+from app.models import Student, Group, Teacher, Subject
+
+# Below this many (estimated) rows in 'grades' the planner legitimately prefers
+# sequential scans, so plans are reported but not treated as failures
+MIN_GRADES_ROWS = 100_000
+
+
+def _seq_scans(plan: dict, relation: str) -> list[dict]:
+    """Sequential scans on 'relation' or on one of its partitions."""
+    found = []
+    name = plan.get("Relation Name", "")
+    if plan.get("Node Type") == "Seq Scan" and (
+        name == relation or name.startswith(f"{relation}_")
+    ):
+        found.append(plan)
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child, relation))
+    return found
+
+
+async def _sample_ids(session: AsyncSession) -> dict[str, int]:
+    result = await session.execute(
+        select(
+            select(func.min(Student.id)).scalar_subquery(),
+            select(func.min(Group.id)).scalar_subquery(),
+            select(func.min(Teacher.id)).scalar_subquery(),
+            select(func.min(Subject.id)).scalar_subquery(),
+        )
+    )
+    student_id, group_id, teacher_id, subject_id = result.one()
+    return {
+        "student_id": student_id,
+        "group_id": group_id,
+        "teacher_id": teacher_id,
+        "subject_id": subject_id,
+    }
+
+
+def report_queries(ids: dict[str, int]) -> dict:
+    return {
+        "select_1": queries.query_1(),
+        "select_2": queries.query_2(ids["subject_id"]),
+        "select_3": queries.query_3(ids["subject_id"]),
+        "select_4": queries.query_4(),
+        "select_5": queries.query_5(ids["teacher_id"]),
+        "select_6": queries.query_6(ids["group_id"]),
+        "select_7": queries.query_7(ids["group_id"], ids["subject_id"]),
+        "select_8": queries.query_8(ids["teacher_id"]),
+        "select_9": queries.query_9(ids["student_id"]),
+        "select_10": queries.query_10(ids["student_id"], ids["teacher_id"]),
+    }
+
+
+async def explain_reports(session: AsyncSession) -> dict[str, dict]:
+    """Run EXPLAIN (ANALYZE, BUFFERS) for every report query.
+
+    Returns the JSON plan of each report along with the sequential scans on
+    'grades' found in it.
+    """
+    plans = {}
+    async with session.begin():
+        ids = await _sample_ids(session)
+        for name, query in report_queries(ids).items():
+            sql = query.compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+            result = await session.execute(
+                text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+            )
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            plans[name] = {
+                "plan": plan[0],
+                "seq_scans": len(_seq_scans(plan[0]["Plan"], "grades")),
+            }
+    return plans
+
+
+async def check_reports(min_rows: int = MIN_GRADES_ROWS, verbose: bool = False) -> bool:
+    async with AsyncSessionLocal() as session:
+        plans = await explain_reports(session)
+        async with session.begin():
+            estimated_rows = (await estimate_rows(session, ["grades"]))["grades"] or 0
+    at_scale = estimated_rows >= min_rows
+
+    failed = []
+    for name, report in plans.items():
+        plan = report["plan"]
+        status = "ok"
+        if report["seq_scans"]:
+            status = "SEQ SCAN on grades"
+            if at_scale:
+                failed.append(name)
+        LOGGER.info(
+            f"{name}: {plan['Execution Time']:.2f} ms, "
+            f"shared hit {plan['Plan'].get('Shared Hit Blocks', 0)}, "
+            f"read {plan['Plan'].get('Shared Read Blocks', 0)} - {status}"
+        )
+        if verbose:
+            LOGGER.info(json.dumps(plan, indent=2))
+
+    if not at_scale:
+        LOGGER.warning(
+            f"'grades' has ~{estimated_rows} rows (< {min_rows}), "
+            "sequential scans are not treated as failures."
+        )
+    elif failed:
+        LOGGER.error(f"Reports scanning the whole 'grades' table: {failed}")
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check report query plans for sequential scans on 'grades'"
+    )
+    parser.add_argument("--min-rows", type=int, default=MIN_GRADES_ROWS)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    ok = asyncio.run(check_reports(args.min_rows, args.verbose))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from alembic.script import ScriptDirectory
+from sqlalchemy import exists, func, literal, not_, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import select
+
+from app.database import AsyncSessionLocal, Base
+from app.models import (
+    Student,
+    Group,
+    Teacher,
+    Subject,
+    Grade,
+    teacher_subject_association,
+)
+
+# Tables that must hold rows for the application (and the tests) to be usable
+REQUIRED_TABLES = [
+    Group.__table__,
+    Student.__table__,
+    Teacher.__table__,
+    Subject.__table__,
+    Grade.__table__,
+    teacher_subject_association,
+]
+
+# Time budget of every check, enforced with a statement timeout
+HEALTH_BUDGET_MS = int(os.getenv("HEALTH_BUDGET_MS", "2000"))
+# Time budget of the deep checks, which read whole tables
+HEALTH_DEEP_BUDGET_MS = int(os.getenv("HEALTH_DEEP_BUDGET_MS", "300000"))
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+
+QUERY_CANCELED = "57014"
+
+# Check statuses from best to worst, a check timing out is inconclusive
+STATUSES = ["ok", "warn", "timeout", "fail"]
+
+
+async def check_tables(session: AsyncSession) -> tuple[str, dict]:
+    """Whether every required table has at least one row, with one EXISTS
+    probe per table instead of reading them."""
+    result = await session.execute(
+        select(
+            *(
+                exists(select(literal(1)).select_from(table)).label(table.name)
+                for table in REQUIRED_TABLES
+            )
+        )
+    )
+    empty = [name for name, found in result.one()._asdict().items() if not found]
+    return ("fail" if empty else "ok"), {"empty": empty}
+
+
+async def estimate_rows(session: AsyncSession, names: list[str]) -> dict:
+    """Row counts estimated by the planner statistics, summed over the
+    partitions of partitioned tables. None for tables never analyzed."""
+    result = await session.execute(
+        text(
+            "SELECT t.name, sum(c.reltuples) FILTER (WHERE c.reltuples >= 0)::bigint "
+            "FROM unnest(CAST(:names AS text[])) AS t(name) "
+            "LEFT JOIN pg_class c ON c.relkind = 'r' AND ("
+            "c.oid = to_regclass(t.name) OR c.oid IN (SELECT inhrelid FROM pg_inherits "
+            "WHERE inhparent = to_regclass(t.name))) "
+            "GROUP BY t.name ORDER BY t.name"
+        ),
+        {"names": names},
+    )
+    return dict(result.all())
+
+
+async def check_row_estimates(session: AsyncSession) -> tuple[str, dict]:
+    rows = await estimate_rows(session, sorted(Base.metadata.tables))
+    not_analyzed = [name for name, count in rows.items() if count is None]
+    return ("warn" if not_analyzed else "ok"), {
+        "rows": rows,
+        "not_analyzed": not_analyzed,
+    }
+
+
+async def check_revision(session: AsyncSession) -> tuple[str, dict]:
+    """Compare the Alembic revision of the database with the head of the
+    migrations. Databases created without Alembic (e.g. by the tests) have
+    no revision, which is only a warning."""
+    heads = sorted(ScriptDirectory(MIGRATIONS_DIR).get_heads())
+    stamped = (
+        await session.execute(text("SELECT to_regclass('alembic_version')"))
+    ).scalar()
+    if stamped is None:
+        return "warn", {"revision": None, "heads": heads}
+    result = await session.execute(text("SELECT version_num FROM alembic_version"))
+    revisions = sorted(result.scalars().all())
+    return ("ok" if revisions == heads else "fail"), {
+        "revision": revisions[0] if len(revisions) == 1 else revisions,
+        "heads": heads,
+    }
+
+
+def _orphans(foreign_key):
+    table, column = foreign_key.parent.table, foreign_key.parent
+    referred = foreign_key.column
+    return (
+        select(func.count())
+        .select_from(table)
+        .where(
+            column.is_not(None),
+            not_(exists().where(referred == column)),
+        )
+        .scalar_subquery()
+        .label(f"{table.name}.{column.name}")
+    )
+
+
+async def check_orphans(session: AsyncSession) -> tuple[str, dict]:
+    """Count the rows referencing a missing row through each foreign key,
+    in a single statement. It reads every referencing table, hence a deep
+    check."""
+    foreign_keys = [
+        foreign_key
+        for table in Base.metadata.sorted_tables
+        for foreign_key in sorted(table.foreign_keys, key=lambda key: key.parent.name)
+    ]
+    result = await session.execute(select(*map(_orphans, foreign_keys)))
+    orphans = {name: count for name, count in result.one()._asdict().items() if count}
+    return ("fail" if orphans else "ok"), {"orphans": orphans}
+
+
+CHECKS = {
+    "tables": check_tables,
+    "row_estimates": check_row_estimates,
+    "revision": check_revision,
+}
+
+# Checks scanning whole tables, only run on demand and with their own budget
+DEEP_CHECKS = {
+    "orphans": check_orphans,
+}
+
+ALL_CHECKS = {**CHECKS, **DEEP_CHECKS}
+
+
+async def _run_check(session: AsyncSession, check, budget_ms: int) -> dict:
+    start = time.perf_counter()
+    try:
+        async with session.begin():
+            await session.execute(text(f"SET LOCAL statement_timeout = {budget_ms}"))
+            status, details = await check(session)
+    except DBAPIError as e:
+        if getattr(e.orig, "sqlstate", None) == QUERY_CANCELED:
+            status, details = "timeout", {}
+        else:
+            status, details = "fail", {"error": str(e.orig)}
+    except OSError as e:
+        # The database cannot be reached
+        status, details = "fail", {"error": str(e)}
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+    return {"status": status, "elapsed_ms": elapsed_ms, **details}
+
+
+async def check_health(
+    session: AsyncSession,
+    checks: list[str] | None = None,
+    budget_ms: int = HEALTH_BUDGET_MS,
+    deep: bool = False,
+    deep_budget_ms: int = HEALTH_DEEP_BUDGET_MS,
+) -> dict:
+    """Run the checks (the quick ones by default, the deep ones too with
+    'deep'), each in its own transaction limited to 'budget_ms', or to
+    'deep_budget_ms' for the deep checks.
+
+    Returns {"status", "ready", "checks": {name: {"status", "elapsed_ms",
+    ...}}}. 'status' is the worst status of the checks. The database is
+    'ready' when the required tables have rows and the revision is not
+    outdated (or unknown, for databases created without Alembic).
+    """
+    results = {}
+    for name in checks or (ALL_CHECKS if deep else CHECKS):
+        budget = deep_budget_ms if name in DEEP_CHECKS else budget_ms
+        results[name] = await _run_check(session, ALL_CHECKS[name], budget)
+    statuses = [result["status"] for result in results.values()]
+    ready = all(
+        results[name]["status"] in ("ok", "warn")
+        for name in ("tables", "revision")
+        if name in results
+    )
+    return {
+        "status": max(statuses, key=STATUSES.index, default="ok"),
+        "ready": ready,
+        "checks": results,
+    }
+
+
+async def tables_ready() -> bool:
+    """Whether every required table has rows."""
+    async with AsyncSessionLocal() as session:
+        report = await check_health(session, ["tables"])
+    return report["ready"]
+
+
+async def main(args) -> int:
+    async with AsyncSessionLocal() as session:
+        report = await check_health(
+            session, args.checks, args.budget_ms, args.deep, args.deep_budget_ms
+        )
+    json.dump(report, sys.stdout, indent=2 if args.pretty else None)
+    sys.stdout.write("\n")
+    return 0 if report["ready"] and report["status"] != "fail" else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the database is ready and consistent"
+    )
+    parser.add_argument("--checks", nargs="+", choices=list(ALL_CHECKS))
+    parser.add_argument(
+        "--budget-ms",
+        type=int,
+        default=HEALTH_BUDGET_MS,
+        help="Time budget of each check",
+    )
+    parser.add_argument(
+        "--deep",
+        action="store_true",
+        help=f"Also run the checks scanning whole tables: {', '.join(DEEP_CHECKS)}",
+    )
+    parser.add_argument(
+        "--deep-budget-ms",
+        type=int,
+        default=HEALTH_DEEP_BUDGET_MS,
+        help="Time budget of each deep check",
+    )
+    parser.add_argument("--pretty", action="store_true", help="Indent the JSON")
+
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,324 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import text
+from sqlalchemy.sql import select
+
+from app import aggregates, services
+from app.cache import REPORT_CACHE
+from app.database import AsyncSessionLocal
+from app.logger import LOGGER
+from app.models import Student, Teacher, Subject, Grade
+
+# Grades written by one COPY (and committed together)
+INGEST_BATCH_SIZE = 1000
+# Longest time a grade waits for its batch to fill up before it is written
+INGEST_MAX_LATENCY_MS = 20
+# Grades waiting to be written, 'submit' waits when the queue is full
+INGEST_QUEUE_SIZE = 10000
+# Batches written at the same time, each with its own connection
+INGEST_CONCURRENCY = 4
+
+GRADE_FIELDS = ("student_id", "subject_id", "teacher_id", "grade", "date_received")
+
+_CLOSE = object()
+
+
+def _validate(fields: dict) -> dict:
+    """The row of a grade, checked by the model validators. Unlike
+    constructing a Grade, this costs next to nothing per row."""
+    unknown = set(fields) - set(GRADE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields for 'Grade': {unknown}")
+    row = {name: fields.get(name) for name in GRADE_FIELDS}
+    row["date_received"] = row["date_received"] or datetime.now()
+    for name, (validator, _) in Grade.__mapper__.validators.items():
+        row[name] = validator(None, name, row[name])
+    return row
+
+
+async def _reserve_ids(session: AsyncSession, count: int) -> list[int]:
+    # One nextval per id, so concurrent inserts of grades get other ids
+    result = await session.execute(
+        text(
+            "SELECT nextval(pg_get_serial_sequence('grades', 'id')) "
+            "FROM generate_series(1, :count)"
+        ),
+        {"count": count},
+    )
+    return result.scalars().all()
+
+
+async def _copy(session: AsyncSession, records: list) -> tuple[list, list]:
+    """Insert (id, record) pairs with one COPY. On failure they are bisected
+    until the failing records are isolated. Returns the inserted pairs and
+    the failed (id, record, error) triples."""
+    try:
+        async with session.begin_nested():
+            connection = await session.connection()
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                Grade.__table__.name,
+                records=[
+                    (id, *(fields[name] for name in GRADE_FIELDS))
+                    for id, (fields, _) in records
+                ],
+                columns=("id", *GRADE_FIELDS),
+            )
+        return records, []
+    except Exception as e:
+        if len(records) == 1:
+            return [], [(*records[0], e)]
+
+    middle = len(records) // 2
+    inserted, failed = await _copy(session, records[:middle])
+    more_inserted, more_failed = await _copy(session, records[middle:])
+    return inserted + more_inserted, failed + more_failed
+
+
+class GradeWriter:
+    """Write grades in micro-batches from a bounded queue.
+
+    Submitted grades are written by 'concurrency' background tasks, with one
+    COPY and one aggregates update per batch, committed together. A batch
+    is written when it holds 'batch_size' grades or when its oldest grade
+    has waited 'max_latency_ms'. When 'queue_size' grades are waiting,
+    'submit' waits for room, which slows producers down to the database
+    pace. Each grade gets its own result: its id, or the error that made it
+    fail without failing the rest of its batch.
+
+        async with GradeWriter() as writer:
+            id = await writer.submit(student_id=1, subject_id=2, teacher_id=3, grade=90)
+    """
+
+    def __init__(
+        self,
+        sessionmaker: async_sessionmaker = AsyncSessionLocal,
+        batch_size: int = INGEST_BATCH_SIZE,
+        max_latency_ms: float = INGEST_MAX_LATENCY_MS,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        concurrency: int = INGEST_CONCURRENCY,
+    ):
+        self.sessionmaker = sessionmaker
+        self.batch_size = batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.concurrency = concurrency
+        self.queue = asyncio.Queue(queue_size)
+        self.inserted = self.failed = self.batches = 0
+        # Batches are copied concurrently, but every batch updates the same
+        # aggregate rows (the totals at least), which stay locked until its
+        # commit: taking turns there keeps the batches from deadlocking
+        self._aggregates_lock = asyncio.Lock()
+        self._tasks = []
+        self._closed = False
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._run()) for _ in range(self.concurrency)
+            ]
+
+    async def enqueue(self, **fields) -> asyncio.Future:
+        """Queue a grade, waiting while the queue is full, and return the
+        future of its id. Invalid values raise here, before queueing."""
+        if self._closed:
+            raise RuntimeError("The grade writer is closed")
+        self.start()
+        row = _validate(fields)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, future))
+        # The writer closed while this producer was waiting for room, and
+        # its grade was queued after the final drain of 'close'
+        if self._closed and all(task.done() for task in self._tasks):
+            if not future.done():
+                future.set_exception(RuntimeError("The grade writer is closed"))
+        return future
+
+    async def submit(self, **fields) -> int:
+        """Write a grade and return its id once its batch is committed."""
+        return await (await self.enqueue(**fields))
+
+    async def close(self) -> None:
+        """Write the queued grades and stop."""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._tasks:
+            return
+        for _ in self._tasks:
+            await self.queue.put(_CLOSE)
+        await asyncio.gather(*self._tasks)
+        # Grades of producers that were waiting for room when closing
+        while not self.queue.empty():
+            record = self.queue.get_nowait()
+            if record is not _CLOSE and not record[1].done():
+                record[1].set_exception(RuntimeError("The grade writer is closed"))
+        LOGGER.info(
+            f"Grade writer closed: {self.inserted} grades inserted, "
+            f"{self.failed} failed, in {self.batches} batches."
+        )
+
+    async def _next_batch(self) -> tuple[list, bool]:
+        """Wait for a grade, then collect more until the batch is full or the
+        first grade has waited 'max_latency'. Returns the batch and whether
+        the writer is closing."""
+        first = await self.queue.get()
+        if first is _CLOSE:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.batch_size:
+            if self.queue.empty():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                record = self.queue.get_nowait()
+            if record is _CLOSE:
+                return batch, True
+            batch.append(record)
+        return batch, False
+
+    async def _write(self, batch: list) -> None:
+        try:
+            async with self.sessionmaker() as session:
+                async with session.begin():
+                    ids = await _reserve_ids(session, len(batch))
+                    inserted, failed = await _copy(session, [*zip(ids, batch)])
+                    async with self._aggregates_lock:
+                        if inserted:
+                            await aggregates.add_grades(
+                                session,
+                                services.id_in(Grade, [id for id, _ in inserted]),
+                            )
+                        await session.commit()
+        except Exception as e:
+            # The aggregates or the commit failed, or the database cannot be
+            # reached
+            inserted, failed = [], [(None, record, e) for record in batch]
+        else:
+            REPORT_CACHE.invalidate(*services.changed_tables(Grade))
+        for id, (_, future) in inserted:
+            if not future.done():
+                future.set_result(id)
+        for _, (fields, future), error in failed:
+            LOGGER.warning(f"Grade {fields} failed: {error}")
+            if not future.done():
+                future.set_exception(error)
+        self.inserted += len(inserted)
+        self.failed += len(failed)
+        self.batches += 1
+
+    async def _run(self) -> None:
+        closing = False
+        while not closing:
+            batch, closing = await self._next_batch()
+            if batch:
+                await self._write(batch)
+
+
+def _parse_record(line: str) -> dict:
+    record = json.loads(line)
+    if isinstance(record.get("date_received"), str):
+        record["date_received"] = datetime.fromisoformat(record["date_received"])
+    return record
+
+
+async def _random_records(count: int):
+    """'count' grades of random existing students, subjects and teachers."""
+    async with AsyncSessionLocal() as session:
+        student_ids, subject_ids, teacher_ids = [
+            (await session.execute(select(model.id).limit(1000))).scalars().all()
+            for model in (Student, Subject, Teacher)
+        ]
+    for _ in range(count):
+        yield {
+            "student_id": random.choice(student_ids),
+            "subject_id": random.choice(subject_ids),
+            "teacher_id": random.choice(teacher_ids),
+            "grade": random.randint(1, 100),
+        }
+
+
+async def _read_records(path: str):
+    file = sys.stdin if path == "-" else open(path)
+    try:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield _parse_record(line)
+            except Exception as e:
+                LOGGER.warning(f"Line {line_number}: invalid grade: {e}")
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+
+async def main(args):
+    if args.generate:
+        records = _random_records(args.generate)
+    else:
+        records = _read_records(args.file)
+
+    futures = []
+    start = time.perf_counter()
+    async with GradeWriter(
+        batch_size=args.batch_size,
+        max_latency_ms=args.max_latency_ms,
+        queue_size=args.queue_size,
+        concurrency=args.concurrency,
+    ) as writer:
+        async for record in records:
+            try:
+                futures.append(await writer.enqueue(**record))
+            except Exception as e:
+                LOGGER.warning(f"Invalid grade {record}: {e}")
+    await asyncio.gather(*futures, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    LOGGER.info(
+        f"{writer.inserted} grades inserted in {elapsed:.2f} s "
+        f"({writer.inserted / elapsed:.0f} grades/s)."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Insert grades from a JSONL file in micro-batches"
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "file",
+        nargs="?",
+        help='JSONL file of grades ("-" for stdin), e.g. {"student_id": 1, '
+        '"subject_id": 2, "teacher_id": 3, "grade": 90}',
+    )
+    source.add_argument(
+        "--generate",
+        type=int,
+        help="Insert this many random grades instead, to measure throughput",
+    )
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--max-latency-ms", type=float, default=INGEST_MAX_LATENCY_MS)
+    parser.add_argument("--queue-size", type=int, default=INGEST_QUEUE_SIZE)
+    parser.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY)
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,121 @@
+import logging
+import os
+import time
+
+from sqlalchemy import event
+
+from app.logger import LOGGER
+
+# Upper bounds (ms) of the latency histogram buckets, the last one is open
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+SLOW_QUERY_LOG = os.getenv("DB_SLOW_QUERY_LOG")
+
+SLOW_QUERY_LOGGER = logging.getLogger("AppLogger.slow_queries")
+if SLOW_QUERY_LOG:
+    SLOW_QUERY_LOGGER.addHandler(logging.FileHandler(SLOW_QUERY_LOG))
+
+
+class StatementStats:
+    __slots__ = ("count", "total_ms", "max_ms", "rows", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms: float, rows: int) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += max(rows, 0)
+        for index, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                break
+        else:
+            index = len(HISTOGRAM_BUCKETS_MS)
+        self.buckets[index] += 1
+
+    def as_dict(self) -> dict:
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS]
+        labels.append(f">{HISTOGRAM_BUCKETS_MS[-1]}ms")
+        return {
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "max_ms": self.max_ms,
+            "rows": self.rows,
+            "histogram": dict(zip(labels, self.buckets)),
+        }
+
+
+class QueryInstrumentation:
+    """Per-statement latency histograms, row counts and a slow query log,
+    collected with SQLAlchemy cursor execution events."""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.statements: dict[str, StatementStats] = {}
+        self._engines = []
+
+    @property
+    def attached(self) -> bool:
+        return bool(self._engines)
+
+    def attach(self, engine) -> None:
+        engine = getattr(engine, "sync_engine", engine)
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        self._engines.append(engine)
+
+    def detach(self) -> None:
+        for engine in self._engines:
+            event.remove(engine, "before_cursor_execute", self._before_execute)
+            event.remove(engine, "after_cursor_execute", self._after_execute)
+        self._engines.clear()
+
+    def reset(self) -> None:
+        self.statements.clear()
+
+    def _before_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        context._instrumentation_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - context._instrumentation_start) * 1000
+        rows = cursor.rowcount
+        stats = self.statements.get(statement)
+        if stats is None:
+            stats = self.statements[statement] = StatementStats()
+        stats.add(elapsed_ms, rows)
+        if elapsed_ms >= self.slow_query_ms:
+            SLOW_QUERY_LOGGER.warning(
+                f"Slow query ({elapsed_ms:.2f} ms, {rows} rows): "
+                f"{' '.join(statement.split())}"
+            )
+
+    def snapshot(self) -> dict[str, dict]:
+        return {
+            statement: stats.as_dict() for statement, stats in self.statements.items()
+        }
+
+    def log_summary(self, top: int = 10) -> None:
+        ranked = sorted(
+            self.statements.items(), key=lambda item: item[1].total_ms, reverse=True
+        )
+        LOGGER.info("--------------------------------------------------------")
+        LOGGER.info(f"Top {min(top, len(ranked))} statements by total time:")
+        for statement, stats in ranked[:top]:
+            LOGGER.info(
+                f"{stats.count:6} x {stats.total_ms / stats.count:8.2f} ms "
+                f"(max {stats.max_ms:.2f} ms, {stats.rows} rows): "
+                f"{' '.join(statement.split())[:120]}"
+            )
+        LOGGER.info("--------------------------------------------------------")
+
+
+INSTRUMENTATION = QueryInstrumentation()
@@ -1,11 +1,53 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+
+import app.env  # noqa: F401 - LOG_* may be set in .env
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# 'text' or 'json' (one object per line, for log collectors)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as JSON objects including their 'extra' fields."""
+
+    RESERVED = {*vars(logging.makeLogRecord({})), "message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value)
+            for key, value in vars(record).items()
+            if key not in self.RESERVED
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
 
 
 LOGGER = logging.getLogger("AppLogger")
-LOGGER.setLevel(logging.INFO)
+LOGGER.setLevel(LOG_LEVEL)
 
 ch = logging.StreamHandler()
 
-ch.setLevel(logging.INFO)
+ch.setLevel(LOG_LEVEL)
+if LOG_FORMAT == "json":
+    ch.setFormatter(JsonFormatter())
+
+# Callers only put records on a queue, a listener thread writes them out, so
+# the event loop never waits on terminal or pipe I/O
+LOG_QUEUE = queue.SimpleQueue()
+LISTENER = logging.handlers.QueueListener(LOG_QUEUE, ch, respect_handler_level=True)
 
-LOGGER.addHandler(ch)
+LOGGER.addHandler(logging.handlers.QueueHandler(LOG_QUEUE))
+LISTENER.start()
+atexit.register(LISTENER.stop)
@@ -1,34 +1,87 @@
 from datetime import datetime
 from sqlalchemy import (
+    DDL,
     Table,
     Column,
     PrimaryKeyConstraint,
     Integer,
+    BigInteger,
     String,
     ForeignKey,
     DateTime,
+    Index,
+    event,
+    func,
+    text,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 from app.database import Base
 
 
+# Relationships raise instead of loading lazily, which fails under AsyncSession
+# or runs one query per row. They are loaded eagerly with the loading profiles
+# of app.profiles.
+
+
+# pg_trgm is optional: it is installed when the server ships it, and without
+# it the trigram indexes are skipped and app.services.search falls back to ILIKE
+INSTALL_TRIGRAM = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    END IF;
+END
+$$
+"""
+TRIGRAM_INSTALLED = "SELECT EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_trgm')"
+
+
+def _trigram_installed(ddl, target, bind, **kw) -> bool:
+    # Without a connection the DDL is only rendered, e.g. as offline SQL
+    return bind is None or bind.execute(text(TRIGRAM_INSTALLED)).scalar()
+
+
+def name_search_index(table_name: str) -> Index:
+    """Trigram GIN index on 'name', used by the similarity and prefix
+    matching of app.services.search. Only created when pg_trgm is installed."""
+    return Index(
+        f"ix_{table_name}_name_trgm",
+        "name",
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    ).ddl_if(callable_=_trigram_installed)
+
+
+event.listen(Base.metadata, "before_create", DDL(INSTALL_TRIGRAM))
+
+
 class Group(Base):
     __tablename__ = "groups"
+    __table_args__ = (name_search_index("groups"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String, unique=True, nullable=False)
-    students: Mapped[list["Student"]] = relationship("Student", back_populates="group")
+    students: Mapped[list["Student"]] = relationship(
+        "Student", back_populates="group", lazy="raise"
+    )
 
 
 class Student(Base):
     __tablename__ = "students"
+    __table_args__ = (name_search_index("students"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String, unique=True, nullable=False)
-    group_id: Mapped[int] = mapped_column(ForeignKey("groups.id"))
-    group: Mapped["Group"] = relationship("Group", back_populates="students")
+    group_id: Mapped[int] = mapped_column(ForeignKey("groups.id"), index=True)
+    group: Mapped["Group"] = relationship(
+        "Group", back_populates="students", lazy="raise"
+    )
     grades: Mapped[list["Grade"]] = relationship(
-        "Grade", back_populates="student", cascade="all, delete, delete-orphan"
+        "Grade",
+        back_populates="student",
+        cascade="all, delete, delete-orphan",
+        lazy="raise",
     )
 
 
@@ -38,39 +91,76 @@ teacher_subject_association = Table(
     Column("teacher_id", ForeignKey("teachers.id"), primary_key=True),
     Column("subject_id", ForeignKey("subjects.id"), primary_key=True),
     PrimaryKeyConstraint("teacher_id", "subject_id"),
+    Index("ix_teacher_subject_association_subject_id", "subject_id"),
 )
 
 
 class Teacher(Base):
     __tablename__ = "teachers"
+    __table_args__ = (name_search_index("teachers"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
     subjects: Mapped[list["Subject"]] = relationship(
-        "Subject", secondary=teacher_subject_association, back_populates="teachers"
+        "Subject",
+        secondary=teacher_subject_association,
+        back_populates="teachers",
+        lazy="raise",
     )
     grades: Mapped[list["Grade"]] = relationship(
-        "Grade", back_populates="teacher", cascade="all, delete, delete-orphan"
+        "Grade",
+        back_populates="teacher",
+        cascade="all, delete, delete-orphan",
+        lazy="raise",
     )
 
 
 class Subject(Base):
     __tablename__ = "subjects"
+    __table_args__ = (name_search_index("subjects"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String, unique=True, nullable=False)
     teachers: Mapped[list["Teacher"]] = relationship(
-        "Teacher", secondary=teacher_subject_association, back_populates="subjects"
+        "Teacher",
+        secondary=teacher_subject_association,
+        back_populates="subjects",
+        lazy="raise",
     )
     grades: Mapped[list["Grade"]] = relationship(
-        "Grade", back_populates="subject", cascade="all, delete, delete-orphan"
+        "Grade",
+        back_populates="subject",
+        cascade="all, delete, delete-orphan",
+        lazy="raise",
     )
 
 
 class Grade(Base):
     __tablename__ = "grades"
+    __table_args__ = (
+        # Per-subject reports (select_2, select_3, select_7, select_8)
+        Index(
+            "ix_grades_subject_id_student_id",
+            "subject_id",
+            "student_id",
+            postgresql_include=["grade"],
+        ),
+        # Per-student reports (select_1, select_9, select_10)
+        Index(
+            "ix_grades_student_id_teacher_id",
+            "student_id",
+            "teacher_id",
+            postgresql_include=["subject_id", "grade"],
+        ),
+        Index("ix_grades_teacher_id", "teacher_id"),
+        # Monthly partitions are managed by app.partitions
+        {"postgresql_partition_by": "RANGE (date_received)"},
+    )
+    # The partition key has to be part of the table's primary key, rows are
+    # still identified by 'id' alone
+    __mapper_args__ = {"primary_key": ["id"]}
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     student_id: Mapped[int] = mapped_column(
         ForeignKey("students.id", ondelete="CASCADE")
     )
@@ -81,10 +171,18 @@ class Grade(Base):
         ForeignKey("teachers.id", ondelete="CASCADE")
     )
     grade: Mapped[int] = mapped_column(Integer, nullable=False)
-    date_received: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
-    student: Mapped["Student"] = relationship("Student", back_populates="grades")
-    subject: Mapped["Subject"] = relationship("Subject", back_populates="grades")
-    teacher: Mapped["Teacher"] = relationship("Teacher", back_populates="grades")
+    date_received: Mapped[datetime] = mapped_column(
+        DateTime, primary_key=True, default=datetime.now
+    )
+    student: Mapped["Student"] = relationship(
+        "Student", back_populates="grades", lazy="raise"
+    )
+    subject: Mapped["Subject"] = relationship(
+        "Subject", back_populates="grades", lazy="raise"
+    )
+    teacher: Mapped["Teacher"] = relationship(
+        "Teacher", back_populates="grades", lazy="raise"
+    )
 
     @validates("date_received")
     def validate_time(self, _, value):
@@ -93,6 +191,80 @@ class Grade(Base):
         return value
 
 
+class GradeArchive(Base):
+    """Grades moved out of 'grades' by app.archive or by detaching old
+    partitions (app.partitions). It has no foreign keys, so archived grades
+    are kept when students, subjects or teachers are removed."""
+
+    __tablename__ = "grades_archive"
+    __table_args__ = (
+        Index("ix_grades_archive_student_id", "student_id"),
+        Index("ix_grades_archive_subject_id", "subject_id"),
+        Index("ix_grades_archive_date_received", "date_received"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    student_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    subject_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    teacher_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    grade: Mapped[int] = mapped_column(Integer, nullable=False)
+    date_received: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, server_default=func.now()
+    )
+
+
+event.listen(
+    Grade.__table__,
+    "after_create",
+    DDL("CREATE TABLE grades_default PARTITION OF grades DEFAULT"),
+)
+
+
+class StudentSubjectStats(Base):
+    __tablename__ = "student_subject_stats"
+
+    student_id: Mapped[int] = mapped_column(
+        ForeignKey("students.id", ondelete="CASCADE"), primary_key=True
+    )
+    subject_id: Mapped[int] = mapped_column(
+        ForeignKey("subjects.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+    grade_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    grade_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class StudentStats(Base):
+    __tablename__ = "student_stats"
+
+    student_id: Mapped[int] = mapped_column(
+        ForeignKey("students.id", ondelete="CASCADE"), primary_key=True
+    )
+    grade_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    grade_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class GroupSubjectStats(Base):
+    __tablename__ = "group_subject_stats"
+
+    group_id: Mapped[int] = mapped_column(
+        ForeignKey("groups.id", ondelete="CASCADE"), primary_key=True
+    )
+    subject_id: Mapped[int] = mapped_column(
+        ForeignKey("subjects.id", ondelete="CASCADE"), primary_key=True
+    )
+    grade_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    grade_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class GradeTotals(Base):
+    __tablename__ = "grade_totals"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    grade_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    grade_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
 NAME_TO_TABLE = {
     "Group": Group,
     "Student": Student,
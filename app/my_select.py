@@ -1,206 +1,778 @@
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+import logging
+
+from datetime import datetime
+from decimal import Decimal
 
-from random import choice
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, cast, Integer, Numeric, tuple_, union_all
+from sqlalchemy.orm import aliased
 
+from app.aggregates import average
+from app.archive import ARCHIVE_COLUMNS
+from app.cache import cached
 from app.models import (
     Student,
     Group,
     Teacher,
     Subject,
     Grade,
+    GradeArchive,
+    StudentSubjectStats,
+    StudentStats,
+    GroupSubjectStats,
+    GradeTotals,
     teacher_subject_association,
 )
 from app.logger import LOGGER
+from app.profiles import PROFILES, load
 
 
-async def select_1(session: AsyncSession) -> None:
-    async with session.begin():
+async def pick(session: AsyncSession, table, id: int | None = None):
+    """Fetch the row with the given id, or a random row when id is None.
+
+    The random id is drawn between min(id) and max(id) on the database side,
+    so a single row is returned regardless of the table size.
+    """
+    if id is None:
+        random_id = select(
+            cast(
+                func.min(table.id)
+                + func.floor(
+                    func.random() * (func.max(table.id) - func.min(table.id) + 1)
+                ),
+                Integer,
+            )
+        ).scalar_subquery()
         result = await session.execute(
-            select(Student.name, func.avg(Grade.grade).label("avg_grade"))
-            .join(Grade)
+            select(table).where(table.id >= random_id).order_by(table.id).limit(1)
+        )
+        item = result.scalars().first()
+    else:
+        item = await session.get(table, id)
+    if item is None and id is None:
+        LOGGER.warning(f"There is no items in '{table.__name__}' table")
+    elif item is None:
+        LOGGER.warning(f"'{table.__name__}', 'ID' {id} not found.")
+    return item
+
+
+def grades_source(include_archived: bool = False):
+    """'Grade', or with 'include_archived' an alias of it over 'grades' and
+    'grades_archive' (see app.archive and app.partitions) combined with
+    UNION ALL."""
+    if not include_archived:
+        return Grade
+    grades = union_all(
+        select(*(Grade.__table__.c[name] for name in ARCHIVE_COLUMNS)),
+        select(*(GradeArchive.__table__.c[name] for name in ARCHIVE_COLUMNS)),
+    )
+    return aliased(Grade, grades.subquery("all_grades"))
+
+
+def received_between(
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    grades=Grade,
+) -> list:
+    """Criteria keeping grades received in [date_from, date_to), which let
+    Postgres skip the 'grades' partitions outside of the range."""
+    criteria = []
+    if date_from is not None:
+        criteria.append(grades.date_received >= date_from)
+    if date_to is not None:
+        criteria.append(grades.date_received < date_to)
+    return criteria
+
+
+def _period(
+    date_from: datetime | None, date_to: datetime | None, include_archived=False
+) -> str:
+    archived = " including archived grades" if include_archived else ""
+    if date_from is None and date_to is None:
+        return f" ({archived.strip()})" if archived else ""
+    return f" (from {date_from or '...'} to {date_to or '...'}{archived})"
+
+
+# Reports 1-4 and 8 read the grade aggregates, which cover the grades still in
+# 'grades'. With a date range they are computed from the matching 'grades'
+# partitions instead, and with 'include_archived' from 'grades_archive' too.
+
+
+def query_1(
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    grades = grades_source(include_archived)
+    period = received_between(date_from, date_to, grades)
+    if period or include_archived:
+        avg_grade = func.avg(grades.grade).label("avg_grade")
+        return (
+            select(Student.name, avg_grade)
+            .join(grades, grades.student_id == Student.id)
+            .where(*period)
             .group_by(Student.id, Student.name)
-            .order_by(func.avg(Grade.grade).desc())
+            .order_by(avg_grade.desc())
             .limit(5)
         )
-        students = result.all()
-        LOGGER.info("--------------------------------------------------------")
-        LOGGER.info("Top 5 students by average grade:")
-        for student, avg_grade in students:
-            LOGGER.info(f"Student: '{student}', Avg. grade: '{avg_grade}'")
-        LOGGER.info("--------------------------------------------------------")
+    avg_grade = average(StudentStats)
+    return (
+        select(Student.name, avg_grade)
+        .join(StudentStats, StudentStats.student_id == Student.id)
+        .where(StudentStats.grade_count > 0)
+        .order_by(avg_grade.desc())
+        .limit(5)
+    )
 
 
-async def select_2(session: AsyncSession) -> None:
-    async with session.begin():
-        result = await session.execute(select(Subject))
-        subject = choice(result.scalars().all())
-        result = await session.execute(
-            select(Student.name, func.avg(Grade.grade).label("avg_grade"))
-            .join(Grade)
-            .join(Subject)
-            .where(Subject.id == subject.id)
+def query_2(
+    subject_id: int,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    grades = grades_source(include_archived)
+    period = received_between(date_from, date_to, grades)
+    if period or include_archived:
+        avg_grade = func.avg(grades.grade).label("avg_grade")
+        return (
+            select(Student.name, avg_grade)
+            .join(grades, grades.student_id == Student.id)
+            .where(grades.subject_id == subject_id, *period)
             .group_by(Student.id, Student.name)
-            .order_by(func.avg(Grade.grade).desc())
+            .order_by(avg_grade.desc())
             .limit(1)
         )
-        student, avg_grade = result.first()
-        LOGGER.info("--------------------------------------------------------")
-        LOGGER.info(
-            f"Student with highest average grade on subject '{
-                subject.name}':"
+    avg_grade = average(StudentSubjectStats)
+    return (
+        select(Student.name, avg_grade)
+        .join(StudentSubjectStats, StudentSubjectStats.student_id == Student.id)
+        .where(
+            StudentSubjectStats.subject_id == subject_id,
+            StudentSubjectStats.grade_count > 0,
         )
-        LOGGER.info(f"Student: '{student}', Avg. grade: '{avg_grade}'")
-        LOGGER.info("--------------------------------------------------------")
+        .order_by(avg_grade.desc())
+        .limit(1)
+    )
 
 
-async def select_3(session: AsyncSession) -> None:
-    async with session.begin():
-        result = await session.execute(select(Subject))
-        subject = choice(result.scalars().all())
-        result = await session.execute(
-            select(Group.name, func.avg(Grade.grade).label("avg_grade"))
-            .select_from(Group)
-            .join(Student, Group.id == Student.group_id)
-            .join(Grade, Student.id == Grade.student_id)
-            .join(Subject, Subject.id == Grade.subject_id)
-            .where(Subject.id == subject.id)
+def query_3(
+    subject_id: int,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    grades = grades_source(include_archived)
+    period = received_between(date_from, date_to, grades)
+    if period or include_archived:
+        return (
+            select(Group.name, func.avg(grades.grade).label("avg_grade"))
+            .join(Student, Student.group_id == Group.id)
+            .join(grades, grades.student_id == Student.id)
+            .where(grades.subject_id == subject_id, *period)
             .group_by(Group.id, Group.name)
         )
-        groups = result.all()
-        LOGGER.info("--------------------------------------------------------")
-        LOGGER.info(f"Groups with average grades on subject '{subject.name}':")
-        for group, avg_grade in groups:
-            LOGGER.info(f"Group: '{group}', Avg. grade: '{avg_grade}'")
-        LOGGER.info("--------------------------------------------------------")
+    return (
+        select(Group.name, average(GroupSubjectStats))
+        .join(GroupSubjectStats, GroupSubjectStats.group_id == Group.id)
+        .where(
+            GroupSubjectStats.subject_id == subject_id,
+            GroupSubjectStats.grade_count > 0,
+        )
+    )
 
 
-async def select_4(session: AsyncSession) -> None:
-    async with session.begin():
-        result = await session.execute(
-            select(func.avg(Grade.grade).label("overall_avg"))
+def query_4(
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    grades = grades_source(include_archived)
+    period = received_between(date_from, date_to, grades)
+    if period or include_archived:
+        return select(func.avg(grades.grade).label("overall_avg")).where(*period)
+    return select(average(GradeTotals).label("overall_avg")).where(
+        GradeTotals.grade_count > 0
+    )
+
+
+def query_5(teacher_id: int):
+    return (
+        select(Subject.name)
+        .join(
+            teacher_subject_association,
+            teacher_subject_association.c.subject_id == Subject.id,
         )
-        overall_avg = result.scalar()
-        LOGGER.info("--------------------------------------------------------")
-        LOGGER.info(f"Overall average grade: '{overall_avg}':")
-        LOGGER.info("--------------------------------------------------------")
+        .where(teacher_subject_association.c.teacher_id == teacher_id)
+    )
 
 
-async def select_5(session: AsyncSession) -> None:
-    async with session.begin():
-        result = await session.execute(select(Teacher))
-        teacher = choice(result.scalars().all())
-        result = await session.execute(
-            select(Subject.name)
+def query_6(group_id: int):
+    return select(Student.name).where(Student.group_id == group_id)
+
+
+def query_7(
+    group_id: int,
+    subject_id: int,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    grades = grades_source(include_archived)
+    return (
+        select(Student.name, grades.grade)
+        .join(grades, grades.student_id == Student.id)
+        .where(
+            Student.group_id == group_id,
+            grades.subject_id == subject_id,
+            *received_between(date_from, date_to, grades),
+        )
+        .order_by(Student.name.asc())
+    )
+
+
+def query_8(
+    teacher_id: int,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    grades = grades_source(include_archived)
+    period = received_between(date_from, date_to, grades)
+    if period or include_archived:
+        return (
+            select(Subject.name, func.avg(grades.grade).label("avg_grade"))
             .join(
                 teacher_subject_association,
                 teacher_subject_association.c.subject_id == Subject.id,
             )
-            .where(teacher_subject_association.c.teacher_id == teacher.id)
+            .join(grades, grades.subject_id == Subject.id)
+            .where(teacher_subject_association.c.teacher_id == teacher_id, *period)
+            .group_by(Subject.id, Subject.name)
         )
-        courses = result.scalars().all()
-        LOGGER.info("--------------------------------------------------------")
-        LOGGER.info(f"Courses taught by '{teacher.name}': {courses}")
-        LOGGER.info("--------------------------------------------------------")
+    return (
+        select(
+            Subject.name,
+            (
+                cast(func.sum(GroupSubjectStats.grade_sum), Numeric)
+                / func.sum(GroupSubjectStats.grade_count)
+            ).label("avg_grade"),
+        )
+        .join(
+            teacher_subject_association,
+            teacher_subject_association.c.subject_id == Subject.id,
+        )
+        .join(GroupSubjectStats, GroupSubjectStats.subject_id == Subject.id)
+        .where(teacher_subject_association.c.teacher_id == teacher_id)
+        .group_by(Subject.id, Subject.name)
+        .having(func.sum(GroupSubjectStats.grade_count) > 0)
+    )
+
+
+def query_9(
+    student_id: int,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    grades = grades_source(include_archived)
+    return (
+        select(Subject.name)
+        .join(grades, grades.subject_id == Subject.id)
+        .where(
+            grades.student_id == student_id,
+            *received_between(date_from, date_to, grades),
+        )
+        .group_by(Subject.id, Subject.name)
+    )
+
+
+def query_10(
+    student_id: int,
+    teacher_id: int,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    grades = grades_source(include_archived)
+    return (
+        select(Subject.name)
+        .join(grades, grades.subject_id == Subject.id)
+        .where(
+            grades.student_id == student_id,
+            grades.teacher_id == teacher_id,
+            *received_between(date_from, date_to, grades),
+        )
+        .group_by(Subject.id, Subject.name)
+    )
+
+
+# Matrix reports compute a report for every subject, group or teacher in one
+# query with window functions and GROUPING SETS, instead of one query each.
 
 
-async def select_6(session: AsyncSession) -> None:
+def query_top_students_per_subject(
+    limit: int = 3,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    """The students with the 'limit' best averages of every subject. Students
+    with equal averages get the same rank, so a subject may list more."""
+    grades = grades_source(include_archived)
+    period = received_between(date_from, date_to, grades)
+    if period or include_archived:
+        avg_grade = func.avg(grades.grade)
+        averages = (
+            select(
+                grades.subject_id,
+                grades.student_id,
+                avg_grade.label("avg_grade"),
+                func.rank()
+                .over(partition_by=grades.subject_id, order_by=avg_grade.desc())
+                .label("rank"),
+            )
+            .where(*period)
+            .group_by(grades.subject_id, grades.student_id)
+        )
+    else:
+        avg_grade = average(StudentSubjectStats)
+        averages = select(
+            StudentSubjectStats.subject_id,
+            StudentSubjectStats.student_id,
+            avg_grade,
+            func.rank()
+            .over(
+                partition_by=StudentSubjectStats.subject_id, order_by=avg_grade.desc()
+            )
+            .label("rank"),
+        ).where(StudentSubjectStats.grade_count > 0)
+    ranked = averages.subquery()
+    return (
+        select(Subject.name, Student.name, ranked.c.avg_grade, ranked.c.rank)
+        .join(ranked, ranked.c.subject_id == Subject.id)
+        .join(Student, Student.id == ranked.c.student_id)
+        .where(ranked.c.rank <= limit)
+        .order_by(Subject.name, ranked.c.rank, Student.name)
+    )
+
+
+def query_group_subject_averages(
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    """Average grades per group and subject, along with the per group, per
+    subject and overall averages (NULL group or subject) as GROUPING SETS."""
+    grades = grades_source(include_archived)
+    period = received_between(date_from, date_to, grades)
+    if period or include_archived:
+        group_id, subject_id = Student.group_id, grades.subject_id
+        grade_sum, grade_count = func.sum(grades.grade), func.count(grades.grade)
+        source = (
+            select()
+            .join_from(grades, Student, grades.student_id == Student.id)
+            .where(*period)
+        )
+    else:
+        group_id, subject_id = GroupSubjectStats.group_id, GroupSubjectStats.subject_id
+        grade_sum = func.sum(GroupSubjectStats.grade_sum)
+        grade_count = func.sum(GroupSubjectStats.grade_count)
+        source = select().select_from(GroupSubjectStats)
+    averages = (
+        source.add_columns(
+            group_id.label("group_id"),
+            subject_id.label("subject_id"),
+            (cast(grade_sum, Numeric) / func.nullif(grade_count, 0)).label("avg_grade"),
+        )
+        .group_by(
+            func.grouping_sets(
+                tuple_(group_id, subject_id),
+                tuple_(group_id),
+                tuple_(subject_id),
+                tuple_(),
+            )
+        )
+        .having(grade_count > 0)
+        .subquery()
+    )
+    return (
+        select(Group.name, Subject.name, averages.c.avg_grade)
+        .select_from(averages)
+        .outerjoin(Group, Group.id == averages.c.group_id)
+        .outerjoin(Subject, Subject.id == averages.c.subject_id)
+        .order_by(Group.name.nulls_first(), Subject.name.nulls_first())
+    )
+
+
+def query_teacher_subject_averages(
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+):
+    """Average of the grades given by every teacher per subject, along with
+    each teacher's overall average (NULL subject), in one pass over 'grades'."""
+    grades = grades_source(include_archived)
+    averages = (
+        select(
+            grades.teacher_id,
+            grades.subject_id,
+            func.avg(grades.grade).label("avg_grade"),
+        )
+        .where(*received_between(date_from, date_to, grades))
+        .group_by(
+            func.grouping_sets(
+                tuple_(grades.teacher_id, grades.subject_id), tuple_(grades.teacher_id)
+            )
+        )
+        .subquery()
+    )
+    return (
+        select(Teacher.id, Teacher.name, Subject.name, averages.c.avg_grade)
+        .join(averages, averages.c.teacher_id == Teacher.id)
+        .outerjoin(Subject, Subject.id == averages.c.subject_id)
+        .order_by(Teacher.name, Teacher.id, Subject.name.nulls_first())
+    )
+
+
+REPORT_SEPARATOR = "-" * 56
+
+
+def log_report(title: str, rows=(), row_format: str = "") -> None:
+    """Log a report as a single record: its title and one line per row.
+
+    Rows are only formatted when INFO is enabled. The title and the number
+    of rows are attached as 'report' and 'rows' for the JSON log format.
+    """
+    if not LOGGER.isEnabledFor(logging.INFO):
+        return
+    lines = [row_format.format(*row) for row in rows]
+    LOGGER.info(
+        "\n".join([REPORT_SEPARATOR, title, *lines, REPORT_SEPARATOR]),
+        extra={"report": title, "rows": len(rows)},
+    )
+
+
+@cached(Student, Grade)
+async def select_1(
+    session: AsyncSession,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> list:
+    async with session.begin():
+        result = await session.execute(query_1(date_from, date_to, include_archived))
+        students = result.all()
+        log_report(
+            "Top 5 students by average grade"
+            f"{_period(date_from, date_to, include_archived)}:",
+            students,
+            "Student: '{}', Avg. grade: '{}'",
+        )
+        return students
+
+
+@cached(Student, Subject, Grade)
+async def select_2(
+    session: AsyncSession,
+    subject_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> tuple | None:
     async with session.begin():
-        result = await session.execute(select(Group))
-        group = choice(result.scalars().all())
+        subject = await pick(session, Subject, subject_id)
+        if subject is None:
+            return
         result = await session.execute(
-            select(Student.name).join(Group).where(Group.name == group.name)
+            query_2(subject.id, date_from, date_to, include_archived)
         )
-        students = result.scalars().all()
-        LOGGER.info("--------------------------------------------------------")
-        LOGGER.info(f"Students in group '{group.name}': {students}")
-        LOGGER.info("--------------------------------------------------------")
+        best = result.first()
+        log_report(
+            f"Student with highest average grade on subject '{subject.name}'"
+            f"{_period(date_from, date_to, include_archived)}:",
+            [best] if best is not None else [],
+            "Student: '{}', Avg. grade: '{}'",
+        )
+        return best
 
 
-async def select_7(session: AsyncSession) -> None:
+@cached(Group, Student, Subject, Grade)
+async def select_3(
+    session: AsyncSession,
+    subject_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> list:
     async with session.begin():
-        result = await session.execute(select(Subject))
-        subject = choice(result.scalars().all())
-        result = await session.execute(select(Group))
-        group = choice(result.scalars().all())
+        subject = await pick(session, Subject, subject_id)
+        if subject is None:
+            return
         result = await session.execute(
-            select(Student.name, Grade.grade)
-            .join(Grade)
-            .where(Student.group_id == group.id, Grade.subject_id == subject.id)
-            .order_by(Student.name.asc())
+            query_3(subject.id, date_from, date_to, include_archived)
         )
-        students = result.all()
-        LOGGER.info("--------------------------------------------------------")
-        LOGGER.info(
-            f"Students' grades from group '{
-                group.name}' on subject '{subject.name}':"
+        groups = result.all()
+        log_report(
+            f"Groups with average grades on subject '{subject.name}'"
+            f"{_period(date_from, date_to, include_archived)}:",
+            groups,
+            "Group: '{}', Avg. grade: '{}'",
         )
-        for student, grade in students:
-            LOGGER.info(f"Student: '{student}', Grade: '{grade}'")
-        LOGGER.info("--------------------------------------------------------")
+        return groups
 
 
-async def select_8(session: AsyncSession) -> None:
+@cached(Grade)
+async def select_4(
+    session: AsyncSession,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> Decimal | None:
     async with session.begin():
-        result = await session.execute(select(Teacher))
-        teacher = choice(result.scalars().all())
+        result = await session.execute(query_4(date_from, date_to, include_archived))
+        overall_avg = result.scalar()
+        log_report(
+            "Overall average grade"
+            f"{_period(date_from, date_to, include_archived)}: '{overall_avg}':"
+        )
+        return overall_avg
+
+
+@cached(Teacher, Subject)
+async def select_5(session: AsyncSession, teacher_id: int | None = None) -> list[str]:
+    async with session.begin():
+        teacher = await pick(session, Teacher, teacher_id)
+        if teacher is None:
+            return
+        result = await session.execute(query_5(teacher.id))
+        courses = result.scalars().all()
+        log_report(f"Courses taught by '{teacher.name}': {courses}")
+        return courses
+
+
+@cached(Group, Student)
+async def select_6(session: AsyncSession, group_id: int | None = None) -> list[str]:
+    async with session.begin():
+        group = await pick(session, Group, group_id)
+        if group is None:
+            return
+        result = await session.execute(query_6(group.id))
+        students = result.scalars().all()
+        log_report(f"Students in group '{group.name}': {students}")
+        return students
+
+
+@cached(Group, Student, Subject, Grade)
+async def select_7(
+    session: AsyncSession,
+    group_id: int | None = None,
+    subject_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> list:
+    async with session.begin():
+        subject = await pick(session, Subject, subject_id)
+        group = await pick(session, Group, group_id)
+        if subject is None or group is None:
+            return
         result = await session.execute(
-            select(Subject.name, func.avg(Grade.grade).label("avg_grade"))
-            .join(
-                teacher_subject_association,
-                teacher_subject_association.c.subject_id == Subject.id,
-            )
-            .join(Grade)
-            .where(
-                teacher_subject_association.c.teacher_id == teacher.id,
-                Grade.subject_id == teacher_subject_association.c.subject_id,
-            )
-            .group_by(Subject.id, Subject.name)
+            query_7(group.id, subject.id, date_from, date_to, include_archived)
+        )
+        students = result.all()
+        log_report(
+            f"Students' grades from group '{group.name}' on subject '{subject.name}'"
+            f"{_period(date_from, date_to, include_archived)}:",
+            students,
+            "Student: '{}', Grade: '{}'",
         )
+        return students
+
 
-        LOGGER.info("--------------------------------------------------------")
-        LOGGER.info(
-            f"Average grades for subjects by teacher '{
-                teacher.name}':"
+@cached(Teacher, Subject, Grade)
+async def select_8(
+    session: AsyncSession,
+    teacher_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> list:
+    async with session.begin():
+        teacher = await pick(session, Teacher, teacher_id)
+        if teacher is None:
+            return
+        result = await session.execute(
+            query_8(teacher.id, date_from, date_to, include_archived)
         )
         subjects = result.all()
-        for subject, grade in subjects:
-            LOGGER.info(f"Subject: '{subject}', Grade: '{grade}'")
-        LOGGER.info("--------------------------------------------------------")
+        log_report(
+            f"Average grades for subjects by teacher '{teacher.name}'"
+            f"{_period(date_from, date_to, include_archived)}:",
+            subjects,
+            "Subject: '{}', Grade: '{}'",
+        )
+        return subjects
 
 
-async def select_9(session: AsyncSession) -> None:
+@cached(Student, Subject, Grade)
+async def select_9(
+    session: AsyncSession,
+    student_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> list[str]:
     async with session.begin():
-        result = await session.execute(select(Student))
-        student = choice(result.scalars().all())
+        student = await pick(session, Student, student_id)
+        if student is None:
+            return
         result = await session.execute(
-            select(Subject.name)
-            .join(Grade, Grade.subject_id == Subject.id)
-            .where(Grade.student_id == student.id)
-            .group_by(Subject.id, Subject.name)
+            query_9(student.id, date_from, date_to, include_archived)
         )
         subjects = result.scalars().all()
-        LOGGER.info("--------------------------------------------------------")
-        LOGGER.info(f"Student '{student.name}' attends subjects: {subjects}")
-        LOGGER.info("--------------------------------------------------------")
+        log_report(
+            f"Student '{student.name}' attends subjects"
+            f"{_period(date_from, date_to, include_archived)}: "
+            f"{subjects}"
+        )
+        return subjects
 
 
-async def select_10(session: AsyncSession) -> None:
+@cached(Student, Teacher, Subject, Grade)
+async def select_10(
+    session: AsyncSession,
+    student_id: int | None = None,
+    teacher_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> list[str]:
     async with session.begin():
-        result = await session.execute(select(Student))
-        student = choice(result.scalars().all())
-        result = await session.execute(select(Teacher))
-        teacher = choice(result.scalars().all())
+        student = await pick(session, Student, student_id)
+        teacher = await pick(session, Teacher, teacher_id)
+        if student is None or teacher is None:
+            return
         result = await session.execute(
-            select(Subject.name)
-            .join(Grade, Grade.subject_id == Subject.id)
-            .where(Grade.student_id == student.id, Grade.teacher_id == teacher.id)
-            .group_by(Subject.id, Subject.name)
+            query_10(student.id, teacher.id, date_from, date_to, include_archived)
         )
         subjects = result.scalars().all()
-        LOGGER.info("--------------------------------------------------------")
-        LOGGER.info(
-            f"Student '{student.name}' attends subjects: {
-                subjects}, taught by teacher '{teacher.name}'"
+        log_report(
+            f"Student '{student.name}' attends subjects: {subjects}, "
+            f"taught by teacher '{teacher.name}'"
+            f"{_period(date_from, date_to, include_archived)}"
         )
-        LOGGER.info("--------------------------------------------------------")
+        return subjects
+
+
+@cached(Student, Subject, Grade)
+async def select_top_students_per_subject(
+    session: AsyncSession,
+    limit: int = 3,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> dict[str, list[tuple]]:
+    """Map every subject to its top students as (student, avg_grade, rank)."""
+    async with session.begin():
+        result = await session.execute(
+            query_top_students_per_subject(limit, date_from, date_to, include_archived)
+        )
+        rows = result.all()
+    top = {}
+    for subject, student, avg_grade, rank in rows:
+        top.setdefault(subject, []).append((student, avg_grade, rank))
+    log_report(
+        f"Top {limit} students per subject"
+        f"{_period(date_from, date_to, include_archived)}:",
+        rows,
+        "Subject: '{}', Student: '{}', Avg. grade: '{}', Rank: {}",
+    )
+    return top
+
+
+@cached(Group, Student, Subject, Grade)
+async def select_group_subject_averages(
+    session: AsyncSession,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> dict:
+    """Average grades as {"groups": {group: {"avg_grade", "subjects":
+    {subject: avg_grade}}}, "subjects": {subject: avg_grade}, "avg_grade"}."""
+    async with session.begin():
+        result = await session.execute(
+            query_group_subject_averages(date_from, date_to, include_archived)
+        )
+        rows = result.all()
+    averages = {"groups": {}, "subjects": {}, "avg_grade": None}
+    for group, subject, avg_grade in rows:
+        if group is None and subject is None:
+            averages["avg_grade"] = avg_grade
+        elif group is None:
+            averages["subjects"][subject] = avg_grade
+        else:
+            entry = averages["groups"].setdefault(
+                group, {"avg_grade": None, "subjects": {}}
+            )
+            if subject is None:
+                entry["avg_grade"] = avg_grade
+            else:
+                entry["subjects"][subject] = avg_grade
+    log_report(
+        "Average grades per group and subject"
+        f"{_period(date_from, date_to, include_archived)}:",
+        rows,
+        "Group: '{}', Subject: '{}', Avg. grade: '{}'",
+    )
+    return averages
+
+
+@cached(Teacher, Subject, Grade)
+async def select_teacher_subject_averages(
+    session: AsyncSession,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    include_archived: bool = False,
+) -> dict[int, dict]:
+    """Map every teacher id to {"name", "avg_grade", "subjects": {subject:
+    avg_grade}} for the grades they gave. Teacher names are not unique."""
+    async with session.begin():
+        result = await session.execute(
+            query_teacher_subject_averages(date_from, date_to, include_archived)
+        )
+        rows = result.all()
+    averages = {}
+    for teacher_id, teacher, subject, avg_grade in rows:
+        entry = averages.setdefault(
+            teacher_id, {"name": teacher, "avg_grade": None, "subjects": {}}
+        )
+        if subject is None:
+            entry["avg_grade"] = avg_grade
+        else:
+            entry["subjects"][subject] = avg_grade
+    log_report(
+        "Average grades per teacher and subject"
+        f"{_period(date_from, date_to, include_archived)}:",
+        rows,
+        "Teacher ID: {}, Teacher: '{}', Subject: '{}', Avg. grade: '{}'",
+    )
+    return averages
+
+
+async def select_profile(
+    session: AsyncSession,
+    profile: str,
+    ids: list[int] | None = None,
+    limit: int | None = None,
+) -> list[dict]:
+    """The entities of a loading profile (see app.profiles), e.g. students
+    with their group and grade count, as nested dicts. Related rows are
+    loaded eagerly, with a fixed number of queries however many entities."""
+    rows = await load(session, profile, ids, limit)
+    log_report(
+        f"{PROFILES[profile].description}:",
+        [(row["id"], row) for row in rows],
+        "ID: {}, {}",
+    )
+    return rows
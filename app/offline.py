@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import time
+
+from collections.abc import Sequence
+
+import numpy as np
+
+import app.my_select as queries
+
+from app.columnar import load
+from app.database import AsyncSessionLocal
+from app.logger import LOGGER
+
+
+def _sum_count(keys: np.ndarray, values: np.ndarray, size: int):
+    """Vectorized GROUP BY on small non-negative integer keys: sum and count
+    of 'values' per key in 0..size-1."""
+    sums = np.bincount(keys, weights=values, minlength=size)
+    counts = np.bincount(keys, minlength=size)
+    return sums, counts
+
+
+def _top_averages(keys: np.ndarray, values: np.ndarray, size: int, limit: int):
+    sums, counts = _sum_count(keys, values, size)
+    present = np.flatnonzero(counts)
+    averages = sums[present] / counts[present]
+    order = np.argsort(-averages, kind="stable")[:limit]
+    return present[order], averages[order]
+
+
+class OfflineReports:
+    """The reports of app.my_select computed from a columnar export (see
+    app.columnar) with vectorized group-bys, without touching the database.
+
+    Reports return the same rows as their SQL versions, with float averages.
+    Entity ids are required, random entities are not picked.
+    """
+
+    def __init__(self, data: dict[str, dict[str, np.ndarray]]):
+        self.grades = data["grades"]
+        self.teacher_subjects = data["teacher_subjects"]
+        self.students = data["students"]
+        self.names = {
+            table: dict(zip(data[table]["id"].tolist(), data[table]["name"].tolist()))
+            for table in ("students", "groups", "subjects", "teachers")
+        }
+        # Keys are ids, so group-by arrays are sized by the largest id
+        self.sizes = {
+            column: int(data[table]["id"].max(initial=0)) + 1
+            for column, table in (
+                ("student_id", "students"),
+                ("group_id", "groups"),
+                ("subject_id", "subjects"),
+            )
+        }
+
+    @classmethod
+    def from_export(cls, path: str) -> "OfflineReports":
+        return cls(load(path))
+
+    def _select(self, *conditions, date_from=None, date_to=None) -> np.ndarray:
+        """Indices of the grades matching all conditions and the date range."""
+        mask = np.ones(len(self.grades["grade"]), dtype=bool)
+        for condition in conditions:
+            mask &= condition
+        if date_from is not None:
+            mask &= self.grades["date_received"] >= np.datetime64(date_from, "us")
+        if date_to is not None:
+            mask &= self.grades["date_received"] < np.datetime64(date_to, "us")
+        return np.flatnonzero(mask)
+
+    def _column(self, name: str, rows: np.ndarray | None = None) -> np.ndarray:
+        column = self.grades[name]
+        return column if rows is None else column[rows]
+
+    def _rows(self, *conditions, date_from=None, date_to=None):
+        if not conditions and date_from is None and date_to is None:
+            return None
+        return self._select(*conditions, date_from=date_from, date_to=date_to)
+
+    def _teacher_subjects(self, teacher_id: int) -> np.ndarray:
+        return self.teacher_subjects["subject_id"][
+            self.teacher_subjects["teacher_id"] == teacher_id
+        ]
+
+    def report_1(self, date_from=None, date_to=None):
+        rows = self._rows(date_from=date_from, date_to=date_to)
+        ids, averages = _top_averages(
+            self._column("student_id", rows),
+            self._column("grade", rows),
+            self.sizes["student_id"],
+            5,
+        )
+        names = self.names["students"]
+        return [(names[id], avg) for id, avg in zip(ids.tolist(), averages.tolist())]
+
+    def report_2(self, subject_id: int, date_from=None, date_to=None):
+        rows = self._rows(
+            self.grades["subject_id"] == subject_id,
+            date_from=date_from,
+            date_to=date_to,
+        )
+        ids, averages = _top_averages(
+            self._column("student_id", rows),
+            self._column("grade", rows),
+            self.sizes["student_id"],
+            1,
+        )
+        if not len(ids):
+            return None
+        return (self.names["students"][int(ids[0])], float(averages[0]))
+
+    def report_3(self, subject_id: int, date_from=None, date_to=None):
+        rows = self._rows(
+            self.grades["subject_id"] == subject_id,
+            date_from=date_from,
+            date_to=date_to,
+        )
+        sums, counts = _sum_count(
+            self._column("group_id", rows),
+            self._column("grade", rows),
+            self.sizes["group_id"],
+        )
+        names = self.names["groups"]
+        return [
+            (names[id], float(sums[id] / counts[id]))
+            for id in np.flatnonzero(counts).tolist()
+        ]
+
+    def report_4(self, date_from=None, date_to=None):
+        rows = self._rows(date_from=date_from, date_to=date_to)
+        grades = self._column("grade", rows)
+        return float(grades.mean(dtype=np.float64)) if len(grades) else None
+
+    def report_5(self, teacher_id: int):
+        names = self.names["subjects"]
+        return [names[id] for id in self._teacher_subjects(teacher_id).tolist()]
+
+    def report_6(self, group_id: int):
+        students = self.students["id"][self.students["group_id"] == group_id]
+        names = self.names["students"]
+        return [names[id] for id in students.tolist()]
+
+    def report_7(self, group_id: int, subject_id: int, date_from=None, date_to=None):
+        rows = self._select(
+            self.grades["group_id"] == group_id,
+            self.grades["subject_id"] == subject_id,
+            date_from=date_from,
+            date_to=date_to,
+        )
+        names = self.names["students"]
+        result = [
+            (names[id], grade)
+            for id, grade in zip(
+                self._column("student_id", rows).tolist(),
+                self._column("grade", rows).tolist(),
+            )
+        ]
+        return sorted(result, key=lambda row: row[0])
+
+    def report_8(self, teacher_id: int, date_from=None, date_to=None):
+        rows = self._rows(date_from=date_from, date_to=date_to)
+        sums, counts = _sum_count(
+            self._column("subject_id", rows),
+            self._column("grade", rows),
+            self.sizes["subject_id"],
+        )
+        names = self.names["subjects"]
+        return [
+            (names[id], float(sums[id] / counts[id]))
+            for id in self._teacher_subjects(teacher_id).tolist()
+            if id < len(counts) and counts[id]
+        ]
+
+    def report_9(self, student_id: int, date_from=None, date_to=None):
+        rows = self._select(
+            self.grades["student_id"] == student_id,
+            date_from=date_from,
+            date_to=date_to,
+        )
+        names = self.names["subjects"]
+        return [
+            names[id] for id in np.unique(self._column("subject_id", rows)).tolist()
+        ]
+
+    def report_10(self, student_id: int, teacher_id: int, date_from=None, date_to=None):
+        rows = self._select(
+            self.grades["student_id"] == student_id,
+            self.grades["teacher_id"] == teacher_id,
+            date_from=date_from,
+            date_to=date_to,
+        )
+        names = self.names["subjects"]
+        return [
+            names[id] for id in np.unique(self._column("subject_id", rows)).tolist()
+        ]
+
+
+def _normalize(value):
+    """Make a report result comparable regardless of row order and of the
+    Decimal/float type of averages."""
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        items = [_normalize(item) for item in value]
+        return sorted(items) if isinstance(value, list) else tuple(items)
+    if value is None or isinstance(value, str):
+        return value
+    return round(float(value), 6)
+
+
+async def compare_with_sql(
+    session, reports: OfflineReports, ids: dict[str, int], **period
+) -> list[str]:
+    """Run every report offline and against the database with the same ids
+    and date range. Returns the names of the reports whose results differ.
+
+    Top-N reports (1 and 2) compare their averages only, as students with
+    equal averages may be ordered differently.
+    """
+    calls = {
+        1: ((), True),
+        2: ((ids["subject_id"],), True),
+        3: ((ids["subject_id"],), True),
+        4: ((), True),
+        5: ((ids["teacher_id"],), False),
+        6: ((ids["group_id"],), False),
+        7: ((ids["group_id"], ids["subject_id"]), True),
+        8: ((ids["teacher_id"],), True),
+        9: ((ids["student_id"],), True),
+        10: ((ids["student_id"], ids["teacher_id"]), True),
+    }
+    mismatches = []
+    for number, (args, dated) in calls.items():
+        kwargs = period if dated else {}
+        expected = await getattr(queries, f"select_{number}")(session, *args, **kwargs)
+        actual = getattr(reports, f"report_{number}")(*args, **kwargs)
+        if number == 1:
+            expected = [avg for _, avg in expected]
+            actual = [avg for _, avg in actual]
+        elif number == 2 and expected is not None:
+            expected, actual = expected[1], actual and actual[1]
+        if _normalize(expected) != _normalize(actual):
+            LOGGER.warning(f"select_{number}: SQL {expected!r} != offline {actual!r}")
+            mismatches.append(f"select_{number}")
+    return mismatches
+
+
+async def main(args):
+    start = time.perf_counter()
+    reports = OfflineReports.from_export(args.path)
+    LOGGER.info(f"Export loaded in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    ids = {
+        "student_id": args.student_id,
+        "group_id": args.group_id,
+        "subject_id": args.subject_id,
+        "teacher_id": args.teacher_id,
+    }
+    start = time.perf_counter()
+    results = {
+        "report_1": reports.report_1(),
+        "report_2": reports.report_2(ids["subject_id"]),
+        "report_3": reports.report_3(ids["subject_id"]),
+        "report_4": reports.report_4(),
+        "report_5": reports.report_5(ids["teacher_id"]),
+        "report_6": reports.report_6(ids["group_id"]),
+        "report_7": reports.report_7(ids["group_id"], ids["subject_id"]),
+        "report_8": reports.report_8(ids["teacher_id"]),
+        "report_9": reports.report_9(ids["student_id"]),
+        "report_10": reports.report_10(ids["student_id"], ids["teacher_id"]),
+    }
+    elapsed = (time.perf_counter() - start) * 1000
+    for name, result in results.items():
+        LOGGER.info(f"{name}: {result}")
+    LOGGER.info(f"10 reports computed offline in {elapsed:.2f} ms")
+
+    if args.check:
+        async with AsyncSessionLocal() as session:
+            mismatches = await compare_with_sql(session, reports, ids)
+        if mismatches:
+            LOGGER.error(f"Offline results differ from SQL: {mismatches}")
+        else:
+            LOGGER.info("Offline results match the SQL reports.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run reports on a columnar export")
+    parser.add_argument("path", help="Directory written by app.columnar")
+    parser.add_argument("--student-id", type=int, default=1)
+    parser.add_argument("--group-id", type=int, default=1)
+    parser.add_argument("--subject-id", type=int, default=1)
+    parser.add_argument("--teacher-id", type=int, default=1)
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Compare the results with the SQL reports (needs the database)",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import re
+
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import aggregates
+from app.archive import ARCHIVE_COLUMNS
+from app.cache import REPORT_CACHE
+from app.database import AsyncSessionLocal
+from app.logger import LOGGER
+from app.models import Grade, GradeArchive
+
+# 'grades' is range partitioned by 'date_received' with one partition per
+# month, e.g. 'grades_2024_09'. Rows outside of them land in the default one.
+DEFAULT_PARTITION = "grades_default"
+PARTITION_PATTERN = re.compile(r"grades_(\d{4})_(\d{2})")
+
+PARTITION_MONTHS_AHEAD = 3
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"grades_{month:%Y_%m}"
+
+
+async def is_partitioned(session: AsyncSession) -> bool:
+    result = await session.execute(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass('grades'))"
+        )
+    )
+    return result.scalar()
+
+
+async def list_partitions(session: AsyncSession) -> dict[str, str]:
+    """Map the name of every partition of 'grades' to its bounds."""
+    result = await session.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass('grades') ORDER BY c.relname"
+        )
+    )
+    return dict(result.all())
+
+
+async def _create_partition(
+    session: AsyncSession, name: str, start: datetime, end: datetime
+) -> int:
+    # Rows of the range already stored in the default partition have to be
+    # moved out of it before the range can be attached
+    await session.execute(text(f'CREATE TABLE "{name}" (LIKE grades)'))
+    result = await session.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE date_received >= :start AND date_received < :end RETURNING *) "
+            f'INSERT INTO "{name}" SELECT * FROM moved'
+        ),
+        {"start": start, "end": end},
+    )
+    await session.execute(
+        text(
+            f'ALTER TABLE grades ATTACH PARTITION "{name}" '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+    return result.rowcount
+
+
+async def create_partitions(
+    session: AsyncSession,
+    start: datetime | None = None,
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+) -> list[str]:
+    """Create the missing monthly partitions from the month of 'start' (the
+    current one by default) up to 'months_ahead' months from now.
+
+    Each partition is created in its own short transaction. Returns the names
+    of the created partitions.
+    """
+    async with session.begin():
+        if not await is_partitioned(session):
+            LOGGER.warning("'grades' is not partitioned, run the migrations first.")
+            return []
+        existing = await list_partitions(session)
+
+    last = month_start(datetime.now())
+    for _ in range(months_ahead):
+        last = next_month(last)
+
+    created = []
+    month = month_start(start or datetime.now())
+    while month <= last:
+        name = partition_name(month)
+        if name not in existing:
+            async with session.begin():
+                moved = await _create_partition(session, name, month, next_month(month))
+            LOGGER.info(f"Partition '{name}' created ({moved} rows moved).")
+            created.append(name)
+        month = next_month(month)
+    return created
+
+
+async def _archive(session: AsyncSession, name: str) -> None:
+    # Archived grades all live in 'grades_archive', which the reports read
+    # with 'include_archived' (see app.my_select.grades_source)
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    await session.execute(
+        text(
+            f"INSERT INTO {GradeArchive.__tablename__} ({columns}) "
+            f'SELECT {columns} FROM "{name}"'
+        )
+    )
+    await session.execute(text(f'DROP TABLE "{name}"'))
+
+
+async def detach_partitions(
+    session: AsyncSession, before: datetime, drop: bool = False
+) -> list[str]:
+    """Detach the monthly partitions holding only grades older than 'before'.
+
+    Their grades are subtracted from the aggregates and moved into
+    'grades_archive' (see app.archive), or dropped when 'drop' is set.
+    Returns the names of the detached partitions.
+    """
+    async with session.begin():
+        existing = await list_partitions(session)
+
+    detached = []
+    for name in existing:
+        match = PARTITION_PATTERN.fullmatch(name)
+        if not match:
+            continue
+        month = datetime(int(match[1]), int(match[2]), 1)
+        end = next_month(month)
+        if end > before:
+            continue
+        async with session.begin():
+            # Writes to the month wait until it is detached, so the grades
+            # subtracted are the ones archived
+            await session.execute(
+                text(f'LOCK TABLE "{name}" IN SHARE ROW EXCLUSIVE MODE')
+            )
+            await aggregates.subtract_grades(
+                session, Grade.date_received >= month, Grade.date_received < end
+            )
+            await session.execute(text(f'ALTER TABLE grades DETACH PARTITION "{name}"'))
+            if drop:
+                await session.execute(text(f'DROP TABLE "{name}"'))
+            else:
+                await _archive(session, name)
+        REPORT_CACHE.invalidate(Grade)
+        LOGGER.info(f"Partition '{name}' {'dropped' if drop else 'archived'}.")
+        detached.append(name)
+    return detached
+
+
+async def main(args):
+    async with AsyncSessionLocal() as session:
+        if args.command == "create":
+            await create_partitions(session, args.start, args.months_ahead)
+        elif args.command == "detach":
+            await detach_partitions(session, args.before, args.drop)
+        else:
+            async with session.begin():
+                partitions = await list_partitions(session)
+            for name, bounds in partitions.items():
+                LOGGER.info(f"{name}: {bounds}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage 'grades' partitions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="List the partitions of 'grades'")
+
+    create_parser = subparsers.add_parser(
+        "create", help="Create monthly partitions ahead of time"
+    )
+    create_parser.add_argument(
+        "--start",
+        type=datetime.fromisoformat,
+        help="First month to create a partition for (the current one by default)",
+    )
+    create_parser.add_argument(
+        "--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD
+    )
+
+    detach_parser = subparsers.add_parser(
+        "detach", help="Detach (archive) partitions of old grades"
+    )
+    detach_parser.add_argument(
+        "--before",
+        type=datetime.fromisoformat,
+        required=True,
+        help="Detach partitions of months ending before this date",
+    )
+    detach_parser.add_argument(
+        "--drop", action="store_true", help="Drop detached partitions"
+    )
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,132 @@
+from sqlalchemy import func, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.sql import select
+
+from app.models import Student, Group, Teacher, Subject, StudentStats
+
+
+class LoadingProfile:
+    """A named way to load a model along with related data.
+
+    'options' are loader options eagerly loading relationships: 'joinedload'
+    for many-to-one relationships (same statement) and 'selectinload' for
+    collections (one more statement per batch of rows). 'columns' are extra
+    values computed in the same statement, e.g. aggregate subqueries. Every
+    other relationship keeps raising on access (see app.models).
+    """
+
+    def __init__(self, model, description: str, options=(), columns=None):
+        self.model = model
+        self.description = description
+        self.options = list(options)
+        self.columns = {
+            name: column.label(name) for name, column in (columns or {}).items()
+        }
+
+    def query(self):
+        """SELECT of the model and the extra columns, ordered by id."""
+        return (
+            select(self.model, *self.columns.values())
+            .options(*self.options)
+            .order_by(self.model.id)
+        )
+
+
+def _columns(item) -> dict:
+    return {
+        attribute.key: getattr(item, attribute.key)
+        for attribute in inspect(item).mapper.column_attrs
+    }
+
+
+def to_dict(item, **extra) -> dict:
+    """The columns of 'item', its loaded relationships (as dicts of their
+    columns) and 'extra'. Unloaded relationships are left out, so this never
+    triggers a lazy load."""
+    state = inspect(item)
+    data = _columns(item)
+    for relationship in state.mapper.relationships:
+        if relationship.key in state.unloaded:
+            continue
+        related = getattr(item, relationship.key)
+        if relationship.uselist:
+            data[relationship.key] = [_columns(value) for value in related]
+        else:
+            data[relationship.key] = related and _columns(related)
+    data.update(extra)
+    return data
+
+
+PROFILES = {
+    "students_with_group": LoadingProfile(
+        Student,
+        "Students with their group and grade count",
+        options=[joinedload(Student.group)],
+        columns={
+            # Read from the aggregates instead of counting grades
+            "grade_count": func.coalesce(
+                select(StudentStats.grade_count)
+                .where(StudentStats.student_id == Student.id)
+                .scalar_subquery(),
+                0,
+            )
+        },
+    ),
+    "students_with_grades": LoadingProfile(
+        Student,
+        "Students with their group and grades",
+        options=[joinedload(Student.group), selectinload(Student.grades)],
+    ),
+    "groups_with_students": LoadingProfile(
+        Group,
+        "Groups with their students",
+        options=[selectinload(Group.students)],
+        columns={
+            "student_count": select(func.count())
+            .where(Student.group_id == Group.id)
+            .scalar_subquery()
+        },
+    ),
+    "teachers_with_subjects": LoadingProfile(
+        Teacher,
+        "Teachers with the subjects they teach",
+        options=[selectinload(Teacher.subjects)],
+    ),
+    "subjects_with_teachers": LoadingProfile(
+        Subject,
+        "Subjects with their teachers",
+        options=[selectinload(Subject.teachers)],
+    ),
+}
+
+
+def get_profile(name: str, model=None) -> LoadingProfile:
+    """Look up a profile by name, checking that it loads 'model' if given."""
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown loading profile: {name!r}")
+    if model is not None and profile.model is not model:
+        raise ValueError(
+            f"Loading profile {name!r} loads '{profile.model.__name__}', "
+            f"not '{model.__name__}'"
+        )
+    return profile
+
+
+async def load(
+    session: AsyncSession, name: str, ids=None, limit: int | None = None
+) -> list[dict]:
+    """Load the rows of a profile (only 'ids' if given) as nested dicts."""
+    profile = get_profile(name)
+    query = profile.query()
+    if ids is not None:
+        query = query.where(profile.model.id.in_(ids))
+    if limit is not None:
+        query = query.limit(limit)
+    async with session.begin():
+        result = await session.execute(query)
+        return [
+            to_dict(item, **dict(zip(profile.columns, extra)))
+            for item, *extra in result.all()
+        ]
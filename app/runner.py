@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import time
+
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+import app.my_select as queries
+
+from app.cache import REPORT_CACHE
+from app.database import REPLICAS, RoutingSession, make_engine
+from app.instrumentation import INSTRUMENTATION
+from app.logger import LOGGER
+
+REPORTS = {f"select_{i}": getattr(queries, f"select_{i}") for i in range(1, 11)}
+
+DEFAULT_CONCURRENCY = 5
+
+
+async def _run_report(
+    sessionmaker: async_sessionmaker, semaphore: asyncio.Semaphore, name: str
+) -> dict:
+    async with semaphore:
+        start = time.perf_counter()
+        error = None
+        try:
+            async with sessionmaker() as session:
+                await REPORTS[name](session)
+        except Exception as e:
+            error = str(e)
+            LOGGER.warning(f"Report '{name}' failed: {e}")
+        return {
+            "report": name,
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+            "error": error,
+        }
+
+
+async def run_reports(
+    names: list[str] | None = None,
+    engine: AsyncEngine | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> list[dict]:
+    """Run reports concurrently, each in its own session.
+
+    At most 'concurrency' reports run at the same time. When no engine is
+    given, one is created with a pool sized to 'concurrency' and disposed
+    afterwards. Returns the timing of every report.
+    """
+    names = names or list(REPORTS)
+    unknown = set(names) - set(REPORTS)
+    if unknown:
+        raise ValueError(f"Unknown reports: {unknown}")
+
+    own_engine = engine is None
+    if own_engine:
+        engine = make_engine(pool_size=concurrency, max_overflow=0)
+        if INSTRUMENTATION.attached:
+            INSTRUMENTATION.attach(engine)
+    # Reports read from the replicas when there are some
+    sessionmaker = async_sessionmaker(
+        bind=engine,
+        expire_on_commit=False,
+        sync_session_class=RoutingSession,
+        replicas=REPLICAS,
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    start = time.perf_counter()
+    try:
+        timings = await asyncio.gather(
+            *(_run_report(sessionmaker, semaphore, name) for name in names)
+        )
+    finally:
+        if own_engine:
+            await engine.dispose()
+    total_ms = (time.perf_counter() - start) * 1000
+
+    LOGGER.info("--------------------------------------------------------")
+    for timing in timings:
+        status = "failed" if timing["error"] else "ok"
+        LOGGER.info(f"{timing['report']:>10}: {timing['elapsed_ms']:9.2f} ms {status}")
+    LOGGER.info(
+        f"{len(timings)} reports in {total_ms:.2f} ms "
+        f"(sum of reports {sum(t['elapsed_ms'] for t in timings):.2f} ms)"
+    )
+    LOGGER.info(f"Report cache: {REPORT_CACHE.stats()}")
+    LOGGER.info("--------------------------------------------------------")
+    if INSTRUMENTATION.attached:
+        INSTRUMENTATION.log_summary()
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run reports concurrently")
+    parser.add_argument(
+        "-r",
+        "--reports",
+        nargs="+",
+        type=int,
+        choices=range(1, 11),
+        help="Report numbers to run (all by default)",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum number of reports running at the same time",
+    )
+    args = parser.parse_args()
+
+    names = [f"select_{number}" for number in args.reports or range(1, 11)]
+    asyncio.run(run_reports(names, concurrency=args.concurrency))
@@ -1,10 +1,21 @@
-from random import randint, choice, sample
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from random import Random, randint, choice, sample
 from faker import Faker
 from faker.providers import DynamicProvider
-from sqlalchemy.sql import select
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.sql import insert
 
-from app.database import AsyncSessionLocal
+from app.aggregates import rebuild
+from app.database import AsyncSessionLocal, make_engine
 from app.logger import LOGGER
+from app.partitions import create_partitions
 from app.models import (
     Student,
     Group,
@@ -39,6 +50,14 @@ groups_provider = DynamicProvider(
     elements=[f"Group {i}" for i in range(1, 10)],
 )
 
+# Number of rows sent to the database per COPY / executemany call by the
+# bulk seeding path
+SEED_CHUNK_SIZE = 10_000
+
+# Students per shard of the parallel seeding path. The shards only depend on
+# the dataset size, so the number of workers does not change the data.
+SEED_SHARD_STUDENTS = 5_000
+
 fake.add_provider(subjects_provider)
 fake.add_provider(groups_provider)
 
@@ -78,14 +97,19 @@ async def seed_database():
             LOGGER.warning(f"Subjects transaction failed, rolled back. Error: {e}")
 
         # Assign multiple teachers to subjects in the association table
+        subject_teachers = {}
         for subject in subjects:
-            assigned_teachers = sample(teachers, randint(1, min(3, len(teachers))))
-            for teacher in assigned_teachers:
-                await session.execute(
-                    teacher_subject_association.insert().values(
-                        teacher_id=teacher.id, subject_id=subject.id
-                    )
-                )
+            subject_teachers[subject.id] = sample(
+                teachers, randint(1, min(3, len(teachers)))
+            )
+        await session.execute(
+            teacher_subject_association.insert(),
+            [
+                {"teacher_id": teacher.id, "subject_id": subject_id}
+                for subject_id, assigned in subject_teachers.items()
+                for teacher in assigned
+            ],
+        )
         LOGGER.info("Teacher-Subject associations committed successfully.")
 
         try:
@@ -101,20 +125,17 @@ async def seed_database():
             await session.rollback()
             LOGGER.warning(f"Students transaction failed, rolled back. Error: {e}")
 
+        # Grades are received this year, see fake.date_time_this_year()
+        await create_partitions(session, start=_grades_start())
+
         try:
             # Assign grades to students for their subjects
             grades = []
             for student in students:
                 for subject in subjects:
-                    result = await session.execute(
-                        select(Teacher)
-                        .join(teacher_subject_association)
-                        .where(teacher_subject_association.c.subject_id == subject.id)
-                    )
-                    subject_teachers = result.scalars().all()
-                    if subject_teachers:
+                    if subject_teachers.get(subject.id):
                         # Choose one teacher from assigned teachers
-                        teacher = choice(subject_teachers)
+                        teacher = choice(subject_teachers[subject.id])
                         for _ in range(randint(10, 20)):
                             grades.append(
                                 Grade(
@@ -132,15 +153,429 @@ async def seed_database():
             await session.rollback()
             LOGGER.warning(f"Grades transaction failed, rolled back. Error: {e}")
 
+        await rebuild(session)
+
     LOGGER.info("Database seeding finished")
 
 
-async def verify_tables():
+def _chunked(records, size: int):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _student_records(fake: Faker, rng: Random, first_id: int, count: int, group_ids):
+    for student_id in range(first_id, first_id + count):
+        # Suffix with the id so names stay unique without fake.unique bookkeeping
+        yield (student_id, f"{fake.name()} {student_id}", rng.choice(group_ids))
+
+
+def _grades_start() -> datetime:
+    """Generated grades are received between the start of the year and now."""
+    return datetime(datetime.now().year, 1, 1)
+
+
+def _grade_records(
+    rng: Random,
+    student_ids: range,
+    teachers_by_subject: dict[int, list[int]],
+    grades: int,
+    pairs: int | None = None,
+    first_pair: int = 0,
+    period: tuple[datetime, datetime] | None = None,
+):
+    """Spread 'grades' evenly over 'pairs' student/subject pairs (those of
+    'student_ids' by default), received within 'period'. 'first_pair' is the
+    index of the first pair of 'student_ids' when they are a shard of all
+    students."""
+    if pairs is None:
+        pairs = len(student_ids) * len(teachers_by_subject)
+    if not pairs:
+        return
+    per_pair, extra = divmod(grades, pairs)
+    start, end = period or (_grades_start(), datetime.now())
+    if end < start:
+        raise ValueError(f"Empty grade period: {start} to {end}")
+    # A period of less than a second (e.g. 'until' on January 1st) puts every
+    # grade at its start
+    span = max(int((end - start).total_seconds()), 1)
+
+    pair = first_pair
+    for student_id in student_ids:
+        for subject_id, teacher_ids in teachers_by_subject.items():
+            teacher_id = rng.choice(teacher_ids)
+            for _ in range(per_pair + (pair < extra)):
+                yield (
+                    student_id,
+                    subject_id,
+                    teacher_id,
+                    rng.randint(1, 100),
+                    start + timedelta(seconds=rng.randrange(span)),
+                )
+            pair += 1
+
+
+async def _reserve_ids(session, table, count: int) -> int:
+    """Reserve a contiguous block of ids from the table's serial sequence."""
+    result = await session.execute(
+        text(
+            "SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+            "nextval(pg_get_serial_sequence(:table, 'id')) + :count - 1)"
+        ),
+        {"table": table.name, "count": count},
+    )
+    return result.scalar() - count + 1
+
+
+async def _write_chunk(session, table, columns, records, use_copy: bool):
+    if use_copy:
+        connection = await session.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            table.name, records=records, columns=columns
+        )
+    else:
+        await session.execute(
+            insert(table), [dict(zip(columns, record)) for record in records]
+        )
+
+
+async def _seed_dimensions(
+    session, rng: Random, fake: Faker, groups: int, teachers: int, subjects: int
+) -> tuple[list[int], dict[int, list[int]]]:
+    """Insert groups, teachers, subjects and their associations. Returns the
+    group ids and the teacher ids of every subject."""
+    subject_names = subjects_provider.elements
+    async with session.begin():
+        result = await session.execute(
+            insert(Group).returning(Group.id),
+            [{"name": f"Group {i}"} for i in range(1, groups + 1)],
+        )
+        group_ids = result.scalars().all()
+        result = await session.execute(
+            insert(Teacher).returning(Teacher.id),
+            [{"name": fake.name()} for _ in range(teachers)],
+        )
+        teacher_ids = result.scalars().all()
+        result = await session.execute(
+            insert(Subject).returning(Subject.id),
+            [
+                {
+                    "name": (
+                        subject_names[i]
+                        if i < len(subject_names)
+                        else f"{subject_names[i % len(subject_names)]} {i}"
+                    )
+                }
+                for i in range(subjects)
+            ],
+        )
+        subject_ids = result.scalars().all()
+
+        # Teacher-per-subject map is computed once and reused for every grade
+        teachers_by_subject = {
+            subject_id: rng.sample(teacher_ids, rng.randint(1, min(3, teachers)))
+            for subject_id in subject_ids
+        }
+        await session.execute(
+            teacher_subject_association.insert(),
+            [
+                {"teacher_id": teacher_id, "subject_id": subject_id}
+                for subject_id, assigned in teachers_by_subject.items()
+                for teacher_id in assigned
+            ],
+        )
+    LOGGER.info(f"Seeded {groups} groups, {teachers} teachers and {subjects} subjects.")
+    return group_ids, teachers_by_subject
+
+
+async def bulk_seed_database(
+    students: int = 100_000,
+    grades: int = 50_000_000,
+    groups: int = 30,
+    teachers: int = 50,
+    subjects: int = 10,
+    chunk_size: int = SEED_CHUNK_SIZE,
+    seed: int | None = None,
+    use_copy: bool = True,
+):
+    """Seed a load-test sized dataset with bounded memory.
+
+    Rows are generated lazily and written in chunks of ``chunk_size`` through
+    asyncpg ``COPY`` (or Core ``insert()`` executemany when ``use_copy`` is
+    off), so no ORM objects are created for students and grades. Names of
+    groups and subjects are fixed, so the tables are expected to be empty.
+    """
+    rng = Random(seed)
+    bulk_fake = Faker()
+    bulk_fake.seed_instance(seed)
+
+    async with AsyncSessionLocal() as session:
+        group_ids, teachers_by_subject = await _seed_dimensions(
+            session, rng, bulk_fake, groups, teachers, subjects
+        )
+
+        first_student_id = await _reserve_ids(session, Student.__table__, students)
+        await session.commit()
+        student_ids = range(first_student_id, first_student_id + students)
+
+        written = 0
+        for chunk in _chunked(
+            _student_records(bulk_fake, rng, first_student_id, students, group_ids),
+            chunk_size,
+        ):
+            async with session.begin():
+                await _write_chunk(
+                    session,
+                    Student.__table__,
+                    ["id", "name", "group_id"],
+                    chunk,
+                    use_copy,
+                )
+            written += len(chunk)
+        LOGGER.info(f"Seeded {written} students.")
+
+        await create_partitions(session, start=_grades_start())
+
+        written = 0
+        for chunk in _chunked(
+            _grade_records(rng, student_ids, teachers_by_subject, grades),
+            chunk_size,
+        ):
+            async with session.begin():
+                await _write_chunk(
+                    session,
+                    Grade.__table__,
+                    [
+                        "student_id",
+                        "subject_id",
+                        "teacher_id",
+                        "grade",
+                        "date_received",
+                    ],
+                    chunk,
+                    use_copy,
+                )
+            written += len(chunk)
+            if written % (chunk_size * 100) < len(chunk):
+                LOGGER.info(f"Seeded {written}/{grades} grades...")
+        LOGGER.info(f"Seeded {written} grades.")
+
+        await rebuild(session)
+
+    LOGGER.info("Bulk database seeding finished")
+
+
+GRADE_COLUMNS = [
+    "id",
+    "student_id",
+    "subject_id",
+    "teacher_id",
+    "grade",
+    "date_received",
+]
+
+# Faker of a worker process, created once as it is slow to set up
+_worker_fake = None
+
+
+async def _write_shard(
+    seed: str,
+    student_ids: range,
+    first_grade_id: int,
+    group_ids: list[int],
+    teachers_by_subject: dict[int, list[int]],
+    grades: int,
+    pairs: int,
+    first_pair: int,
+    period: tuple[datetime, datetime],
+    chunk_size: int,
+    use_copy: bool,
+) -> tuple[int, int]:
+    global _worker_fake
+    if _worker_fake is None:
+        _worker_fake = Faker()
+    _worker_fake.seed_instance(seed)
+    rng = Random(seed)
+
+    students = _student_records(
+        _worker_fake, rng, student_ids.start, len(student_ids), group_ids
+    )
+    shard_grades = (
+        (grade_id, *record)
+        for grade_id, record in zip(
+            itertools.count(first_grade_id),
+            _grade_records(
+                rng, student_ids, teachers_by_subject, grades, pairs, first_pair, period
+            ),
+        )
+    )
+
+    # Each worker writes through its own connection
+    engine = make_engine(pool_size=1, max_overflow=0)
+    written = {Student.__table__: 0, Grade.__table__: 0}
+    try:
+        async with async_sessionmaker(bind=engine)() as session:
+            for table, columns, records in (
+                (Student.__table__, ["id", "name", "group_id"], students),
+                (Grade.__table__, GRADE_COLUMNS, shard_grades),
+            ):
+                for chunk in _chunked(records, chunk_size):
+                    async with session.begin():
+                        await _write_chunk(session, table, columns, chunk, use_copy)
+                    written[table] += len(chunk)
+    finally:
+        await engine.dispose()
+    return written[Student.__table__], written[Grade.__table__]
+
+
+def _seed_shard(shard: dict) -> tuple[int, int]:
+    return asyncio.run(_write_shard(**shard))
+
+
+async def parallel_seed_database(
+    students: int = 100_000,
+    grades: int = 50_000_000,
+    groups: int = 30,
+    teachers: int = 50,
+    subjects: int = 10,
+    workers: int | None = None,
+    shard_students: int = SEED_SHARD_STUDENTS,
+    chunk_size: int = SEED_CHUNK_SIZE,
+    seed: int | None = None,
+    until: datetime | None = None,
+    use_copy: bool = True,
+):
+    """Seed the same kind of dataset as 'bulk_seed_database' with a process
+    pool.
+
+    Students are split into shards of 'shard_students' ids, with their grades.
+    Every shard is generated and written by a worker process (one connection
+    each) from a random generator seeded with 'seed' and the shard number.
+    Student and grade ids are reserved upfront and names are suffixed with the
+    student id, so shards never collide. Grades are received from the start of
+    the year of 'until' (today by default) to 'until', so the same seed and
+    'until' give the same data on empty tables, whatever 'workers' is.
+    """
+    if seed is None:
+        seed = Random().randrange(2**32)
+    LOGGER.info(f"Seeding with --seed {seed}")
+    until = until or datetime.combine(datetime.now().date(), datetime.min.time())
+    period = (datetime(until.year, 1, 1), until)
+    rng = Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+
     async with AsyncSessionLocal() as session:
-        tables = {Group, Student, Teacher, Subject, Grade, teacher_subject_association}
-        for table in tables:
-            result = await session.execute(select(table))
-            values = result.scalars().all()
-            if not values:
-                return False
-        return True
+        group_ids, teachers_by_subject = await _seed_dimensions(
+            session, rng, fake, groups, teachers, subjects
+        )
+        async with session.begin():
+            first_student_id = await _reserve_ids(session, Student.__table__, students)
+            first_grade_id = await _reserve_ids(session, Grade.__table__, grades)
+        await create_partitions(session, start=period[0])
+
+    # Shard boundaries in student and grade numbers, grades being spread
+    # evenly over all student/subject pairs as in '_grade_records'
+    pairs = students * len(teachers_by_subject)
+    per_pair, extra = divmod(grades, pairs) if pairs else (0, 0)
+
+    def grades_before(student: int) -> int:
+        pair = student * len(teachers_by_subject)
+        return pair * per_pair + min(pair, extra)
+
+    shards = []
+    for number, start in enumerate(range(0, students, shard_students)):
+        end = min(start + shard_students, students)
+        shards.append(
+            {
+                "seed": f"{seed}:{number}",
+                "student_ids": range(first_student_id + start, first_student_id + end),
+                "first_grade_id": first_grade_id + grades_before(start),
+                "group_ids": group_ids,
+                "teachers_by_subject": teachers_by_subject,
+                "grades": grades,
+                "pairs": pairs,
+                "first_pair": start * len(teachers_by_subject),
+                "period": period,
+                "chunk_size": chunk_size,
+                "use_copy": use_copy,
+            }
+        )
+
+    loop = asyncio.get_running_loop()
+    written_students = written_grades = 0
+    # 'spawn' so that workers do not inherit the connections of this process
+    with ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        for result in asyncio.as_completed(
+            [loop.run_in_executor(pool, _seed_shard, shard) for shard in shards]
+        ):
+            shard_students_written, shard_grades_written = await result
+            written_students += shard_students_written
+            written_grades += shard_grades_written
+            LOGGER.info(
+                f"Seeded {written_students}/{students} students and "
+                f"{written_grades}/{grades} grades..."
+            )
+
+    async with AsyncSessionLocal() as session:
+        await rebuild(session)
+
+    LOGGER.info("Parallel database seeding finished")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk database seeding")
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--grades", type=int, default=50_000_000)
+    parser.add_argument("--groups", type=int, default=30)
+    parser.add_argument("--teachers", type=int, default=50)
+    parser.add_argument("--subjects", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=SEED_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible data")
+    parser.add_argument(
+        "--no-copy",
+        action="store_true",
+        help="Use batched INSERT executemany instead of COPY",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Generate and write shards of students in this many processes",
+    )
+    parser.add_argument("--shard-students", type=int, default=SEED_SHARD_STUDENTS)
+    parser.add_argument(
+        "--until",
+        type=datetime.fromisoformat,
+        help="End of the grades period with --workers (today by default)",
+    )
+    args = parser.parse_args()
+
+    options = {
+        "students": args.students,
+        "grades": args.grades,
+        "groups": args.groups,
+        "teachers": args.teachers,
+        "subjects": args.subjects,
+        "chunk_size": args.chunk_size,
+        "seed": args.seed,
+        "use_copy": not args.no_copy,
+    }
+    if args.workers:
+        asyncio.run(
+            parallel_seed_database(
+                workers=args.workers,
+                shard_students=args.shard_students,
+                until=args.until,
+                **options,
+            )
+        )
+    else:
+        asyncio.run(bulk_seed_database(**options))
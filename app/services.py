@@ -1,55 +1,357 @@
-from typing import Union
+import csv
+import json
+import sys
 
+from datetime import datetime
+from typing import Sequence, TextIO, Union
+
+from sqlalchemy import ARRAY, DateTime, Integer, any_, func, literal, null, or_
+from sqlalchemy import text as sql_text
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.sql import select, delete
+from sqlalchemy.sql import select, delete, update as update_rows
 
+from app import aggregates
+from app.cache import REPORT_CACHE
 from app.logger import LOGGER
-from app.models import Student, Group, Teacher, Subject, Grade
+from app.models import TRIGRAM_INSTALLED, Student, Group, Teacher, Subject, Grade
+from app.profiles import get_profile, to_dict
 
 Tables = Union[Student, Group, Teacher, Subject, Grade]
 
+# Rows fetched from the server-side cursor per round trip by 'list'
+LIST_BATCH_SIZE = 1000
+
+# Tables searched by name, see 'search'
+SEARCHABLE = (Student, Group, Teacher, Subject)
+SEARCH_LIMIT = 10
+# Shorter queries have no full trigram, so the index could not narrow them down
+SEARCH_MIN_LENGTH = 3
+
+
+def changed_tables(table: Tables, removed: bool = False) -> list:
+    """Tables whose content changes when rows of 'table' are written; removing
+    students, subjects or teachers also cascades to their grades."""
+    if removed and table in aggregates.GRADE_FOREIGN_KEYS:
+        return [table, Grade]
+    return [table]
+
 
 async def create(session: AsyncSession, table: Tables, **kwargs):
     async with session.begin():
         item = table(**kwargs)
         session.add(item)
+        if table is Grade:
+            await session.flush()
+            await aggregates.add_grades(session, Grade.id == item.id)
         await session.commit()
         LOGGER.info(f"'{table.__name__}', created successfully: {kwargs}")
+    REPORT_CACHE.invalidate(*changed_tables(table))
+    return item
+
+
+def id_in(table: Tables, ids: Sequence[int]):
+    """'table.id = ANY(:ids)', sent as a single array parameter however many
+    ids there are."""
+    return table.id == any_(literal([*ids], ARRAY(Integer)))
+
+
+def filter_criteria(
+    table: Tables,
+    where: dict | None = None,
+    ids: Sequence[int] | None = None,
+    older_than: datetime | None = None,
+) -> list:
+    """Build the WHERE criteria of a bulk update/remove.
+
+    'where' maps column names to values (strings are converted to the column
+    type, e.g. {"teacher_id": "3"}), 'ids' restricts to the given ids and
+    'older_than' to grades received before that date.
+    """
+    criteria = []
+    columns = table.__table__.columns
+    for key, value in (where or {}).items():
+        if key not in columns:
+            raise ValueError(f"Unknown column for '{table.__name__}': {key!r}")
+        column = columns[key]
+        if isinstance(value, str):
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            else:
+                value = column.type.python_type(value)
+        criteria.append(column == value)
+    if ids:
+        criteria.append(id_in(table, ids))
+    if older_than is not None:
+        if "date_received" not in columns:
+            raise ValueError(f"'{table.__name__}' has no date to filter on")
+        criteria.append(columns["date_received"] < older_than)
+    return criteria
 
 
 async def remove(session: AsyncSession, table: Tables, id: int):
     async with session.begin():
+        if aggregates.affects_stats(table):
+            await aggregates.lock_rows(session, table, table.id == id)
+            await aggregates.subtract_grades(
+                session, *aggregates.grade_criteria(table, table.id == id)
+            )
         await session.execute(delete(table).where(table.id == id))
         LOGGER.info(f"'{table.__name__}', 'ID': {id}, deleted successfully!")
+    REPORT_CACHE.invalidate(*changed_tables(table, removed=True))
+
+
+async def remove_where(session: AsyncSession, table: Tables, criteria: list) -> int:
+    """Delete every row matching 'criteria' with one DELETE statement.
+    Returns the number of deleted rows."""
+    if not criteria:
+        raise ValueError("Bulk remove requires a filter")
+    async with session.begin():
+        if aggregates.affects_stats(table):
+            await aggregates.lock_rows(session, table, *criteria)
+            await aggregates.subtract_grades(
+                session, *aggregates.grade_criteria(table, *criteria)
+            )
+        result = await session.execute(
+            delete(table).where(*criteria).execution_options(synchronize_session=False)
+        )
+        count = result.rowcount
+        LOGGER.info(f"'{table.__name__}', {count} rows deleted successfully!")
+    REPORT_CACHE.invalidate(*changed_tables(table, removed=True))
+    return count
 
 
 async def update(session: AsyncSession, table: Tables, id: int, **kwargs):
+    """Update one row with a single UPDATE ... RETURNING statement and return
+    the updated item (None when it does not exist)."""
+    # Constructing a transient item runs the model validators on the values
+    table(**kwargs)
     async with session.begin():
-        result = await session.execute(select(table).where(table.id == id))
+        criteria = None
+        if aggregates.affects_stats(table, kwargs):
+            await aggregates.lock_rows(session, table, table.id == id)
+            criteria = aggregates.grade_criteria(table, table.id == id)
+            await aggregates.subtract_grades(session, *criteria)
+        result = await session.execute(
+            update_rows(table).where(table.id == id).values(**kwargs).returning(table)
+        )
         item = result.scalars().first()
         if item:
-            for key, value in kwargs.items():
-                setattr(item, key, value)
+            if criteria is not None:
+                await aggregates.add_grades(session, *criteria)
             await session.commit()
-            LOGGER.info(
-                f"'{table.__name__}', 'ID' {
-                        id} updated successfully: {kwargs}"
-            )
+            LOGGER.info(f"'{table.__name__}', 'ID' {id} updated successfully: {kwargs}")
         else:
             LOGGER.info(f"'{table.__name__}', 'ID' {id} not found.")
+    REPORT_CACHE.invalidate(*changed_tables(table))
+    return item
 
 
-async def list(session: AsyncSession, table: Tables):
+async def update_where(
+    session: AsyncSession, table: Tables, criteria: list, **kwargs
+) -> int:
+    """Set 'kwargs' on every row matching 'criteria' with one UPDATE
+    statement, e.g. re-assign all grades of a teacher to another one.
+    Returns the number of updated rows."""
+    if not criteria:
+        raise ValueError("Bulk update requires a filter")
+    if not kwargs:
+        raise ValueError("Bulk update requires values to set")
+    table(**kwargs)
     async with session.begin():
-        result = await session.execute(select(table))
-        items = result.scalars().all()
-        if not items:
-            LOGGER.info(f"There is no items in '{table.__name__}' table")
-
-        for item in items:
-            LOGGER.info(
-                {
-                    column: getattr(item, column)
-                    for column in item.__table__.columns.keys()
-                }
+        stmt = (
+            update_rows(table)
+            .where(*criteria)
+            .values(**kwargs)
+            .execution_options(synchronize_session=False)
+        )
+        if aggregates.affects_stats(table, kwargs):
+            await aggregates.lock_rows(session, table, *criteria)
+            await aggregates.subtract_grades(
+                session, *aggregates.grade_criteria(table, *criteria)
             )
+            # The filter may no longer match the updated rows, so the new
+            # values are added back by id
+            result = await session.execute(stmt.returning(table.id))
+            ids = result.scalars().all()
+            if ids:
+                await aggregates.add_grades(
+                    session, *aggregates.grade_criteria(table, id_in(table, ids))
+                )
+            count = len(ids)
+        else:
+            result = await session.execute(stmt)
+            count = result.rowcount
+        LOGGER.info(f"'{table.__name__}', {count} rows updated successfully: {kwargs}")
+    REPORT_CACHE.invalidate(*changed_tables(table))
+    return count
+
+
+def _writer(out: TextIO, names: Sequence[str], output_format: str = "jsonl"):
+    """Return a function writing batches of rows to 'out' as JSON lines or
+    CSV (after a header). Each batch is written with a single call."""
+    if output_format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(names)
+        return writer.writerows
+
+    encode = json.JSONEncoder(default=str).encode
+
+    def write(rows):
+        out.write("".join(encode(dict(zip(names, row))) + "\n" for row in rows))
+
+    return write
+
+
+def _nested_rows(loading, rows, encode=None) -> tuple:
+    """Convert the rows of a loading profile query to (names, values). Nested
+    values are encoded with 'encode' if given."""
+    records = [
+        to_dict(item, **dict(zip(loading.columns, extra))) for item, *extra in rows
+    ]
+    if encode is None:
+        return [*records[0]], [record.values() for record in records]
+    values = [
+        [
+            (
+                value
+                if isinstance(value, str) or not isinstance(value, (dict, Sequence))
+                else encode(value)
+            )
+            for value in record.values()
+        ]
+        for record in records
+    ]
+    return [*records[0]], values
+
+
+async def list(
+    session: AsyncSession,
+    table: Tables,
+    after_id: int | None = None,
+    limit: int | None = None,
+    columns: Sequence[str] | None = None,
+    output_format: str = "jsonl",
+    out: TextIO | None = None,
+    profile: str | None = None,
+):
+    """Stream rows of 'table' ordered by id to 'out' (stdout by default).
+
+    Rows are fetched through a server-side cursor as plain column tuples, so
+    memory use does not depend on the table size. Use the id of the last
+    listed row as 'after_id' to fetch the next page.
+
+    With a loading 'profile' (see app.profiles) entities are listed with
+    their related data, nested in JSON (JSON encoded in CSV cells). Related
+    rows are loaded with a fixed number of statements per fetched batch.
+    """
+    loading = None
+    if profile is not None:
+        if columns:
+            raise ValueError("Columns cannot be selected with a loading profile")
+        loading = get_profile(profile, table)
+        query = loading.query()
+        names = None
+    else:
+        if columns:
+            unknown = set(columns) - set(table.__table__.columns.keys())
+            if unknown:
+                raise ValueError(f"Unknown columns for '{table.__name__}': {unknown}")
+            selected = [table.__table__.columns[column] for column in columns]
+        else:
+            selected = [*table.__table__.columns]
+        query = select(*selected).order_by(table.id)
+        names = [column.name for column in selected]
+
+    if after_id is not None:
+        query = query.where(table.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    out = out or sys.stdout
+    encode = json.JSONEncoder(default=str).encode
+    write = None if names is None else _writer(out, names, output_format)
+
+    count = 0
+    async with session.begin():
+        result = await session.stream(
+            query.execution_options(yield_per=LIST_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            if loading is not None:
+                header, rows = _nested_rows(
+                    loading, rows, encode if output_format == "csv" else None
+                )
+                if write is None:
+                    write = _writer(out, header, output_format)
+            write(rows)
+            count += len(rows)
+            out.flush()
+            # Streams to a remote client (see main.py --serve) apply backpressure
+            if hasattr(out, "drain"):
+                await out.drain()
+
+    if not count:
+        LOGGER.info(f"There is no items in '{table.__name__}' table")
+    return count
+
+
+def escape_like(value: str) -> str:
+    """Escape the LIKE wildcards of 'value' with '/', like 'autoescape'."""
+    return value.replace("/", "//").replace("%", "/%").replace("_", "/_")
+
+
+def search_query(
+    table: Tables, text: str, limit: int = SEARCH_LIMIT, similarity: bool = True
+):
+    """Rows of 'table' whose name starts with 'text' or has words similar to
+    it (pg_trgm word similarity, e.g. 'jon smit' finds 'John Smith'). Prefix
+    matches come first, then the most similar names.
+
+    Both conditions are answered by the trigram GIN index on 'name'. Without
+    pg_trgm ('similarity' false) names containing 'text' are matched with
+    ILIKE instead and have no score.
+    """
+    prefix = table.name.ilike(f"{escape_like(text)}%", escape="/")
+    if not similarity:
+        return (
+            select(table.id, table.name, null().label("score"))
+            .where(table.name.ilike(f"%{escape_like(text)}%", escape="/"))
+            .order_by(prefix.desc(), table.name, table.id)
+            .limit(limit)
+        )
+    score = func.word_similarity(text, table.name)
+    return (
+        select(table.id, table.name, score.label("score"))
+        .where(or_(prefix, table.name.op("%>")(text)))
+        .order_by(prefix.desc(), score.desc(), table.name, table.id)
+        .limit(limit)
+    )
+
+
+async def search(
+    session: AsyncSession,
+    table: Tables,
+    text: str | None,
+    limit: int = SEARCH_LIMIT,
+    output_format: str = "jsonl",
+    out: TextIO | None = None,
+) -> int:
+    """Write the best matches of a name search (see 'search_query') to 'out'
+    (stdout by default) as id, name and score. Returns the number of matches."""
+    if table not in SEARCHABLE:
+        raise ValueError(f"'{table.__name__}' cannot be searched by name")
+    text = (text or "").strip()
+    if len(text) < SEARCH_MIN_LENGTH:
+        raise ValueError(f"Search for at least {SEARCH_MIN_LENGTH} characters")
+
+    async with session.begin():
+        similarity = (await session.execute(sql_text(TRIGRAM_INSTALLED))).scalar()
+        result = await session.execute(search_query(table, text, limit, similarity))
+        rows = result.all()
+
+    out = out or sys.stdout
+    _writer(out, ["id", "name", "score"], output_format)(rows)
+    out.flush()
+    if not rows:
+        LOGGER.info(f"No '{table.__name__}' matches {text!r}")
+    return len(rows)
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from datetime import datetime
+
+from app.cache import REPORT_CACHE
+from app.logger import LOGGER
+
+from benchmarks.datasets import DEFAULT_SEED, TIERS, prepare
+from benchmarks.loadgen import DEFAULT_MIX, parse_mix, run_load
+from benchmarks.suite import run_suite
+
+# Relative p50/p95 slowdown against the baseline reported as a regression
+DEFAULT_THRESHOLD = 0.2
+
+
+async def run(args) -> None:
+    if args.prepare:
+        await prepare(args.tier, args.seed)
+
+    # Report output is not part of what is measured
+    LOGGER.setLevel(logging.WARNING)
+    results = await run_suite(args.warmup, args.repeats)
+    LOGGER.setLevel(logging.INFO)
+
+    report = {
+        "tier": args.tier,
+        "seed": args.seed,
+        "warmup": args.warmup,
+        "created_at": datetime.now().isoformat(),
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    for name, stats in results.items():
+        LOGGER.info(
+            f"{name:>16}: p50 {stats['p50_ms']:8.2f} ms, "
+            f"p95 {stats['p95_ms']:8.2f} ms, p99 {stats['p99_ms']:8.2f} ms"
+        )
+    LOGGER.info(f"Results written to '{args.output}'")
+
+
+async def load(args) -> None:
+    if args.prepare:
+        await prepare(args.tier, args.seed)
+    if args.no_cache:
+        REPORT_CACHE.maxsize = 0
+
+    # Logs of the operations themselves would slow them down
+    LOGGER.setLevel(logging.WARNING)
+    report = await run_load(
+        args.workers,
+        args.duration,
+        mix=parse_mix(args.mix) if args.mix else None,
+        rate=args.rate,
+        warmup=args.warmup,
+        interval=args.interval,
+        think_time=args.think_time,
+        pool_size=args.pool_size,
+        max_overflow=args.max_overflow,
+        pool_timeout=args.pool_timeout,
+    )
+    LOGGER.setLevel(logging.INFO)
+    report["created_at"] = datetime.now().isoformat()
+    report["report_cache"] = REPORT_CACHE.stats()
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    for name, stats in [*report["operations"].items(), ("total", report["total"])]:
+        LOGGER.info(
+            f"{name:>32}: {stats['ops_per_s']:8.1f} ops/s, "
+            f"p50 {stats['p50_ms'] or 0:8.2f} ms, p95 {stats['p95_ms'] or 0:8.2f} ms, "
+            f"p99 {stats['p99_ms'] or 0:8.2f} ms, pool wait p95 "
+            f"{stats['pool_wait']['p95_ms'] or 0:7.2f} ms, {stats['errors']} errors"
+        )
+    LOGGER.info(f"Results written to '{args.output}'")
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Return the operations whose p50 or p95 grew by more than 'threshold'."""
+    if baseline["tier"] != current["tier"]:
+        LOGGER.warning(
+            f"Comparing different tiers: '{baseline['tier']}' and '{current['tier']}'"
+        )
+
+    regressions = []
+    for name, stats in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratios = {
+            key: stats[key] / base[key] if base[key] else 1.0
+            for key in ("p50_ms", "p95_ms")
+        }
+        regressed = any(ratio > 1 + threshold for ratio in ratios.values())
+        if regressed:
+            regressions.append(name)
+        LOGGER.info(
+            f"{name:>16}: p50 x{ratios['p50_ms']:.2f}, p95 x{ratios['p95_ms']:.2f}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reports and services benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmark suite")
+    run_parser.add_argument("--tier", choices=TIERS, default="small")
+    run_parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    run_parser.add_argument(
+        "--prepare",
+        action="store_true",
+        help="Drop all tables and seed the tier dataset before running",
+    )
+    run_parser.add_argument("--warmup", type=int, default=3)
+    run_parser.add_argument("--repeats", type=int, default=20)
+    run_parser.add_argument("-o", "--output", default="bench_results.json")
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare results against a saved baseline"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    load_parser = subparsers.add_parser(
+        "load", help="Run a mixed workload from concurrent workers"
+    )
+    load_parser.add_argument("-w", "--workers", type=int, default=10)
+    load_parser.add_argument(
+        "--rate",
+        type=float,
+        help="Operations started per second (open loop), instead of each worker "
+        "starting its next operation when the previous one is done",
+    )
+    load_parser.add_argument("-d", "--duration", type=float, default=30.0)
+    load_parser.add_argument(
+        "--warmup", type=float, default=5.0, help="Seconds run before measuring"
+    )
+    load_parser.add_argument(
+        "--interval", type=float, default=1.0, help="Seconds between progress lines"
+    )
+    load_parser.add_argument(
+        "--think-time",
+        type=float,
+        default=0.0,
+        help="Mean pause of closed loop workers between operations",
+    )
+    load_parser.add_argument(
+        "--mix",
+        nargs="+",
+        metavar="NAME=WEIGHT",
+        help=f"Operation weights (default: "
+        f"{' '.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items())})",
+    )
+    load_parser.add_argument(
+        "--pool-size", type=int, help="Pool size (default: one per worker)"
+    )
+    load_parser.add_argument("--max-overflow", type=int, default=0)
+    load_parser.add_argument("--pool-timeout", type=float)
+    load_parser.add_argument(
+        "--no-cache", action="store_true", help="Disable the report cache"
+    )
+    load_parser.add_argument("--tier", choices=TIERS, default="small")
+    load_parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    load_parser.add_argument(
+        "--prepare",
+        action="store_true",
+        help="Drop all tables and seed the tier dataset before running",
+    )
+    load_parser.add_argument("-o", "--output", default="load_results.json")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        asyncio.run(run(args))
+    elif args.command == "load":
+        asyncio.run(load(args))
+    else:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        with open(args.current) as file:
+            current = json.load(file)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            LOGGER.error(f"Regressions found: {regressions}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+from app.database import AsyncEngine, Base
+from app.logger import LOGGER
+from app.seed import bulk_seed_database
+
+# Dataset sizes used for benchmarking, seeded with a fixed Faker/random seed
+TIERS = {
+    "small": {"students": 1_000, "grades": 100_000, "groups": 10, "teachers": 20},
+    "medium": {"students": 10_000, "grades": 1_000_000, "groups": 30, "teachers": 50},
+    "large": {
+        "students": 100_000,
+        "grades": 10_000_000,
+        "groups": 100,
+        "teachers": 200,
+    },
+}
+
+DEFAULT_SEED = 42
+
+
+async def prepare(tier: str, seed: int = DEFAULT_SEED) -> None:
+    """Drop and recreate all tables, then seed the dataset of 'tier'."""
+    LOGGER.warning(f"Recreating all tables for the '{tier}' benchmark dataset.")
+    async with AsyncEngine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    await bulk_seed_database(**TIERS[tier], subjects=10, seed=seed)
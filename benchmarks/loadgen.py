@@ -0,0 +1,390 @@
+import asyncio
+import logging
+import random
+import time
+
+from collections import Counter, defaultdict
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.sql import select
+
+import app.my_select as queries
+
+from app import services
+from app.database import make_engine
+from app.models import Student, Group, Teacher, Subject, Grade
+
+from benchmarks.suite import _NullOutput, _report_cases
+from benchmarks.timing import percentile
+
+SERVICE_OPERATIONS = [
+    "services.create",
+    "services.update",
+    "services.remove",
+    "services.list",
+]
+
+# Relative weights of the operations, "reports" is split evenly between the
+# 'app.my_select' reports of the benchmark suite
+DEFAULT_MIX = {
+    "services.create": 10,
+    "services.update": 10,
+    "services.remove": 5,
+    "services.list": 15,
+    "reports": 60,
+}
+
+# Rows of each entity whose ids the operations pick from
+ID_SAMPLE_SIZE = 1000
+
+# Progress is logged even when the operations' own logging is turned down
+LOADGEN_LOGGER = logging.getLogger("AppLogger.loadgen")
+LOADGEN_LOGGER.setLevel(logging.INFO)
+
+
+def parse_mix(items: list[str]) -> dict[str, float]:
+    """Parse 'name=weight' items, e.g. ["services.list=3", "reports=1"]."""
+    mix = {}
+    for item in items:
+        name, separator, weight = item.partition("=")
+        if not separator:
+            raise ValueError(f"Expected 'name=weight', got {item!r}")
+        mix[name] = float(weight)
+    return mix
+
+
+class Workload:
+    """The operations of the mix. Grades are created with random students,
+    subjects and teachers, and only grades created by the run are updated
+    and removed: without any, 'update' and 'remove' create one instead."""
+
+    def __init__(self, ids: dict[str, list[int]], mix: dict[str, float]):
+        self.ids = ids
+        self.reports = list(_report_cases(self.random_ids()))
+        weights = {}
+        for name, weight in mix.items():
+            if name == "reports":
+                for report in self.reports:
+                    weights[report] = weights.get(report, 0) + weight / len(
+                        self.reports
+                    )
+            elif name in SERVICE_OPERATIONS or name in self.reports:
+                weights[name] = weights.get(name, 0) + weight
+            else:
+                raise ValueError(f"Unknown operation in the mix: {name!r}")
+        if not any(weights.values()):
+            raise ValueError("The mix has no operation with a positive weight")
+        self.names = list(weights)
+        self.weights = list(weights.values())
+        self.created = []
+
+    def random_ids(self) -> dict[str, int]:
+        return {name: random.choice(ids) for name, ids in self.ids.items()}
+
+    def pick(self) -> str:
+        return random.choices(self.names, self.weights)[0]
+
+    async def _create(self, session: AsyncSession) -> None:
+        ids = self.random_ids()
+        item = await services.create(
+            session,
+            Grade,
+            student_id=ids["student_id"],
+            subject_id=ids["subject_id"],
+            teacher_id=ids["teacher_id"],
+            grade=random.randint(1, 100),
+        )
+        self.created.append(item.id)
+
+    async def run(self, name: str, session: AsyncSession) -> str:
+        """Run one operation, returns the name of the operation that ran."""
+        if name in ("services.update", "services.remove") and not self.created:
+            name = "services.create"
+        if name == "services.create":
+            await self._create(session)
+        elif name in ("services.update", "services.remove"):
+            # Taken out while in use, so no other worker removes it meanwhile
+            id = self.created.pop(random.randrange(len(self.created)))
+            if name == "services.remove":
+                try:
+                    await services.remove(session, Grade, id)
+                except BaseException:
+                    # Still to be removed by the cleanup of 'run_load'
+                    self.created.append(id)
+                    raise
+            else:
+                try:
+                    await services.update(
+                        session, Grade, id, grade=random.randint(1, 100)
+                    )
+                finally:
+                    self.created.append(id)
+        elif name == "services.list":
+            await services.list(session, Grade, limit=100, out=_NullOutput())
+        else:
+            params = _report_cases(self.random_ids())[name]
+            await getattr(queries, name)(session, **params)
+        return name
+
+
+class LoadStats:
+    """Latency, pool wait and errors of the operations, in total and for the
+    current reporting interval."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.pool_waits = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.window = []
+        self.measuring = False
+
+    def record(self, name: str, latency_ms: float, wait_ms: float | None, error):
+        if not self.measuring:
+            return
+        self.window.append((latency_ms, wait_ms, error))
+        if wait_ms is not None:
+            self.pool_waits[name].append(wait_ms)
+        if error is None:
+            self.latencies[name].append(latency_ms)
+        else:
+            self.errors[name][error] += 1
+
+    def take_window(self) -> list:
+        window, self.window = self.window, []
+        return window
+
+
+def _latency(samples: list[float]) -> dict:
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    return {
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": max(samples),
+    }
+
+
+def _pool_wait(samples: list[float]) -> dict:
+    if not samples:
+        return {"mean_ms": None, "p95_ms": None, "max_ms": None}
+    return {
+        "mean_ms": sum(samples) / len(samples),
+        "p95_ms": percentile(samples, 95),
+        "max_ms": max(samples),
+    }
+
+
+async def _load_ids() -> dict[str, list[int]]:
+    engine = make_engine(pool_size=1, max_overflow=0)
+    try:
+        async with AsyncSession(engine) as session:
+            ids = {}
+            for name, model in (
+                ("student_id", Student),
+                ("group_id", Group),
+                ("teacher_id", Teacher),
+                ("subject_id", Subject),
+            ):
+                result = await session.execute(
+                    select(model.id).order_by(model.id).limit(ID_SAMPLE_SIZE)
+                )
+                ids[name] = result.scalars().all()
+    finally:
+        await engine.dispose()
+    empty = [name for name, values in ids.items() if not values]
+    if empty:
+        raise RuntimeError(f"No rows to run the load against: {empty}, seed first")
+    return ids
+
+
+async def _timed(
+    engine: AsyncEngine,
+    workload: Workload,
+    stats: LoadStats,
+    scheduled: float,
+) -> None:
+    name = workload.pick()
+    start = time.perf_counter()
+    wait_ms = error = None
+    try:
+        # Checking out the connection first separates the pool wait
+        async with engine.connect() as connection:
+            wait_ms = (time.perf_counter() - start) * 1000
+            async with AsyncSession(connection, expire_on_commit=False) as session:
+                name = await workload.run(name, session)
+    except Exception as e:
+        error = type(e).__name__
+        if not stats.errors[name][error]:
+            LOADGEN_LOGGER.warning(f"'{name}' failed: {e}")
+    stats.record(name, (time.perf_counter() - scheduled) * 1000, wait_ms, error)
+
+
+async def _closed_loop(engine, workload, stats, deadline: float, think_time: float):
+    while time.perf_counter() < deadline:
+        await _timed(engine, workload, stats, time.perf_counter())
+        if think_time:
+            await asyncio.sleep(random.expovariate(1 / think_time))
+
+
+async def _dispatch(queue: asyncio.Queue, rate: float, deadline: float, workers: int):
+    """Queue an arrival every 1 / 'rate' seconds until 'deadline', then drop
+    the arrivals no worker has started and stop the workers. Returns the
+    number of dropped arrivals."""
+    interval = 1 / rate
+    next_at = time.perf_counter()
+    while next_at < deadline:
+        queue.put_nowait(next_at)
+        next_at += interval
+        await asyncio.sleep(max(next_at - time.perf_counter(), 0))
+    dropped = 0
+    while not queue.empty():
+        queue.get_nowait()
+        dropped += 1
+    for _ in range(workers):
+        queue.put_nowait(None)
+    return dropped
+
+
+async def _open_loop_worker(engine, workload, stats, queue: asyncio.Queue):
+    # Latency counts from the scheduled arrival, time spent queued included
+    while (scheduled := await queue.get()) is not None:
+        await _timed(engine, workload, stats, scheduled)
+
+
+async def _report_intervals(
+    engine: AsyncEngine,
+    stats: LoadStats,
+    interval: float,
+    queue: asyncio.Queue | None,
+    timeline: list,
+) -> None:
+    start = time.perf_counter()
+    while True:
+        await asyncio.sleep(interval)
+        window = stats.take_window()
+        latencies = [latency for latency, _, error in window if error is None]
+        waits = [wait for _, wait, _ in window if wait is not None]
+        point = {
+            "elapsed_s": round(time.perf_counter() - start, 3),
+            "ops_per_s": len(window) / interval,
+            "errors": sum(error is not None for _, _, error in window),
+            "latency": _latency(latencies),
+            "pool_wait": _pool_wait(waits),
+            "pool_checked_out": engine.pool.checkedout(),
+            "backlog": queue.qsize() if queue is not None else 0,
+        }
+        timeline.append(point)
+        LOADGEN_LOGGER.info(
+            f"{point['elapsed_s']:7.1f}s: {point['ops_per_s']:8.1f} ops/s, "
+            f"p95 {point['latency']['p95_ms'] or 0:8.2f} ms, "
+            f"pool wait p95 {point['pool_wait']['p95_ms'] or 0:7.2f} ms, "
+            f"{point['pool_checked_out']} connections, "
+            f"{point['errors']} errors, backlog {point['backlog']}"
+        )
+
+
+async def run_load(
+    workers: int,
+    duration: float,
+    mix: dict[str, float] | None = None,
+    rate: float | None = None,
+    warmup: float = 0.0,
+    interval: float = 1.0,
+    think_time: float = 0.0,
+    pool_size: int | None = None,
+    max_overflow: int = 0,
+    pool_timeout: float | None = None,
+) -> dict:
+    """Run a mix of operations from 'workers' concurrent workers for
+    'warmup' + 'duration' seconds, each operation in its own session.
+
+    Closed loop by default: every worker runs its next operation as soon as
+    the previous one is done (after an exponential 'think_time' pause).
+    With 'rate', operations arrive at that fixed rate per second and wait
+    for a free worker, and their latency includes that wait. Arrivals still
+    waiting at the end are dropped.
+
+    The engine pool has 'pool_size' connections (one per worker by default)
+    plus 'max_overflow'. The pool wait of an operation is the time taken to
+    check out its connection. Grades created by the run are removed at the
+    end.
+    """
+    workload = Workload(await _load_ids(), mix or DEFAULT_MIX)
+    settings = {"pool_size": pool_size or workers, "max_overflow": max_overflow}
+    if pool_timeout is not None:
+        settings["pool_timeout"] = pool_timeout
+    engine = make_engine(**settings)
+    stats = LoadStats()
+    timeline = []
+    queue = asyncio.Queue() if rate else None
+
+    deadline = time.perf_counter() + warmup + duration
+    if rate:
+        dispatcher = asyncio.create_task(_dispatch(queue, rate, deadline, workers))
+        worker_tasks = [
+            asyncio.create_task(_open_loop_worker(engine, workload, stats, queue))
+            for _ in range(workers)
+        ]
+        tasks = [dispatcher, *worker_tasks]
+    else:
+        tasks = [
+            asyncio.create_task(
+                _closed_loop(engine, workload, stats, deadline, think_time)
+            )
+            for _ in range(workers)
+        ]
+    try:
+        await asyncio.sleep(warmup)
+        stats.measuring = True
+        measured_from = time.perf_counter()
+        reporter = asyncio.create_task(
+            _report_intervals(engine, stats, interval, queue, timeline)
+        )
+        tasks.append(reporter)
+        dropped = await dispatcher if rate else 0
+        await asyncio.gather(*(task for task in tasks if task is not reporter))
+        elapsed = time.perf_counter() - measured_from
+    finally:
+        for task in tasks:
+            task.cancel()
+        if workload.created:
+            async with AsyncSession(engine) as session:
+                await services.remove_where(
+                    session, Grade, [services.id_in(Grade, workload.created)]
+                )
+        await engine.dispose()
+
+    operations = {}
+    for name in sorted(set(stats.latencies) | set(stats.errors)):
+        latencies = stats.latencies[name]
+        errors = sum(stats.errors[name].values())
+        operations[name] = {
+            "ops": len(latencies) + errors,
+            "ops_per_s": (len(latencies) + errors) / elapsed,
+            "errors": errors,
+            "error_types": dict(stats.errors[name]),
+            **_latency(latencies),
+            "pool_wait": _pool_wait(stats.pool_waits[name]),
+        }
+    total = sum(operation["ops"] for operation in operations.values())
+    all_latencies = [value for values in stats.latencies.values() for value in values]
+    all_waits = [value for values in stats.pool_waits.values() for value in values]
+    return {
+        "workers": workers,
+        "mode": "open" if rate else "closed",
+        "rate": rate,
+        "duration_s": elapsed,
+        "pool_size": settings["pool_size"],
+        "max_overflow": max_overflow,
+        "total": {
+            "ops": total,
+            "ops_per_s": total / elapsed,
+            "errors": sum(operation["errors"] for operation in operations.values()),
+            "dropped": dropped,
+            **_latency(all_latencies),
+            "pool_wait": _pool_wait(all_waits),
+        },
+        "operations": operations,
+        "timeline": timeline,
+    }
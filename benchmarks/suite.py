@@ -0,0 +1,124 @@
+import io
+
+from sqlalchemy import func
+from sqlalchemy.sql import select
+
+import app.my_select as queries
+
+from app import services
+from app.database import AsyncSessionLocal
+from app.models import Student, Group, Teacher, Subject, Grade
+
+from benchmarks.timing import measure
+
+
+class _NullOutput(io.TextIOBase):
+    def write(self, text: str) -> int:
+        return len(text)
+
+
+async def _fixed_ids() -> dict[str, int]:
+    """Lowest id of every entity, so each run reports on the same rows."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(
+                select(func.min(Student.id)).scalar_subquery(),
+                select(func.min(Group.id)).scalar_subquery(),
+                select(func.min(Teacher.id)).scalar_subquery(),
+                select(func.min(Subject.id)).scalar_subquery(),
+            )
+        )
+        student_id, group_id, teacher_id, subject_id = result.one()
+    return {
+        "student_id": student_id,
+        "group_id": group_id,
+        "teacher_id": teacher_id,
+        "subject_id": subject_id,
+    }
+
+
+def _report_cases(ids: dict[str, int]) -> dict:
+    return {
+        "select_1": {},
+        "select_2": {"subject_id": ids["subject_id"]},
+        "select_3": {"subject_id": ids["subject_id"]},
+        "select_4": {},
+        "select_5": {"teacher_id": ids["teacher_id"]},
+        "select_6": {"group_id": ids["group_id"]},
+        "select_7": {"group_id": ids["group_id"], "subject_id": ids["subject_id"]},
+        "select_8": {"teacher_id": ids["teacher_id"]},
+        "select_9": {"student_id": ids["student_id"]},
+        "select_10": {
+            "student_id": ids["student_id"],
+            "teacher_id": ids["teacher_id"],
+        },
+        "select_top_students_per_subject": {},
+        "select_group_subject_averages": {},
+        "select_teacher_subject_averages": {},
+        "select_profile": {"profile": "students_with_group", "limit": 1000},
+    }
+
+
+def _report(name: str, params: dict):
+    async def run():
+        async with AsyncSessionLocal() as session:
+            await getattr(queries, name)(session, **params)
+
+    return run
+
+
+def _service_cases(ids: dict[str, int]) -> dict:
+    grade = {
+        "student_id": ids["student_id"],
+        "subject_id": ids["subject_id"],
+        "teacher_id": ids["teacher_id"],
+        "grade": 50,
+    }
+    created = []
+
+    async def create():
+        async with AsyncSessionLocal() as session:
+            item = await services.create(session, Grade, **grade)
+            created.append(item.id)
+
+    async def update():
+        async with AsyncSessionLocal() as session:
+            await services.update(session, Grade, created[-1], grade=75)
+
+    async def remove():
+        async with AsyncSessionLocal() as session:
+            await services.remove(session, Grade, created.pop())
+
+    async def list_page():
+        async with AsyncSessionLocal() as session:
+            await services.list(session, Grade, limit=1000, out=_NullOutput())
+
+    async def list_nested():
+        async with AsyncSessionLocal() as session:
+            await services.list(
+                session,
+                Group,
+                limit=1000,
+                out=_NullOutput(),
+                profile="groups_with_students",
+            )
+
+    # 'remove' runs last and deletes every grade created by 'create'
+    return {
+        "services.create": create,
+        "services.update": update,
+        "services.list": list_page,
+        "services.list_nested": list_nested,
+        "services.remove": remove,
+    }
+
+
+async def run_suite(warmup: int, repeats: int) -> dict:
+    ids = await _fixed_ids()
+    cases = {name: _report(name, params) for name, params in _report_cases(ids).items()}
+    cases.update(_service_cases(ids))
+
+    results = {}
+    for name, operation in cases.items():
+        results[name] = await measure(operation, warmup, repeats)
+    return results
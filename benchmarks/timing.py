@@ -0,0 +1,34 @@
+import math
+import statistics
+import time
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of 'values'."""
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples: list[float]) -> dict:
+    return {
+        "repeats": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+    }
+
+
+async def measure(operation, warmup: int, repeats: int) -> dict:
+    """Time an async callable, discarding 'warmup' runs."""
+    for _ in range(warmup):
+        await operation()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await operation()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
@@ -1,33 +1,64 @@
-import asyncio
 import argparse
+import json
+import os
+import shlex
+import signal
+import socket
+import sys
 
-from app.database import AsyncSessionLocal
-from app.services import create, update, list, remove
-from app.models import NAME_TO_TABLE
-from app.logger import LOGGER
+from datetime import datetime
 
+# asyncio, SQLAlchemy and the app modules are imported by the functions that
+# use them, so the daemon client, --help and argument errors do not pay for them
 
-async def main():
-    parser = argparse.ArgumentParser(
-        description="CLI tool for database management")
+# The per-user runtime directory, or the project directory, rather than the
+# world-writable temporary directory
+SOCKET_PATH = os.getenv("APP_SOCKET") or os.path.join(
+    os.getenv("XDG_RUNTIME_DIR") or os.path.dirname(os.path.abspath(__file__)),
+    "app.sock",
+)
+
+# Arguments that are not entity fields
+NON_ENTITY_ARGS = [
+    "action",
+    "model",
+    "id",
+    "after_id",
+    "limit",
+    "columns",
+    "format",
+    "profile",
+    "query",
+    "batch",
+    "commit_every",
+    "where",
+    "ids",
+    "older_than",
+    "repl",
+    "serve",
+    "connect",
+    "socket",
+    "health",
+]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="CLI tool for database management")
     parser.add_argument(
         "-a",
         "--action",
-        choices=["create", "list", "update", "remove"],
-        required=True,
+        choices=["create", "list", "search", "update", "remove"],
         help="CRUD action",
     )
     parser.add_argument(
         "-m",
         "--model",
         choices=["Teacher", "Group", "Student", "Subject", "Grade"],
-        required=True,
         help="Database model",
     )
     parser.add_argument("-n", "--name", type=str, help="Name of the entity")
     parser.add_argument("-g", "--grade", type=int, help="Grade for the entity")
-    parser.add_argument(
-        "--id", type=int, help="ID of the entity to update or remove")
+    parser.add_argument("--id", type=int, help="ID of the entity to update or remove")
 
     parser.add_argument(
         "-stid",
@@ -54,31 +85,394 @@ async def main():
         help="ID of the teacher entity to add relation for",
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--where",
+        nargs="+",
+        metavar="KEY=VALUE",
+        help="Update or remove every entity whose columns have these values",
+    )
+    parser.add_argument(
+        "--ids",
+        nargs="+",
+        type=int,
+        help="IDs of the entities to update or remove",
+    )
+    parser.add_argument(
+        "--older-than",
+        type=datetime.fromisoformat,
+        help="Update or remove grades received before this date",
+    )
+
+    parser.add_argument(
+        "--after-id",
+        type=int,
+        help="List only entities with ID greater than this (keyset pagination)",
+    )
+    parser.add_argument(
+        "--limit", type=int, help="Maximum number of entities to list or find"
+    )
+    parser.add_argument(
+        "--columns",
+        nargs="+",
+        help="Columns to include in the list output",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["jsonl", "csv"],
+        default="jsonl",
+        help="Output format of the list and search actions",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Loading profile of the list action, listing related entities "
+        "(e.g. students_with_group, see app.profiles)",
+    )
+
+    parser.add_argument(
+        "-q",
+        "--query",
+        help="Name, or the start of a name, to search for (search action)",
+    )
+
+    parser.add_argument(
+        "--batch",
+        help="JSONL file of create/update/remove operations ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        help="Number of batch operations applied per commit (1000 by default)",
+    )
+
+    parser.add_argument(
+        "--health",
+        action="store_true",
+        help="Print the health checks of the database as JSON",
+    )
+    parser.add_argument(
+        "--deep",
+        action="store_true",
+        help="Also run the health checks scanning whole tables (--health)",
+    )
+
+    parser.add_argument(
+        "--repl",
+        action="store_true",
+        help="Read commands interactively, keeping the connection pool warm",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a daemon accepting commands on a Unix socket",
+    )
+    parser.add_argument(
+        "--connect",
+        action="store_true",
+        help="Send this command to the daemon instead of running it",
+    )
+    parser.add_argument(
+        "--socket",
+        default=SOCKET_PATH,
+        help="Unix socket of the daemon (APP_SOCKET by default)",
+    )
+
+    return parser
+
+
+def parse_command(parser, argv=None):
+    args = parser.parse_args(argv)
+    modes = args.repl or args.serve or args.health
+    if not (modes or args.batch) and not (args.action and args.model):
+        parser.error("the following arguments are required: -a/--action, -m/--model")
+    return args
 
+
+async def run_command(args, out=None, stdin=None) -> int:
+    """Run one parsed command and return its exit code."""
+    from app.batch import apply_batch, BATCH_COMMIT_EVERY
+    from app.database import AsyncSessionLocal
+    from app.services import (
+        create,
+        update,
+        update_where,
+        list,
+        search,
+        SEARCH_LIMIT,
+        remove,
+        remove_where,
+        filter_criteria,
+    )
+    from app.models import NAME_TO_TABLE
+    from app.logger import LOGGER
+
+    out = out or sys.stdout
+    stdin = stdin or sys.stdin
     try:
         async with AsyncSessionLocal() as session:
+            if args.health:
+                from app.health import check_health
+
+                report = await check_health(session, deep=args.deep)
+                out.write(json.dumps(report) + "\n")
+                out.flush()
+                return 0 if report["ready"] and report["status"] != "fail" else 1
+            if args.batch:
+                commit_every = args.commit_every or BATCH_COMMIT_EVERY
+                if args.batch == "-":
+                    _, failed = await apply_batch(session, stdin, commit_every)
+                else:
+                    with open(args.batch) as file:
+                        _, failed = await apply_batch(session, file, commit_every)
+                return 1 if failed else 0
             if args.model in NAME_TO_TABLE:
                 model = NAME_TO_TABLE[args.model]
                 kwargs = {
                     k: v
                     for k, v in vars(args).items()
-                    if v is not None and k not in ["action", "model", "id"]
+                    if v is not None and k not in NON_ENTITY_ARGS
                 }
 
+                where = dict(pair.split("=", 1) for pair in args.where or [])
+                criteria = filter_criteria(
+                    model, where, ids=args.ids, older_than=args.older_than
+                )
+
                 if args.action == "create" and (args.name or args.grade):
                     await create(session, model, **kwargs)
                 elif args.action == "update" and args.id:
                     await update(session, model, args.id, **kwargs)
+                elif args.action == "update" and criteria:
+                    await update_where(session, model, criteria, **kwargs)
                 elif args.action == "list":
-                    await list(session, model)
+                    await list(
+                        session,
+                        model,
+                        after_id=args.after_id,
+                        limit=args.limit,
+                        columns=args.columns,
+                        output_format=args.format,
+                        out=out,
+                        profile=args.profile,
+                    )
+                elif args.action == "search":
+                    await search(
+                        session,
+                        model,
+                        args.query,
+                        limit=args.limit or SEARCH_LIMIT,
+                        output_format=args.format,
+                        out=out,
+                    )
                 elif args.action == "remove" and args.id:
                     await remove(session, model, args.id)
+                elif args.action == "remove" and criteria:
+                    await remove_where(session, model, criteria)
             else:
                 LOGGER.warning(f"Model {args.model} not yet implemented.")
     except Exception as e:
         LOGGER.critical(f"Unexpected error: {e}")
+        return 1
+    return 0
+
+
+class _ClientStream:
+    """File-like object sending command output to a daemon client as JSON
+    lines, one per flush. 'drain' lets 'list' wait for slow clients."""
+
+    def __init__(self, writer, key: str = "out"):
+        self.writer = writer
+        self.key = key
+        self.buffer = []
+
+    def write(self, text: str) -> None:
+        self.buffer.append(text)
+
+    def flush(self) -> None:
+        text = "".join(self.buffer)
+        self.buffer.clear()
+        if text:
+            self.writer.write((json.dumps({self.key: text}) + "\n").encode())
+
+    async def drain(self) -> None:
+        await self.writer.drain()
+
+
+async def serve(path: str = SOCKET_PATH, stop=None) -> int:
+    """Accept commands from 'main.py --connect' on a Unix socket, until
+    SIGINT/SIGTERM or until the 'stop' event is set.
+
+    The engine and its connection pool stay warm between commands. Commands
+    run one at a time, their output and log messages are streamed back to
+    the client, followed by the exit code. Only the owner of the daemon can
+    connect to the socket.
+    """
+    import asyncio
+    import logging
+
+    from app.database import AsyncEngine, REPLICAS
+    from app.instrumentation import INSTRUMENTATION
+    from app.logger import LOGGER
+
+    parser = build_parser()
+    lock = asyncio.Lock()
+
+    async def handle(reader, writer):
+        line = await reader.readline()
+        if not line:
+            # Liveness probe of another 'serve', see below
+            writer.close()
+            return
+        out = _ClientStream(writer)
+        handler = logging.StreamHandler(_ClientStream(writer, "err"))
+        async with lock:
+            LOGGER.addHandler(handler)
+            try:
+                request = json.loads(line)
+                args = parse_command(parser, request["argv"])
+                if args.repl or args.serve:
+                    raise ValueError("--repl and --serve cannot be sent to the daemon")
+                if args.batch and args.batch != "-":
+                    args.batch = os.path.join(request["cwd"], args.batch)
+                code = await run_command(
+                    args, out, request.get("stdin", "").splitlines(keepends=True)
+                )
+            except SystemExit as e:
+                code = e.code
+            except Exception as e:
+                LOGGER.error(f"Invalid command: {e}")
+                code = 2
+            finally:
+                LOGGER.removeHandler(handler)
+                out.flush()
+        writer.write((json.dumps({"exit": code}) + "\n").encode())
+        await writer.drain()
+        writer.close()
+
+    if os.path.exists(path):
+        try:
+            with socket.socket(socket.AF_UNIX) as sock:
+                sock.connect(path)
+        except ConnectionRefusedError:
+            # Left over by a daemon that did not shut down cleanly
+            os.unlink(path)
+        else:
+            LOGGER.error(f"A daemon is already listening on '{path}'")
+            return 1
+
+    async with AsyncEngine.connect() as connection:
+        await connection.exec_driver_sql("SELECT 1")
+
+    async def check_replicas():
+        # Replicas lagging behind or down are skipped until they recover
+        while True:
+            await REPLICAS.check()
+            await asyncio.sleep(REPLICAS.retry_seconds)
+
+    checker = asyncio.create_task(check_replicas()) if REPLICAS else None
+    if stop is None:
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+    # Commands run with the rights of the daemon. The umask keeps the socket
+    # private between bind() and chmod().
+    umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(handle, path)
+    finally:
+        os.umask(umask)
+    os.chmod(path, 0o600)
+    LOGGER.info(f"Listening on '{path}'")
+    try:
+        async with server:
+            await stop.wait()
+        LOGGER.info("Daemon stopped.")
+    finally:
+        os.unlink(path)
+        if checker is not None:
+            checker.cancel()
+        await AsyncEngine.dispose()
+        await REPLICAS.dispose()
+        if INSTRUMENTATION.attached:
+            INSTRUMENTATION.log_summary()
+    return 0
+
+
+def run_client(path: str, argv: list[str]) -> int:
+    """Send a command to the daemon and relay its output. Only the standard
+    library is used, so the client starts in a few milliseconds."""
+    request = {"argv": argv, "cwd": os.getcwd()}
+    if "-" in argv:
+        request["stdin"] = sys.stdin.read()
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(request) + "\n").encode())
+        with sock.makefile("r") as responses:
+            for line in responses:
+                message = json.loads(line)
+                if "out" in message:
+                    sys.stdout.write(message["out"])
+                elif "err" in message:
+                    sys.stderr.write(message["err"])
+                else:
+                    return message["exit"]
+    return 1
+
+
+async def repl():
+    """Read commands (the same arguments as the CLI) until EOF or 'exit'."""
+    try:
+        import readline  # noqa: F401 - line editing and history for input()
+    except ImportError:
+        pass
+    import asyncio
+
+    parser = build_parser()
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            line = await loop.run_in_executor(None, input, "> ")
+        except EOFError:
+            break
+        argv = shlex.split(line)
+        if not argv:
+            continue
+        if argv[0] in ("exit", "quit"):
+            break
+        try:
+            args = parse_command(parser, argv)
+        except SystemExit:
+            continue
+        if args.repl or args.serve or args.connect:
+            print("--repl, --serve and --connect are not available in the REPL")
+            continue
+        await run_command(args)
+
+
+async def run(args) -> int:
+    if args.serve:
+        return await serve(args.socket)
+    if args.repl:
+        await repl()
+        return 0
+
+    from app.instrumentation import INSTRUMENTATION
+
+    code = await run_command(args)
+    if INSTRUMENTATION.attached:
+        INSTRUMENTATION.log_summary()
+    return code
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_command(build_parser(), argv)
+    if args.connect:
+        return run_client(args.socket, argv)
+
+    import asyncio
+
+    return asyncio.run(run(args))
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(main())
@@ -9,6 +9,7 @@ from alembic import context
 
 from app.database import Base, DATABASE_URL
 from app.models import Student, Group, Teacher, Subject, Grade
+from migrations.online import is_dry_run, setting
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -47,7 +48,23 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection):
-    context.configure(connection=connection, target_metadata=target_metadata)
+    dry_run = is_dry_run()
+    # One transaction per migration, so the locks taken by a migration are
+    # released when it is done instead of at the end of the upgrade
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        transaction_per_migration=not dry_run,
+    )
+    if dry_run:
+        # The helpers of migrations.online only log, everything else is
+        # rolled back and gives up quickly on locked tables
+        with connection.begin() as transaction:
+            lock_timeout = int(setting("lock_timeout_ms"))
+            connection.exec_driver_sql(f"SET LOCAL lock_timeout = {lock_timeout}")
+            context.run_migrations()
+            transaction.rollback()
+        return
     with context.begin_transaction():
         context.run_migrations()
 
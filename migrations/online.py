@@ -0,0 +1,368 @@
+"""Helpers for migrations of large tables that must not block writes.
+
+Use them from migration scripts instead of the plain 'op' calls that take
+long locks, e.g. on 'grades':
+
+    from migrations.online import backfill, create_index_concurrently
+
+    def upgrade() -> None:
+        create_index_concurrently("ix_grades_grade", "grades", ["grade"])
+
+Every locking statement runs with a 'lock_timeout' and is retried when it
+times out, so a migration waiting on a busy table never queues the writes
+behind it for long. Settings come from MIGRATION_* environment variables or
+'-x' arguments, e.g.:
+
+    alembic -x dry_run=true -x batch_size=10000 upgrade head
+
+In a dry run, the helpers only log what they would do and an estimate of
+the affected rows, and env.py rolls the whole upgrade back.
+"""
+
+import json
+import os
+import time
+
+from contextlib import contextmanager
+
+from alembic import context, op
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.logger import LOGGER
+
+DEFAULTS = {
+    "dry_run": "false",
+    # Rows updated per transaction by 'backfill', and the pause between them
+    "batch_size": "5000",
+    "batch_sleep": "0.05",
+    # Lock waits longer than this fail and are retried
+    "lock_timeout_ms": "2000",
+    # 0 disables it. Concurrent index builds are not limited.
+    "statement_timeout_ms": "0",
+    "retries": "5",
+    "retry_sleep": "1.0",
+}
+
+LOCK_NOT_AVAILABLE = "55P03"
+QUERY_CANCELED = "57014"
+
+
+def setting(name: str) -> str:
+    """A '-x name=value' argument, MIGRATION_<NAME> or the default."""
+    arguments = context.get_x_argument(as_dictionary=True)
+    return arguments.get(name, os.getenv(f"MIGRATION_{name.upper()}", DEFAULTS[name]))
+
+
+def is_dry_run() -> bool:
+    return setting("dry_run").lower() in ("1", "true", "yes")
+
+
+def estimate_rows(table: str, where: str | None = None) -> int:
+    """Rows of 'table' (matching 'where') estimated by the planner, without
+    reading the table."""
+    condition = f" WHERE {where}" if where else ""
+    plan = (
+        op.get_bind()
+        .execute(text(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table}{condition}"))
+        .scalar()
+    )
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _set_timeouts(scope: str = "", statement_timeout: bool = True) -> None:
+    bind = op.get_bind()
+    lock_timeout = int(setting("lock_timeout_ms"))
+    bind.execute(text(f"SET {scope}lock_timeout = {lock_timeout}"))
+    if statement_timeout:
+        timeout = int(setting("statement_timeout_ms"))
+        bind.execute(text(f"SET {scope}statement_timeout = {timeout}"))
+
+
+@contextmanager
+def _timeouts(statement_timeout: bool = True):
+    """Session timeouts, for statements run in an 'autocommit_block'."""
+    _set_timeouts(statement_timeout=statement_timeout)
+    try:
+        yield
+    finally:
+        op.get_bind().execute(text("RESET lock_timeout"))
+        op.get_bind().execute(text("RESET statement_timeout"))
+
+
+def _retry(action, description: str):
+    """Run 'action' until it does not time out, at most 'retries' + 1 times."""
+    retries = int(setting("retries"))
+    for attempt in range(retries + 1):
+        try:
+            return action()
+        except DBAPIError as e:
+            sqlstate = getattr(e.orig, "sqlstate", None)
+            if (
+                sqlstate not in (LOCK_NOT_AVAILABLE, QUERY_CANCELED)
+                or attempt == retries
+            ):
+                raise
+            delay = float(setting("retry_sleep")) * 2**attempt
+            LOGGER.warning(
+                f"{description} timed out ({e.orig}), retry {attempt + 1}/{retries} "
+                f"in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+
+def execute(sql: str) -> None:
+    """Run a locking statement (e.g. ALTER TABLE) of the migration
+    transaction with the lock and statement timeouts, retrying it from a
+    savepoint when it times out."""
+    if is_dry_run():
+        LOGGER.info(f"Dry run, would execute: {sql}")
+        return
+    bind = op.get_bind()
+
+    def attempt():
+        with bind.begin_nested():
+            _set_timeouts("LOCAL ")
+            bind.execute(text(sql))
+
+    _retry(attempt, sql)
+    # SET LOCAL outlives the savepoint, the timeouts only guard 'sql'
+    bind.execute(text("SET LOCAL lock_timeout = DEFAULT"))
+    bind.execute(text("SET LOCAL statement_timeout = DEFAULT"))
+
+
+def _index_sql(
+    name: str,
+    table: str,
+    columns: list[str],
+    unique: bool = False,
+    using: str | None = None,
+    include: list[str] | None = None,
+    concurrently: bool = False,
+    only: bool = False,
+) -> str:
+    sql = (
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX "
+        f"{'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+        f"ON {'ONLY ' if only else ''}{table}"
+    )
+    if using:
+        sql += f" USING {using}"
+    sql += f" ({', '.join(columns)})"
+    if include:
+        sql += f" INCLUDE ({', '.join(include)})"
+    return sql
+
+
+def _partitions(table: str) -> list[str]:
+    result = op.get_bind().execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+        ),
+        {"table": table},
+    )
+    return result.scalars().all()
+
+
+def _build_concurrently(name: str, table: str, **index) -> None:
+    # A failed concurrent build leaves an invalid index behind, which
+    # 'IF NOT EXISTS' would keep
+    bind = op.get_bind()
+
+    def attempt():
+        invalid = bind.execute(
+            text(
+                "SELECT NOT indisvalid FROM pg_index "
+                "WHERE indexrelid = to_regclass(:name)"
+            ),
+            {"name": name},
+        ).scalar()
+        if invalid:
+            bind.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        bind.execute(text(_index_sql(name, table, concurrently=True, **index)))
+
+    with _timeouts(statement_timeout=False):
+        _retry(attempt, f"Index {name}")
+
+
+def _autocommit(sql: str, description: str, statement_timeout: bool = True) -> None:
+    with _timeouts(statement_timeout):
+        _retry(lambda: op.get_bind().execute(text(sql)), description)
+
+
+def create_index_concurrently(
+    name: str,
+    table: str,
+    columns: list[str],
+    unique: bool = False,
+    using: str | None = None,
+    include: list[str] | None = None,
+) -> None:
+    """Build an index without blocking writes (CREATE INDEX CONCURRENTLY),
+    outside of the migration transaction, which is committed first.
+
+    Partitioned tables cannot be indexed concurrently. Their index is
+    created on the parent only, then built concurrently on every partition
+    and attached, after which it is valid.
+    """
+    index = {"columns": columns, "unique": unique, "using": using, "include": include}
+    if is_dry_run():
+        LOGGER.info(
+            f"Dry run, would build index {name} on {table} concurrently "
+            f"(~{estimate_rows(table)} rows)"
+        )
+        return
+
+    partitions = _partitions(table)
+    with op.get_context().autocommit_block():
+        if not partitions:
+            _build_concurrently(name, table, **index)
+            return
+
+        _autocommit(_index_sql(name, table, only=True, **index), f"Index {name}")
+        for partition in partitions:
+            child = f"{partition}_{'_'.join(columns)}_idx"[:63]
+            _build_concurrently(child, partition, **index)
+            attached = (
+                op.get_bind()
+                .execute(
+                    text(
+                        "SELECT 1 FROM pg_inherits "
+                        "WHERE inhrelid = to_regclass(:child) "
+                        "AND inhparent = to_regclass(:name)"
+                    ),
+                    {"child": child, "name": name},
+                )
+                .scalar()
+            )
+            if not attached:
+                _autocommit(
+                    f"ALTER INDEX {name} ATTACH PARTITION {child}", f"Index {child}"
+                )
+            LOGGER.info(f"Index {child} built and attached to {name}")
+
+
+def drop_index_concurrently(name: str) -> None:
+    """Drop an index of a regular table without blocking writes. Indexes of
+    partitioned tables have to be dropped with 'execute'."""
+    if is_dry_run():
+        LOGGER.info(f"Dry run, would drop index {name} concurrently")
+        return
+    with op.get_context().autocommit_block():
+        _autocommit(
+            f"DROP INDEX CONCURRENTLY IF EXISTS {name}",
+            f"Index {name}",
+            statement_timeout=False,
+        )
+
+
+def backfill(table: str, assignments: str, where: str, key: str = "id") -> int:
+    """Run 'UPDATE table SET assignments WHERE where' in batches of
+    'batch_size' rows ordered by the integer column 'key', each batch being
+    a single statement committed on its own and followed by a 'batch_sleep'
+    pause. 'where' must stop matching updated
+    rows (e.g. 'new_column IS NULL'). Returns the number of updated rows.
+
+    The migration transaction is committed first, so a backfill usually
+    follows the schema change that added the column.
+    """
+    if is_dry_run():
+        LOGGER.info(
+            f"Dry run, would backfill {table} SET {assignments} "
+            f"(~{estimate_rows(table, where)} rows)"
+        )
+        return 0
+
+    batch_size = int(setting("batch_size"))
+    batch_sleep = float(setting("batch_sleep"))
+    statement = text(
+        f"WITH batch AS (SELECT {key} FROM {table} WHERE {key} > :last AND ({where}) "
+        f"ORDER BY {key} LIMIT :batch_size FOR UPDATE) "
+        f"UPDATE {table} SET {assignments} FROM batch "
+        f"WHERE {table}.{key} = batch.{key} RETURNING {table}.{key}"
+    )
+    bind = op.get_bind()
+    updated = 0
+    start = time.perf_counter()
+    with op.get_context().autocommit_block(), _timeouts():
+
+        def update_batch():
+            result = bind.execute(statement, {"last": last, "batch_size": batch_size})
+            return result.scalars().all()
+
+        # Batches start after 'last'
+        last = bind.execute(text(f"SELECT min({key}) - 1 FROM {table}")).scalar()
+        if last is None:
+            return 0
+        while True:
+            keys = _retry(update_batch, f"Backfill of {table}")
+            if not keys:
+                break
+            updated += len(keys)
+            last = max(keys)
+            LOGGER.info(
+                f"Backfilled {updated} rows of {table} "
+                f"({updated / (time.perf_counter() - start):.0f} rows/s)"
+            )
+            time.sleep(batch_sleep)
+    return updated
+
+
+def add_foreign_key(
+    name: str,
+    source: str,
+    referent: str,
+    local_columns: list[str],
+    remote_columns: list[str],
+    ondelete: str | None = None,
+) -> None:
+    """Add a foreign key without blocking writes while existing rows are
+    checked: it is added NOT VALID (a short lock, only new rows are checked)
+    and validated in a later transaction, which does not block writes.
+
+    PostgreSQL does not support NOT VALID foreign keys on partitioned
+    tables, add them to each partition instead.
+    """
+    if is_dry_run():
+        LOGGER.info(
+            f"Dry run, would add foreign key {name} on {source} and validate "
+            f"~{estimate_rows(source)} rows"
+        )
+        return
+    execute(
+        f"ALTER TABLE {source} ADD CONSTRAINT {name} "
+        f"FOREIGN KEY ({', '.join(local_columns)}) "
+        f"REFERENCES {referent} ({', '.join(remote_columns)})"
+        f"{f' ON DELETE {ondelete}' if ondelete else ''} NOT VALID"
+    )
+    validate_constraint(source, name)
+
+
+def validate_constraint(table: str, name: str) -> None:
+    """Validate a NOT VALID constraint in its own transaction, after the
+    migration transaction holding the lock of 'ALTER TABLE' is committed."""
+    if is_dry_run():
+        LOGGER.info(f"Dry run, would validate {name} on {table}")
+        return
+    with op.get_context().autocommit_block():
+        _autocommit(
+            f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}",
+            f"Validation of {name}",
+            statement_timeout=False,
+        )
+
+
+def set_not_null(table: str, column: str) -> None:
+    """SET NOT NULL without scanning the table under an exclusive lock: a
+    validated CHECK (column IS NOT NULL) constraint proves it first."""
+    check = f"{table}_{column}_not_null"[:63]
+    execute(
+        f"ALTER TABLE {table} ADD CONSTRAINT {check} "
+        f"CHECK ({column} IS NOT NULL) NOT VALID"
+    )
+    validate_constraint(table, check)
+    execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL")
+    execute(f"ALTER TABLE {table} DROP CONSTRAINT {check}")
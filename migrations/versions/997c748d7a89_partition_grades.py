@@ -0,0 +1,127 @@
+"""Partition grades by date_received
+
+Revision ID: 997c748d7a89
+Revises: 84c0b6de8aab
+Create Date: 2026-10-18 17:03:00.758158
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "997c748d7a89"
+down_revision: Union[str, None] = "84c0b6de8aab"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+GRADE_COLUMNS = "id, student_id, subject_id, teacher_id, grade, date_received"
+
+
+def create_grades_table(primary_key: list[str], **kwargs) -> None:
+    op.create_table(
+        "grades",
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('grades_id_seq'::regclass)"),
+            nullable=False,
+        ),
+        sa.Column("student_id", sa.Integer(), nullable=False),
+        sa.Column("subject_id", sa.Integer(), nullable=False),
+        sa.Column("teacher_id", sa.Integer(), nullable=False),
+        sa.Column("grade", sa.Integer(), nullable=False),
+        sa.Column("date_received", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["student_id"], ["students.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["subject_id"], ["subjects.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["teacher_id"], ["teachers.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint(*primary_key),
+        **kwargs,
+    )
+    op.create_index(
+        "ix_grades_student_id_teacher_id",
+        "grades",
+        ["student_id", "teacher_id"],
+        unique=False,
+        postgresql_include=["subject_id", "grade"],
+    )
+    op.create_index(
+        "ix_grades_subject_id_student_id",
+        "grades",
+        ["subject_id", "student_id"],
+        unique=False,
+        postgresql_include=["grade"],
+    )
+    op.create_index("ix_grades_teacher_id", "grades", ["teacher_id"], unique=False)
+
+
+def rename_grades_table(name: str) -> None:
+    """Rename 'grades' out of the way, along with its index and constraint
+    names."""
+    op.execute(f"ALTER TABLE grades RENAME TO {name}")
+    op.execute(f"ALTER INDEX grades_pkey RENAME TO {name}_pkey")
+    for column in ("student_id", "subject_id", "teacher_id"):
+        op.execute(
+            f"ALTER TABLE {name} RENAME CONSTRAINT grades_{column}_fkey TO {name}_{column}_fkey"
+        )
+    for index in (
+        "ix_grades_student_id_teacher_id",
+        "ix_grades_subject_id_student_id",
+        "ix_grades_teacher_id",
+    ):
+        op.execute(f"ALTER INDEX {index} RENAME TO {index.replace('grades', name)}")
+
+
+def upgrade() -> None:
+    # Rows are copied into a new partitioned table, which rewrites 'grades'
+    # and locks it for the duration of the migration
+    rename_grades_table("grades_unpartitioned")
+    create_grades_table(
+        ["id", "date_received"], postgresql_partition_by="RANGE (date_received)"
+    )
+    op.execute("ALTER SEQUENCE grades_id_seq OWNED BY grades.id")
+    op.execute("CREATE TABLE grades_default PARTITION OF grades DEFAULT")
+
+    # Monthly partitions for the existing grades and the next three months,
+    # the same layout app.partitions.create_partitions maintains
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            month timestamp;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce(min(date_received), now())),
+                    date_trunc('month', greatest(max(date_received), now())) + interval '3 months',
+                    interval '1 month'
+                ) FROM grades_unpartitioned
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF grades FOR VALUES FROM (%L) TO (%L)',
+                    'grades_' || to_char(month, 'YYYY_MM'), month, month + interval '1 month'
+                );
+            END LOOP;
+        END $$
+        """
+    )
+    op.execute(
+        f"INSERT INTO grades ({GRADE_COLUMNS}) SELECT {GRADE_COLUMNS} FROM grades_unpartitioned"
+    )
+    op.drop_table("grades_unpartitioned")
+    op.execute("ANALYZE grades")
+
+
+def downgrade() -> None:
+    rename_grades_table("grades_partitioned")
+    create_grades_table(["id"])
+    op.execute("ALTER SEQUENCE grades_id_seq OWNED BY grades.id")
+    op.execute(
+        f"INSERT INTO grades ({GRADE_COLUMNS}) SELECT {GRADE_COLUMNS} FROM grades_partitioned"
+    )
+    # Dropping the partitioned table drops all of its partitions
+    op.drop_table("grades_partitioned")
+    op.execute("ANALYZE grades")
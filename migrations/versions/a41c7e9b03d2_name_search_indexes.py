@@ -0,0 +1,64 @@
+"""Name search indexes
+
+Revision ID: a41c7e9b03d2
+Revises: 5d3e8f1a2c47
+Create Date: 2026-10-18 21:58:07.604519
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a41c7e9b03d2"
+down_revision: Union[str, None] = "5d3e8f1a2c47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCHABLE_TABLES = ("groups", "students", "teachers", "subjects")
+
+
+# pg_trgm is optional: without it the indexes are skipped and the search
+# falls back to ILIKE
+INSTALL_TRIGRAM = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    END IF;
+END
+$$
+"""
+TRIGRAM_INSTALLED = "SELECT EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_trgm')"
+
+
+def upgrade() -> None:
+    op.execute(INSTALL_TRIGRAM)
+    # Offline SQL is rendered as if the extension were installed
+    if not op.get_context().as_sql:
+        if not op.get_bind().execute(sa.text(TRIGRAM_INSTALLED)).scalar():
+            return
+    for table in SEARCHABLE_TABLES:
+        op.create_index(
+            f"ix_{table}_name_trgm",
+            table,
+            ["name"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        )
+
+
+def downgrade() -> None:
+    # The pg_trgm extension is left installed, other objects may use it
+    for table in SEARCHABLE_TABLES:
+        op.drop_index(
+            f"ix_{table}_name_trgm",
+            table_name=table,
+            if_exists=True,
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        )
@@ -0,0 +1,126 @@
+import pytest
+
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+import app.my_select as queries
+
+from app import services
+from app.archive import archive_grades
+from app.database import AsyncSessionLocal
+from app.health import tables_ready
+from app.models import Student, Subject, Teacher, Grade, GradeArchive
+from app.partitions import (
+    _create_partition,
+    detach_partitions,
+    is_partitioned,
+    partition_name,
+)
+from app.seed import seed_database
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_archive_grades():
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            before = (
+                await session.execute(
+                    select(Grade.date_received)
+                    .order_by(Grade.date_received)
+                    .offset(5)
+                    .limit(1)
+                )
+            ).scalar()
+            total = (
+                await session.execute(
+                    select(
+                        select(func.count()).select_from(Grade).scalar_subquery()
+                        + select(func.count())
+                        .select_from(GradeArchive)
+                        .scalar_subquery()
+                    )
+                )
+            ).scalar()
+
+        moved = await archive_grades(session, before, batch_size=2, pause=0)
+        assert moved >= 5
+
+        async with session.begin():
+            remaining = (
+                await session.execute(
+                    select(func.count()).where(Grade.date_received < before)
+                )
+            ).scalar()
+            archived = (
+                await session.execute(
+                    select(func.count()).select_from(queries.grades_source(True))
+                )
+            ).scalar()
+        assert remaining == 0
+        assert archived == total
+
+        # The aggregates no longer count the archived grades
+        aggregated = await queries.select_4(session)
+        computed = await queries.select_4(session, date_from=before)
+        assert round(aggregated, 6) == round(computed, 6)
+
+
+async def _count_all_grades(session) -> int:
+    async with session.begin():
+        return (
+            await session.execute(
+                select(func.count()).select_from(queries.grades_source(True))
+            )
+        ).scalar()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_detached_partitions_stay_in_archived_reports():
+    if not await tables_ready():
+        await seed_database()
+
+    month = datetime(1990, 1, 1)
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            if not await is_partitioned(session):
+                pytest.skip("'grades' is not partitioned")
+            await _create_partition(
+                session, partition_name(month), month, datetime(1990, 2, 1)
+            )
+            student_id, subject_id, teacher_id = (
+                await session.execute(
+                    select(
+                        select(func.min(Student.id)).scalar_subquery(),
+                        select(func.min(Subject.id)).scalar_subquery(),
+                        select(func.min(Teacher.id)).scalar_subquery(),
+                    )
+                )
+            ).one()
+        grade = await services.create(
+            session,
+            Grade,
+            student_id=student_id,
+            subject_id=subject_id,
+            teacher_id=teacher_id,
+            grade=42,
+            date_received=datetime(1990, 1, 15),
+        )
+        total = await _count_all_grades(session)
+
+        detached = await detach_partitions(session, datetime(1990, 2, 1))
+        assert detached == [partition_name(month)]
+
+        assert await _count_all_grades(session) == total
+        async with session.begin():
+            archived = await session.get(GradeArchive, grade.id)
+            assert archived.grade == 42
+            await session.delete(archived)
+
+        # The aggregates no longer count the detached grades
+        aggregated = await queries.select_4(session)
+        computed = await queries.select_4(session, date_from=datetime(1900, 1, 1))
+        assert round(aggregated, 6) == round(computed, 6)
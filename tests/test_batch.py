@@ -0,0 +1,79 @@
+import json
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlalchemy import func, select
+
+import app.my_select as queries
+
+from app import services
+from app.batch import apply_batch
+from app.database import AsyncSessionLocal
+from app.health import tables_ready
+from app.models import Student, Subject, Teacher, Grade
+from app.seed import seed_database
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_apply_batch_reports_failing_lines():
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            student_id, subject_id, teacher_id = (
+                await session.execute(
+                    select(
+                        select(func.min(Student.id)).scalar_subquery(),
+                        select(func.min(Subject.id)).scalar_subquery(),
+                        select(func.min(Teacher.id)).scalar_subquery(),
+                    )
+                )
+            ).one()
+            teacher = await session.get(Teacher, teacher_id)
+        received = datetime(2000, 1, 2, 3, 4, 5)
+        grade = {
+            "action": "create",
+            "model": "Grade",
+            "student_id": student_id,
+            "subject_id": subject_id,
+            "teacher_id": teacher_id,
+            "grade": 70,
+        }
+        future = datetime.now() + timedelta(days=1)
+        operations = [
+            {**grade, "date_received": received.isoformat()},
+            # Rejected by the validator of the model
+            {**grade, "date_received": future.isoformat()},
+            {"action": "update", "model": "Teacher", "id": -1, "name": "x"},
+            {"action": "update", "model": "Teacher", "id": teacher_id, "name": "x"},
+            {
+                "action": "update",
+                "model": "Teacher",
+                "id": teacher_id,
+                "name": teacher.name,
+            },
+        ]
+        lines = [json.dumps(operation) for operation in operations]
+
+        assert await apply_batch(session, lines) == (3, 2)
+
+        async with session.begin():
+            count = (
+                await session.execute(
+                    select(func.count())
+                    .select_from(Grade)
+                    .where(Grade.date_received.in_([received, future]))
+                )
+            ).scalar()
+            name = (await session.get(Teacher, teacher_id, populate_existing=True)).name
+        assert count == 1
+        assert name == teacher.name
+
+        aggregated = await queries.select_4(session)
+        computed = await queries.select_4(session, date_from=datetime(1900, 1, 1))
+        assert round(aggregated, 6) == round(computed, 6)
+
+        await services.remove_where(session, Grade, [Grade.date_received == received])
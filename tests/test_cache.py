@@ -0,0 +1,66 @@
+import pytest
+
+from app.cache import ReportCache, cached
+from app.models import Student, Teacher, Grade
+
+
+def test_lru_eviction():
+    cache = ReportCache(maxsize=2, ttl=60)
+    cache.set("a", 1, [Grade])
+    cache.set("b", 2, [Grade])
+    assert cache.get("a") == (True, 1)
+    cache.set("c", 3, [Grade])
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+
+
+def test_ttl_expiry():
+    cache = ReportCache(ttl=-1)
+    cache.set("a", 1, [Grade])
+
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_only_dependent_entries():
+    cache = ReportCache()
+    cache.set("grades", 1, [Student, Grade])
+    cache.set("teachers", 2, [Teacher])
+    cache.invalidate(Grade)
+
+    assert cache.get("grades") == (False, None)
+    assert cache.get("teachers") == (True, 2)
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_set_skipped_after_concurrent_invalidation():
+    cache = ReportCache()
+    versions = cache.versions([Grade])
+    cache.invalidate(Grade)
+    cache.set("a", 1, [Grade], versions)
+
+    assert cache.get("a") == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_cached_report():
+    cache = ReportCache()
+    calls = []
+
+    @cached(Grade, cache=cache)
+    async def report(session, student_id: int | None = None):
+        calls.append(student_id)
+        return [student_id]
+
+    assert await report(None, student_id=1) == [1]
+    assert await report(None, 1) == [1]
+    assert await report(None) == [None]
+    assert await report(None) == [None]
+    assert calls == [1, None, None]
+    assert cache.stats()["hits"] == 1
+
+    cache.invalidate(Grade)
+    await report(None, student_id=1)
+    assert calls == [1, None, None, 1]
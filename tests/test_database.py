@@ -0,0 +1,43 @@
+from sqlalchemy import select, update
+
+from app.database import ReplicaSet, RoutingSession, make_engine
+from app.models import Teacher
+
+
+def test_routing_session_sends_reads_to_replicas():
+    primary = make_engine().sync_engine
+    replicas = ReplicaSet([make_engine(), make_engine()])
+    first, second = (engine.sync_engine for engine in replicas.engines)
+    session = RoutingSession(bind=primary, replicas=replicas)
+    read = select(Teacher)
+
+    # One replica per transaction, round robin between transactions
+    with session.begin():
+        assert session.get_bind(clause=read) is first
+        assert session.get_bind(clause=read) is first
+    with session.begin():
+        assert session.get_bind(clause=read) is second
+
+    # Writes and the reads following them go to the primary
+    with session.begin():
+        assert session.get_bind(clause=read.with_for_update()) is primary
+        assert session.get_bind(clause=update(Teacher).values(name="x")) is primary
+        assert session.get_bind(clause=read) is primary
+    with session.begin():
+        assert session.get_bind(clause=read) is first
+
+    replicas.mark_down(first)
+    replicas.mark_down(second)
+    with session.begin():
+        assert session.get_bind(clause=read) is primary
+
+
+def test_routing_session_read_your_writes():
+    primary = make_engine().sync_engine
+    replicas = ReplicaSet([make_engine()])
+    session = RoutingSession(bind=primary, replicas=replicas, read_your_writes=True)
+
+    with session.begin():
+        session.get_bind(clause=update(Teacher).values(name="x"))
+    with session.begin():
+        assert session.get_bind(clause=select(Teacher)) is primary
@@ -0,0 +1,37 @@
+import pytest
+
+from app.database import AsyncSessionLocal
+from app.health import ALL_CHECKS, CHECKS, check_health, tables_ready
+from app.seed import seed_database
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_check_health():
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        report = await check_health(session)
+
+    assert report["ready"]
+    assert set(report["checks"]) == set(CHECKS)
+    assert report["checks"]["tables"] == {
+        "status": "ok",
+        "elapsed_ms": report["checks"]["tables"]["elapsed_ms"],
+        "empty": [],
+    }
+    assert report["status"] in ("ok", "warn")
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_check_health_deep():
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        report = await check_health(session, deep=True, deep_budget_ms=60000)
+        starved = await check_health(session, ["orphans"], deep_budget_ms=1)
+
+    assert set(report["checks"]) == set(ALL_CHECKS)
+    assert report["checks"]["orphans"]["orphans"] == {}
+    assert starved["checks"]["orphans"]["status"] == "timeout"
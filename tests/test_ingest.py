@@ -0,0 +1,82 @@
+import asyncio
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from sqlalchemy import func, select
+
+import app.my_select as queries
+
+from app import services
+from app.database import AsyncSessionLocal
+from app.health import tables_ready
+from app.ingest import GradeWriter
+from app.models import Student, Subject, Teacher, Grade
+from app.seed import seed_database
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_grade_writer():
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            student_id, subject_id, teacher_id = (
+                await session.execute(
+                    select(
+                        select(func.min(Student.id)).scalar_subquery(),
+                        select(func.min(Subject.id)).scalar_subquery(),
+                        select(func.min(Teacher.id)).scalar_subquery(),
+                    )
+                )
+            ).one()
+    grade = {
+        "student_id": student_id,
+        "subject_id": subject_id,
+        "teacher_id": teacher_id,
+    }
+
+    async with GradeWriter(batch_size=10, max_latency_ms=5, queue_size=4) as writer:
+        with pytest.raises(ValueError):
+            await writer.enqueue(
+                **grade, grade=50, date_received=datetime.now() + timedelta(days=1)
+            )
+        futures = []
+        for value in range(1, 26):
+            # A missing student only fails its own grade, not its batch
+            fields = {**grade, "student_id": -1} if value == 8 else grade
+            futures.append(await writer.enqueue(**fields, grade=value))
+        results = await asyncio.gather(*futures, return_exceptions=True)
+
+    failed = results.pop(7)
+    assert isinstance(failed, Exception)
+    assert all(isinstance(id, int) for id in results)
+    assert writer.inserted == 24
+    assert writer.failed == 1
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            values = (
+                (
+                    await session.execute(
+                        select(Grade.grade)
+                        .where(services.id_in(Grade, results))
+                        .order_by(Grade.grade)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+        assert values == [value for value in range(1, 26) if value != 8]
+
+        # The aggregates count the written grades
+        aggregated = await queries.select_4(session)
+        computed = await queries.select_4(session, date_from=datetime(1900, 1, 1))
+        assert round(aggregated, 6) == round(computed, 6)
+
+        await services.remove_where(session, Grade, [services.id_in(Grade, results)])
+
+    with pytest.raises(RuntimeError):
+        await writer.enqueue(**grade, grade=50)
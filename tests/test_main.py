@@ -0,0 +1,53 @@
+import asyncio
+import json
+import os
+import socket
+import stat
+
+import pytest
+
+from app.health import tables_ready
+from app.seed import seed_database
+from main import run_client, serve
+
+
+def _send(path: str, request: bytes) -> dict:
+    # The last line the daemon answers a raw request with
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(path)
+        sock.sendall(request)
+        with sock.makefile("r") as responses:
+            return json.loads(responses.readlines()[-1])
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_daemon_round_trip(tmp_path, capsys):
+    if not await tables_ready():
+        await seed_database()
+
+    path = str(tmp_path / "app.sock")
+    stop = asyncio.Event()
+    daemon = asyncio.create_task(serve(path, stop))
+    try:
+        for _ in range(100):
+            if os.path.exists(path) or daemon.done():
+                break
+            await asyncio.sleep(0.05)
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+        argv = ["-a", "list", "-m", "Group", "--limit", "2"]
+        assert await asyncio.to_thread(run_client, path, argv) == 0
+        rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert len(rows) == 2
+        assert rows[0]["id"] < rows[1]["id"]
+
+        # Invalid commands fail on the daemon side, which keeps serving
+        argv = ["-a", "list", "-m", "Nothing"]
+        assert await asyncio.to_thread(run_client, path, argv) == 2
+        assert await asyncio.to_thread(run_client, path, ["--health"]) == 0
+        for request in (b"not json\n", b'{"cwd": "/"}\n'):
+            assert await asyncio.to_thread(_send, path, request) == {"exit": 2}
+    finally:
+        stop.set()
+        assert await daemon == 0
+    assert not os.path.exists(path)
@@ -1,18 +1,22 @@
 import pytest
 import logging
 
+from datetime import datetime
+
 import app.my_select as queries
 
 from app.logger import LOGGER
 from app.database import AsyncSessionLocal
-from app.seed import seed_database, verify_tables
+from app.models import Student, Group, Teacher, Subject
+from app.health import tables_ready
+from app.seed import seed_database
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 async def test_queries(caplog):
-    if not await verify_tables():
+    if not await tables_ready():
         await seed_database()
-    assert await verify_tables()
+    assert await tables_ready()
 
     try:
         session = AsyncSessionLocal()
@@ -28,3 +32,68 @@ async def test_queries(caplog):
         await queries.select_10(session)
     except Exception as e:
         pytest.fail(e)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_queries_with_ids(caplog):
+    if not await tables_ready():
+        await seed_database()
+
+    try:
+        session = AsyncSessionLocal()
+        student = await queries.pick(session, Student)
+        group = await queries.pick(session, Group)
+        teacher = await queries.pick(session, Teacher)
+        subject = await queries.pick(session, Subject)
+        await session.commit()
+
+        await queries.select_2(session, subject_id=subject.id)
+        await queries.select_3(session, subject_id=subject.id)
+        await queries.select_5(session, teacher_id=teacher.id)
+        await queries.select_6(session, group_id=group.id)
+        await queries.select_7(session, group_id=group.id, subject_id=subject.id)
+        await queries.select_8(session, teacher_id=teacher.id)
+        await queries.select_9(session, student_id=student.id)
+        await queries.select_10(session, student_id=student.id, teacher_id=teacher.id)
+
+        # Date ranges read the matching 'grades' partitions instead of the
+        # aggregates
+        start = datetime(datetime.now().year, 1, 1)
+        await queries.select_1(session, date_from=start)
+        await queries.select_2(session, subject_id=subject.id, date_to=datetime.now())
+        await queries.select_3(session, subject_id=subject.id, date_from=start)
+        await queries.select_4(session, date_from=start, date_to=datetime.now())
+        await queries.select_8(session, teacher_id=teacher.id, date_from=start)
+        await queries.select_9(session, student_id=student.id, date_from=start)
+    except Exception as e:
+        pytest.fail(e)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_matrix_reports():
+    if not await tables_ready():
+        await seed_database()
+
+    session = AsyncSessionLocal()
+    subject = await queries.pick(session, Subject)
+    await session.commit()
+
+    top = await queries.select_top_students_per_subject(session, limit=1)
+    best = await queries.select_2(session, subject_id=subject.id)
+    assert top[subject.name][0][1] == best[1]
+
+    averages = await queries.select_group_subject_averages(session)
+    assert averages["avg_grade"] == await queries.select_4(session)
+    for group, avg_grade in await queries.select_3(session, subject_id=subject.id):
+        assert averages["groups"][group]["subjects"][subject.name] == avg_grade
+
+    # The raw 'grades' path gives the same averages
+    start = datetime(1970, 1, 1)
+    raw = await queries.select_group_subject_averages(session, date_from=start)
+    assert raw["avg_grade"] == averages["avg_grade"]
+
+    teachers = await queries.select_teacher_subject_averages(session)
+    assert all(entry["avg_grade"] is not None for entry in teachers.values())
+    teacher = await queries.pick(session, Teacher)
+    await session.commit()
+    assert teachers[teacher.id]["name"] == teacher.name
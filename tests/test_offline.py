@@ -0,0 +1,76 @@
+import pytest
+
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.my_select as queries
+
+from app.columnar import export, load
+from app.database import (
+    AsyncEngine,
+    AsyncSessionLocal,
+    ReplicaSet,
+    RoutingSession,
+    make_engine,
+)
+from app.models import Student, Group, Teacher, Subject, Grade
+from app.offline import OfflineReports, compare_with_sql
+from app.health import tables_ready
+from app.seed import seed_database
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_offline_reports_match_sql(tmp_path):
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        await export(session, str(tmp_path))
+        ids = {
+            "student_id": (await queries.pick(session, Student)).id,
+            "group_id": (await queries.pick(session, Group)).id,
+            "teacher_id": (await queries.pick(session, Teacher)).id,
+            "subject_id": (await queries.pick(session, Subject)).id,
+        }
+        await session.commit()
+
+        reports = OfflineReports.from_export(str(tmp_path))
+        assert await compare_with_sql(session, reports, ids) == []
+        assert (
+            await compare_with_sql(
+                session, reports, ids, date_from=datetime(datetime.now().year, 3, 1)
+            )
+            == []
+        )
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_export_reads_one_snapshot_with_replicas(tmp_path):
+    if not await tables_ready():
+        await seed_database()
+
+    # Nothing listens there: any read routed to the replica fails
+    replica = make_engine(
+        AsyncEngine.url.set(host="127.0.0.1", port=1), pool_size=1, max_overflow=0
+    )
+    session = AsyncSession(
+        AsyncEngine,
+        sync_session_class=RoutingSession,
+        replicas=ReplicaSet([replica]),
+    )
+    try:
+        count = await export(session, str(tmp_path))
+    finally:
+        await session.close()
+        await replica.dispose()
+
+    async with AsyncSessionLocal() as session:
+        total = (
+            await session.execute(select(func.count()).select_from(Grade))
+        ).scalar()
+    data = load(str(tmp_path))
+    assert count == total
+    assert len(data["grades"]["student_id"]) == count
+    assert len(data["students"]["id"]) > 0
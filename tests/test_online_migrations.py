@@ -0,0 +1,92 @@
+import pytest
+
+from argparse import Namespace
+
+from alembic.config import Config
+from alembic.operations import Operations
+from alembic.runtime.environment import EnvironmentContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+
+from app.database import make_engine
+from migrations import online
+
+
+def _migrate(connection, upgrade, x_arguments=()):
+    # What env.py and Alembic set up around the upgrade() of one migration
+    config = Config("alembic.ini", cmd_opts=Namespace(x=x_arguments))
+    with EnvironmentContext(config, ScriptDirectory.from_config(config)) as env:
+        env.configure(connection=connection, transaction_per_migration=True)
+        migration = env.get_context()
+        with migration.begin_transaction(_per_migration=True):
+            with Operations.context(migration):
+                upgrade()
+
+
+def _upgrade():
+    online.op.execute("CREATE TABLE online_test (id serial PRIMARY KEY, value int)")
+    online.op.execute("INSERT INTO online_test (value) SELECT generate_series(1, 250)")
+    online.execute("ALTER TABLE online_test ADD COLUMN doubled int")
+    assert online.backfill("online_test", "doubled = value * 2", "doubled IS NULL")
+    online.set_not_null("online_test", "doubled")
+    online.create_index_concurrently(
+        "ix_online_test_doubled", "online_test", ["doubled"]
+    )
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_online_migration():
+    engine = make_engine()
+    async with engine.connect() as connection:
+        await connection.execute(text("DROP TABLE IF EXISTS online_test"))
+        await connection.commit()
+        await connection.run_sync(
+            _migrate, _upgrade, ["batch_size=100", "batch_sleep=0"]
+        )
+
+    async with engine.connect() as connection:
+        wrong = (
+            await connection.execute(
+                text("SELECT count(*) FROM online_test WHERE doubled <> value * 2")
+            )
+        ).scalar()
+        not_null = (
+            await connection.execute(
+                text(
+                    "SELECT attnotnull FROM pg_attribute WHERE attname = 'doubled' "
+                    "AND attrelid = 'online_test'::regclass"
+                )
+            )
+        ).scalar()
+        valid = (
+            await connection.execute(
+                text(
+                    "SELECT indisvalid FROM pg_index "
+                    "WHERE indexrelid = to_regclass('ix_online_test_doubled')"
+                )
+            )
+        ).scalar()
+        await connection.execute(text("DROP TABLE online_test"))
+        await connection.commit()
+    await engine.dispose()
+
+    assert wrong == 0
+    assert not_null
+    assert valid
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_online_migration_dry_run():
+    def upgrade():
+        online.create_index_concurrently("ix_grades_dry_run", "grades", ["grade"])
+        online.backfill("grades", "grade = grade", "grade > 0")
+
+    engine = make_engine()
+    async with engine.connect() as connection:
+        await connection.run_sync(_migrate, upgrade, ["dry_run=true"])
+        created = (
+            await connection.execute(text("SELECT to_regclass('ix_grades_dry_run')"))
+        ).scalar()
+    await engine.dispose()
+
+    assert created is None
@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import InvalidRequestError
+
+from app import services
+from app.database import AsyncEngine, AsyncSessionLocal
+from app.health import tables_ready
+from app.models import Student, Group
+from app.profiles import load
+from app.seed import seed_database
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_lazy_loads_raise():
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            student = (await session.execute(select(Student).limit(1))).scalar()
+            with pytest.raises(InvalidRequestError):
+                student.group
+
+        [loaded] = await load(session, "students_with_group", ids=[student.id])
+    assert loaded["group"]["id"] == student.group_id
+    assert loaded["grade_count"] >= 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_list_profile_runs_a_fixed_number_of_statements():
+    if not await tables_ready():
+        await seed_database()
+
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    event.listen(AsyncEngine.sync_engine, "before_cursor_execute", count)
+    try:
+        counts = []
+        for limit in (1, None):
+            statements.clear()
+            async with AsyncSessionLocal() as session:
+                await services.list(
+                    session,
+                    Group,
+                    limit=limit,
+                    out=io.StringIO(),
+                    profile="groups_with_students",
+                )
+            counts.append(len(statements))
+    finally:
+        event.remove(AsyncEngine.sync_engine, "before_cursor_execute", count)
+
+    # The groups, then their students in one statement
+    assert counts == [2, 2]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_list_profile_rejects_other_models():
+    async with AsyncSessionLocal() as session:
+        with pytest.raises(ValueError):
+            await services.list(session, Student, profile="groups_with_students")
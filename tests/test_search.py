@@ -0,0 +1,62 @@
+import io
+import json
+
+import pytest
+
+from app.database import AsyncSessionLocal
+from app.health import tables_ready
+from app.models import Student, Grade
+from app.my_select import pick
+from app.seed import seed_database
+from app.services import escape_like, search, search_query
+
+
+def test_escape_like():
+    assert escape_like("50%_a/b") == "50/%/_a//b"
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_search_rejects_invalid_queries():
+    with pytest.raises(ValueError):
+        await search(None, Grade, "Smith")
+    with pytest.raises(ValueError):
+        await search(None, Student, " ab ")
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_search_ranks_prefix_matches_first():
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            student = await pick(session, Student)
+
+        # pg_trgm similarity when the server has it, ILIKE otherwise
+        out = io.StringIO()
+        found = await search(session, Student, student.name[:5].upper(), out=out)
+
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert found == len(rows) > 0
+    assert student.id in [row["id"] for row in rows]
+    assert rows[0]["name"].lower().startswith(student.name[:5].lower())
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_search_without_trigrams_matches_substrings():
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            student = await pick(session, Student)
+            part = student.name[1:6]
+            rows = (
+                await session.execute(
+                    search_query(Student, part.lower(), limit=1000, similarity=False)
+                )
+            ).all()
+
+    assert student.id in [row.id for row in rows]
+    assert all(part.lower() in row.name.lower() for row in rows)
+    assert all(row.score is None for row in rows)
@@ -0,0 +1,60 @@
+from datetime import datetime
+from random import Random
+
+import pytest
+
+from app.seed import _grade_records
+
+
+def test_sharded_grade_records_match_the_whole():
+    teachers_by_subject = {1: [1], 2: [2, 3], 3: [3]}
+    period = (datetime(2024, 1, 1), datetime(2024, 6, 1))
+    students, grades = range(1, 11), 95
+    pairs = len(students) * len(teachers_by_subject)
+
+    def pair_counts(records):
+        counts = {}
+        for student_id, subject_id, *_ in records:
+            counts[student_id, subject_id] = counts.get((student_id, subject_id), 0) + 1
+        return counts
+
+    whole = pair_counts(
+        _grade_records(Random(1), students, teachers_by_subject, grades, period=period)
+    )
+    sharded = {}
+    for start in range(0, len(students), 4):
+        shard = students[start : start + 4]
+        sharded |= pair_counts(
+            _grade_records(
+                Random(start),
+                shard,
+                teachers_by_subject,
+                grades,
+                pairs,
+                start * len(teachers_by_subject),
+                period,
+            )
+        )
+
+    assert sum(sharded.values()) == grades
+    assert sharded == whole
+
+
+def test_grade_records_in_an_empty_period():
+    new_year = datetime(2024, 1, 1)
+    records = list(
+        _grade_records(Random(1), range(1, 3), {1: [1]}, 4, period=(new_year, new_year))
+    )
+
+    assert len(records) == 4
+    assert all(record[-1] == new_year for record in records)
+    with pytest.raises(ValueError):
+        list(
+            _grade_records(
+                Random(1),
+                range(1, 3),
+                {1: [1]},
+                4,
+                period=(new_year, datetime(2023, 1, 1)),
+            )
+        )
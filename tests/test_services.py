@@ -0,0 +1,117 @@
+import asyncio
+
+from datetime import datetime
+
+import pytest
+
+from sqlalchemy import func, select
+
+import app.my_select as queries
+
+from app import services
+from app.database import AsyncSessionLocal
+from app.health import tables_ready
+from app.models import Teacher, Grade, GradeTotals, StudentSubjectStats
+from app.seed import seed_database
+from app.services import filter_criteria
+
+
+def test_filter_criteria_converts_values():
+    criteria = filter_criteria(
+        Grade,
+        {"teacher_id": "3", "date_received": "2024-01-02T10:00:00"},
+        ids=[1, 2],
+        older_than=datetime(2024, 6, 1),
+    )
+
+    assert len(criteria) == 4
+    assert criteria[0].right.value == 3
+    assert criteria[1].right.value == datetime(2024, 1, 2, 10)
+
+
+def test_filter_criteria_rejects_unknown_filters():
+    with pytest.raises(ValueError):
+        filter_criteria(Grade, {"bogus": "1"})
+    with pytest.raises(ValueError):
+        filter_criteria(Teacher, older_than=datetime(2024, 6, 1))
+
+    assert filter_criteria(Teacher) == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_updates_keep_aggregates_exact():
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            grade = (
+                await session.execute(select(Grade).order_by(Grade.id).limit(1))
+            ).scalar_one()
+    original = grade.grade
+
+    async def update(value):
+        async with AsyncSessionLocal() as session:
+            await services.update(session, Grade, grade.id, grade=value)
+
+    # Each update subtracts the value the other one may be replacing
+    for value in range(1, 21, 2):
+        await asyncio.gather(update(value), update(value + 1))
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            stats = await session.get(
+                StudentSubjectStats, (grade.student_id, grade.subject_id)
+            )
+            grade_sum, grade_count = (
+                await session.execute(
+                    select(func.sum(Grade.grade), func.count()).where(
+                        Grade.student_id == grade.student_id,
+                        Grade.subject_id == grade.subject_id,
+                    )
+                )
+            ).one()
+        assert (stats.grade_sum, stats.grade_count) == (grade_sum, grade_count)
+
+        aggregated = await queries.select_4(session)
+        computed = await queries.select_4(session, date_from=datetime(1900, 1, 1))
+        assert round(aggregated, 6) == round(computed, 6)
+
+        await services.update(session, Grade, grade.id, grade=original)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_removes_keep_aggregates_exact():
+    if not await tables_ready():
+        await seed_database()
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            grade = (
+                await session.execute(select(Grade).order_by(Grade.id).limit(1))
+            ).scalar_one()
+        fields = {
+            "student_id": grade.student_id,
+            "subject_id": grade.subject_id,
+            "teacher_id": grade.teacher_id,
+        }
+        ids = [
+            (await services.create(session, Grade, **fields, grade=value)).id
+            for value in range(1, 11)
+        ]
+
+    async def remove(id):
+        async with AsyncSessionLocal() as session:
+            await services.remove(session, Grade, id)
+
+    # Both removes of a grade would subtract it
+    for id in ids:
+        await asyncio.gather(remove(id), remove(id))
+
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            totals = (await session.execute(select(GradeTotals))).scalar_one()
+            grade_sum, grade_count = (
+                await session.execute(select(func.sum(Grade.grade), func.count()))
+            ).one()
+    assert (totals.grade_sum, totals.grade_count) == (grade_sum, grade_count)